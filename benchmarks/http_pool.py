@@ -0,0 +1,94 @@
+"""
+Counts the TCP connections opened by the Legacy and Cloud One sessions when
+many threads send requests at the same time, with the default per-session
+HTTPAdapter and with the shared connection pool configured in config.yml.
+
+    python benchmarks/http_pool.py [--threads 32] [--requests 50]
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from conformity_migration_tool import di
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with CountingHandler.lock:
+            CountingHandler.connections += 1
+
+    def do_GET(self):
+        time.sleep(0.005)
+        body = b'{"data": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.api+json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(sessions, url: str, threads: int, requests_per_thread: int) -> float:
+    def worker(i: int):
+        sess = sessions[i % len(sessions)]
+        for _ in range(requests_per_thread):
+            sess.get(url).json()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/v1/accounts"
+
+    def default_sessions():
+        sessions = [Session(), Session()]
+        for sess in sessions:
+            sess.mount("http://", HTTPAdapter())
+        return sessions
+
+    def shared_pool_sessions():
+        sessions = [Session(), Session()]
+        for sess in sessions:
+            sess.mount("http://", di._http_adapter())
+        return sessions
+
+    total = args.threads * args.requests
+    print(f"{args.threads} threads, {total} requests over 2 sessions")
+    for name, make_sessions in [
+        ("default adapter per session", default_sessions),
+        ("shared pool (config.yml)", shared_pool_sessions),
+    ]:
+        CountingHandler.connections = 0
+        elapsed = run(make_sessions(), url, args.threads, args.requests)
+        print(
+            f"  {name:<30} connections: {CountingHandler.connections:>5}  "
+            f"time: {elapsed:.2f}s  ({total / elapsed:.0f} req/s)"
+        )
+    print(f"  HTTP_POOL_MAXSIZE: {di.app_config()['HTTP_POOL_MAXSIZE']}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
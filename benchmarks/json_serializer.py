@@ -0,0 +1,142 @@
+"""
+Measures encoding request bodies and decoding responses shaped like the
+largest Conformity API payloads: a profile including its rule settings and
+a page of 100 checks with notes.
+
+    python benchmarks/json_serializer.py [--repeat 200]
+"""
+import argparse
+import json
+import time
+
+from conformity_migration.json_serializer import (
+    OrjsonJSONSerializer,
+    StdlibJSONSerializer,
+)
+
+
+class IndentedStdlibJSONSerializer(StdlibJSONSerializer):
+    """how request bodies were encoded before"""
+
+    name = "json (indent=4)"
+
+    def dumps(self, obj):
+        return json.dumps(obj, indent=4).encode("utf-8")
+
+
+def profile_payload(rule_count=1000):
+    return {
+        "data": {
+            "type": "profiles",
+            "id": "organisation-abc123",
+            "attributes": {"name": "Organisation Profile", "description": ""},
+            "relationships": {
+                "ruleSettings": {
+                    "data": [
+                        {"type": "rules", "id": f"EC2-{i:03d}"}
+                        for i in range(rule_count)
+                    ]
+                }
+            },
+        },
+        "included": [
+            {
+                "type": "rules",
+                "id": f"EC2-{i:03d}",
+                "attributes": {
+                    "enabled": i % 3 != 0,
+                    "exceptions": {"tags": ["env::dev", "team::sec"]},
+                    "extraSettings": [
+                        {
+                            "name": "ports",
+                            "type": "multiple-string-values",
+                            "values": [{"value": str(p)} for p in (22, 3389, 5432)],
+                        }
+                    ],
+                    "riskLevel": ("LOW", "MEDIUM", "HIGH", "VERY_HIGH")[i % 4],
+                    "provider": "aws",
+                },
+            }
+            for i in range(rule_count)
+        ],
+    }
+
+
+def checks_payload(check_count=100):
+    return {
+        "data": [
+            {
+                "type": "checks",
+                "id": f"ccc:abc123:EC2-{i % 50:03d}:EC2:us-east-1:sg-{i:08x}",
+                "attributes": {
+                    "region": "us-east-1",
+                    "status": "FAILURE",
+                    "risk-level": "HIGH",
+                    "pretty-risk-level": "High",
+                    "message": f"Security group sg-{i:08x} allows unrestricted inbound access",
+                    "resource": f"sg-{i:08x}",
+                    "resourceName": f"launch-wizard-{i}",
+                    "descriptorType": "ec2-securitygroup",
+                    "categories": ["security"],
+                    "suppressed": True,
+                    "suppressed-until": None,
+                    "created-date": 1650000000000 + i,
+                    "service": "EC2",
+                    "tags": ["env::prod"],
+                    "notes": [
+                        {
+                            "note": "Accepted risk, reviewed by security team",
+                            "createdBy": "user-1",
+                            "created-date": 1650000000000,
+                        }
+                    ],
+                    "link": f"https://www.cloudconformity.com/knowledge-base/aws/EC2/{i}.html",
+                },
+                "relationships": {
+                    "rule": {"data": {"type": "rules", "id": f"EC2-{i % 50:03d}"}},
+                    "account": {"data": {"type": "accounts", "id": "abc123"}},
+                },
+            }
+            for i in range(check_count)
+        ],
+        "meta": {"total": 2500},
+    }
+
+
+def bench(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    serializers = [IndentedStdlibJSONSerializer(), StdlibJSONSerializer()]
+    try:
+        serializers.append(OrjsonJSONSerializer())
+    except ImportError:
+        print("orjson is not installed, skipping it")
+
+    for payload_name, payload in [
+        ("profile with 1000 rule settings", profile_payload()),
+        ("page of 100 checks", checks_payload()),
+    ]:
+        response = json.dumps(payload).encode("utf-8")
+        print(f"{payload_name} ({len(response) / 1024:.0f} KiB response)")
+        print(f"  {'serializer':<18} {'body size':>10} {'dumps ms':>9} {'loads ms':>9}")
+        for serializer in serializers:
+            body = serializer.dumps(payload)
+            dumps_ms = bench(lambda: serializer.dumps(payload), args.repeat)
+            loads_ms = bench(lambda: serializer.loads(response), args.repeat)
+            print(
+                f"  {serializer.name:<18} {len(body) / 1024:>6.0f} KiB "
+                f"{dumps_ms:>9.3f} {loads_ms:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Measures how long the threads sending requests spend in log calls, with the
+log handlers called directly (as before) and behind a queue written by a
+background thread (as di.logger() does now). Every thread logs progress lines
+and, now and then, a failed request with its bodies like LoggerHTTPAdapter.
+
+    python benchmarks/logging_overhead.py [--threads 16] [--messages 2000]
+"""
+import argparse
+import logging
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import List
+
+from conformity_migration_tool.logger import (
+    AppLogger,
+    AppQueueHandler,
+    NoStrackTraceExceptionFormatter,
+    WithStrackTraceExceptionFormatter,
+)
+
+FAILED_REQUEST = (
+    "[Request]\nPOST https://us-west-2-api.cloudconformity.com/v1/accounts\n\n"
+    + "x" * 4096
+    + "\n[Response]\n429 Too Many Requests\n\n"
+    + "y" * 4096
+)
+
+
+def handlers(log_dir: str) -> List[logging.Handler]:
+    ch = logging.StreamHandler(stream=sys.stderr)
+    ch.setFormatter(NoStrackTraceExceptionFormatter(fmt="%(message)s"))
+    ch.addFilter(lambda logrec: not logrec.file_only)  # type: ignore
+    fh_fmt = WithStrackTraceExceptionFormatter(
+        fmt="[%(asctime)s] %(levelname)s %(message)s"
+    )
+    log_fh = RotatingFileHandler(
+        filename=os.path.join(log_dir, "conformity-migration.log"),
+        maxBytes=1024**2,
+        backupCount=4,
+    )
+    log_fh.setFormatter(fh_fmt)
+    err_fh = RotatingFileHandler(
+        filename=os.path.join(log_dir, "conformity-migration-error.log"),
+        maxBytes=1024**2,
+        backupCount=4,
+    )
+    err_fh.setLevel(logging.ERROR)
+    err_fh.setFormatter(fh_fmt)
+    return [ch, log_fh, err_fh]
+
+
+def run_threads(log: AppLogger, threads: int, messages: int) -> List[float]:
+    """Returns the seconds each log call took"""
+    durations: List[float] = []
+    lock = threading.Lock()
+
+    def worker(worker_id: int):
+        spent = []
+        for i in range(messages):
+            start = time.perf_counter()
+            if i % 100 == 99:
+                log.error(FAILED_REQUEST, file_only=True)
+            else:
+                log.info(f"  --> [worker {worker_id}] Rule: EC2-{i % 1000:03d}")
+            spent.append(time.perf_counter() - start)
+        with lock:
+            durations.extend(spent)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return durations
+
+
+def report(name: str, durations: List[float], total_secs: float):
+    durations = sorted(durations)
+    mean_us = sum(durations) / len(durations) * 1e6
+    p99_us = durations[int(len(durations) * 0.99)] * 1e6
+    print(
+        f"  {name:<8} {mean_us:>10.1f} {p99_us:>10.1f} {sum(durations):>12.3f} {total_secs:>10.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(
+        f"{args.threads} threads x {args.messages} log calls (terminal output goes to stderr)"
+    )
+    results = []
+    for name in ("direct", "queued"):
+        with tempfile.TemporaryDirectory() as log_dir:
+            logger = logging.getLogger(f"bench-{name}")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            log_handlers = handlers(log_dir)
+            listener = None
+            if name == "direct":
+                for handler in log_handlers:
+                    logger.addHandler(handler)
+                log = AppLogger(logger=logger)
+            else:
+                log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+                logger.addHandler(AppQueueHandler(log_queue))
+                listener = QueueListener(
+                    log_queue, *log_handlers, respect_handler_level=True
+                )
+                listener.start()
+                log = AppLogger(logger=logger, flush=log_queue.join)
+
+            start = time.perf_counter()
+            durations = run_threads(log, args.threads, args.messages)
+            log.flush()
+            total_secs = time.perf_counter() - start
+            if listener is not None:
+                listener.stop()
+            for handler in log_handlers:
+                handler.close()
+            results.append((name, durations, total_secs))
+
+    print(
+        f"  {'handlers':<8} {'mean µs':>10} {'p99 µs':>10} {'in log (s)':>12} {'total (s)':>10}"
+    )
+    for name, durations, total_secs in results:
+        report(name, durations, total_secs)
+    print("in log: time the request threads spent in log calls, summed up")
+    print("total: until every message is written")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,4 +14,12 @@ REQUIRES = [
     "boto3>=1.0.0,<2.0.0",
     "boto3-stubs[cloudformation]",
 ]
-setup(name="conformity-migration-tool", install_requires=REQUIRES)
+EXTRAS = {
+    # faster encoding/decoding of API requests and responses
+    "fast-json": ["orjson>=3.0.0"],
+    # brotli compressed responses, on top of gzip and deflate
+    "brotli": ["brotli>=1.0.9"],
+}
+setup(
+    name="conformity-migration-tool", install_requires=REQUIRES, extras_require=EXTRAS
+)
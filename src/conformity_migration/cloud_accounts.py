@@ -1,71 +1,100 @@
 import os
 from abc import ABCMeta, abstractmethod
-from typing import List, Tuple, Union
+from typing import Any, Collection, Dict, List, Mapping, Optional, Tuple, Union
 
 from PyInquirer import prompt
 
-from conformity_migration_tool.utils import str2bool
+from conformity_migration_tool.utils import prompt_lock, str2bool
 
 from .conformity_api import ConformityAPI
 from .models import Account
 
 
 class CloudAccountAdder(metaclass=ABCMeta):
+    cloud_type = ""
+
     @abstractmethod
+    def account_uniq_attrib(self, acct: Account) -> str:
+        pass
+
     def account_exists(
-        self, c1_accts: List[Account], acct: Account
+        self, c1_accts_index: Mapping[str, str], acct: Account
     ) -> Tuple[bool, str]:
+        """c1_accts_index maps account_uniq_attrib of CloudOne accounts to their id"""
+        c1_acct_id: Optional[str] = c1_accts_index.get(self.account_uniq_attrib(acct))
+        if c1_acct_id is None:
+            return False, ""
+        return True, c1_acct_id
+
+    @abstractmethod
+    def account_access(self, acct: Account) -> Dict[str, Any]:
+        """Reads what is needed from Legacy Conformity to add the account"""
         pass
 
     @abstractmethod
-    def account_add(self, acct: Account) -> str:
+    def account_add(
+        self, acct: Account, access: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Adds the account using the result of account_access, which is read when not given"""
         pass
 
 
 class AWSCloudAccountAdder(CloudAccountAdder):
-    def __init__(self, legacy_api: ConformityAPI, c1_api: ConformityAPI) -> None:
+    cloud_type = "aws"
+
+    def __init__(
+        self,
+        legacy_api: ConformityAPI,
+        c1_api: ConformityAPI,
+        updated_stacks: Union[bool, Collection[str]] = False,
+    ) -> None:
+        """
+        updated_stacks is True when the CloudConformity stack of every AWS
+        account to add is already updated with the new ExternalID, otherwise
+        the AWS account numbers whose stack is. These are added without asking
+        to update their stack first.
+        """
         self.legacy_api = legacy_api
         self.c1_api = c1_api
+        self.updated_stacks = updated_stacks
 
-    def _account_uniq_attrib(self, acct: Account) -> str:
+    def stack_updated(self, aws_acct_num: str) -> bool:
+        if isinstance(self.updated_stacks, bool):
+            return self.updated_stacks
+        return aws_acct_num in self.updated_stacks
+
+    def account_uniq_attrib(self, acct: Account) -> str:
         aws_acct_num = acct.attributes.get("awsaccount-id", "")
         if not aws_acct_num:
             print(f"No AWS account number for: {acct.name} {acct.environment}")
         return aws_acct_num
 
-    def account_exists(
-        self, c1_accts: List[Account], acct: Account
-    ) -> Tuple[bool, str]:
-        for c1_acct in c1_accts:
-            if c1_acct.cloud_type != "aws":
-                continue
-            if self._account_uniq_attrib(acct) == self._account_uniq_attrib(c1_acct):
-                return True, c1_acct.account_id
-        return False, ""
-
-    def account_add(self, acct: Account) -> str:
+    def account_access(self, acct: Account) -> Dict[str, Any]:
+        return self.legacy_api.get_account_access_configuration(acct_id=acct.account_id)
+
+    def account_add(
+        self, acct: Account, access: Optional[Dict[str, Any]] = None
+    ) -> str:
         name = acct.name
         environment = acct.environment
-        legacy_acct_id = acct.account_id
 
         c1_external_id = self.c1_api.get_organisation_external_id()
 
         aws_acct_num = acct.attributes["awsaccount-id"]
 
-        access_conf = self.legacy_api.get_account_access_configuration(
-            acct_id=legacy_acct_id
-        )
+        access_conf = access if access is not None else self.account_access(acct)
         role_arn = access_conf["roleArn"]
         old_external_id = access_conf["externalId"]
 
         skip_aws_prompt = str2bool(os.getenv("SKIP_AWS_PROMPT", "False"))
-        if not skip_aws_prompt:
-            self.show_update_stack_external_id_instructions(
-                aws_acct_num=aws_acct_num,
-                old_external_id=old_external_id,
-                new_external_id=c1_external_id,
-            )
-            prompt_continue()
+        if not (skip_aws_prompt or self.stack_updated(aws_acct_num)):
+            with prompt_lock:
+                self.show_update_stack_external_id_instructions(
+                    aws_acct_num=aws_acct_num,
+                    old_external_id=old_external_id,
+                    new_external_id=c1_external_id,
+                )
+                prompt_continue()
 
         res = self.c1_api.add_aws_account(
             name=name,
@@ -93,35 +122,53 @@ Please do the following steps to grant CloudOne Conformity access to your AWS ac
 """
         )
 
+    @staticmethod
+    def show_update_stacks_external_id_instructions(
+        aws_acct_nums: List[str], old_external_ids: List[str], new_external_id
+    ):
+        stacks = "\n".join(
+            f"        AWS Account {aws_acct_num}: {old_external_id}"
+            for aws_acct_num, old_external_id in zip(aws_acct_nums, old_external_ids)
+        )
+        print(
+            f"""
+Please do the following steps in each of the AWS accounts below to grant CloudOne Conformity access to them:
+    1. Sign in to AWS console for the AWS Account
+    2. Go to CloudFormation and find stack name CloudConformity
+    3. Click Update button to edit stack.
+    4. Under Prepare Template, choose: Use current template, and click Next
+    5. Under Parameters, change value of ExternalID to the new one below:
+        New Value: {new_external_id}
+    Old values per AWS Account:
+{stacks}
+"""
+        )
+
 
 class AzureCloudAccountAdder(CloudAccountAdder):
+    cloud_type = "azure"
+
     def __init__(self, legacy_api: ConformityAPI, c1_api: ConformityAPI) -> None:
         self.legacy_api = legacy_api
         self.c1_api = c1_api
 
-    def _account_uniq_attrib(self, acct: Account) -> str:
+    def account_uniq_attrib(self, acct: Account) -> str:
         return acct.attributes["cloud-data"]["azure"]["subscriptionId"]
 
-    def account_exists(
-        self, c1_accts: List[Account], acct: Account
-    ) -> Tuple[bool, str]:
-        for c1_acct in c1_accts:
-            if c1_acct.cloud_type != "azure":
-                continue
-            if self._account_uniq_attrib(acct) == self._account_uniq_attrib(c1_acct):
-                return True, c1_acct.account_id
-        return False, ""
-
-    def account_add(self, acct: Account) -> str:
+    def account_access(self, acct: Account) -> Dict[str, Any]:
+        res = self.legacy_api.get_group_details(group_id=acct.managed_group_id)
+        gattrib = res["attributes"]
+        return gattrib["cloud-data"]["azure"]
+
+    def account_add(
+        self, acct: Account, access: Optional[Dict[str, Any]] = None
+    ) -> str:
         name = acct.name
         environment = acct.environment
 
         azure_sub_id = acct.attributes["cloud-data"]["azure"]["subscriptionId"]
-        group_id = acct.managed_group_id
 
-        res = self.legacy_api.get_group_details(group_id=group_id)
-        gattrib = res["attributes"]
-        azure_data = gattrib["cloud-data"]["azure"]
+        azure_data = access if access is not None else self.account_access(acct)
         active_directory_id = azure_data["directoryId"]
 
         res = self.c1_api.add_azure_subscription(
@@ -143,15 +190,19 @@ def prompt_continue():
             "default": False,
         },
     ]
-    while (prompt(questions=questions))["continue"] is False:
-        pass
+    with prompt_lock:
+        while (prompt(questions=questions))["continue"] is False:
+            pass
 
 
 def get_cloud_account_adder(
-    cloud_type: str, legacy_api: ConformityAPI, c1_api: ConformityAPI
+    cloud_type: str,
+    legacy_api: ConformityAPI,
+    c1_api: ConformityAPI,
+    updated_aws_stacks: Union[bool, Collection[str]] = False,
 ) -> Union[CloudAccountAdder, None]:
     if cloud_type == "aws":
-        return AWSCloudAccountAdder(legacy_api, c1_api)
+        return AWSCloudAccountAdder(legacy_api, c1_api, updated_aws_stacks)
     if cloud_type == "azure":
         return AzureCloudAccountAdder(legacy_api, c1_api)
     return None
@@ -1,10 +1,19 @@
-import json
-from typing import Any, Dict, Iterable, List, Optional
+import copy
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from urllib.parse import quote
 
 import backoff
 import requests
 
+from conformity_migration_tool.priority import set_thread_priority, thread_priority
+
+from .json_serializer import JSONSerializer, default_json_serializer
 from .models import (
     Account,
     AccountDetails,
@@ -54,6 +63,76 @@ class ConformityOtherError(ConformityError):
     pass
 
 
+def is_retryable_error(e: Exception) -> bool:
+    """
+    Errors that may go away by themselves and that the HTTP session doesn't
+    retry: connection problems and timeouts. Rate limiting and server errors
+    (429, 5xx) are already retried by the session (see urllib3.Retry), so
+    retrying them again would only add load while the API is overloaded.
+    """
+    if isinstance(e, ConformityConnectionError):
+        return True
+    return isinstance(
+        e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+    )
+
+
+_sent = threading.local()
+
+
+def sent_request_count() -> int:
+    """
+    Number of HTTP requests sent so far by the current thread, including the
+    ones retried by the HTTP session
+    """
+    return getattr(_sent, "count", 0)
+
+
+def _requests_sent(
+    resp: Optional[requests.Response] = None, error: Optional[Exception] = None
+) -> int:
+    """
+    Requests sent for a single call: the earlier attempts retried by urllib3
+    are in the history of the response, or, when urllib3 gave up, in the
+    `retry_history` of its error if its Retry records it.
+    """
+    history: Iterable = ()
+    if resp is not None:
+        retries = getattr(resp.raw, "retries", None)
+        history = getattr(retries, "history", None) or ()
+    elif isinstance(error, requests.exceptions.RetryError) and error.args:
+        history = getattr(error.args[0], "retry_history", None) or ()
+    return 1 + len(tuple(history))
+
+
+# (check_id, suppressed_until, note)
+CheckSuppression = Tuple[str, Optional[int], str]
+
+
+class CheckSuppressionResult:
+    def __init__(
+        self,
+        check_id: str,
+        attempts: int,
+        error: Optional[Exception] = None,
+        started: float = 0.0,
+        ended: float = 0.0,
+        requests: int = 0,
+    ) -> None:
+        self.check_id = check_id
+        self.attempts = attempts
+        # HTTP requests sent, including the ones retried by the HTTP session
+        self.requests = requests or attempts
+        self.error = error
+        # time.time() of the first attempt and of the end of the last one
+        self.started = started
+        self.ended = ended
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
 class ConformityAPI(Protocol):
     def current_user(self) -> User:
         pass
@@ -89,16 +168,16 @@ class ConformityAPI(Protocol):
     def get_organisation_id(self) -> str:
         pass
 
-    def get_all_users(self) -> List[User]:
+    def get_all_users(self) -> Iterable[User]:
         pass
 
-    def list_groups(self, include_group_types: List[str] = None) -> List[Group]:
+    def list_groups(self, include_group_types: List[str] = None) -> Iterable[Group]:
         pass
 
     def delete_account(self, acct_id: str) -> dict:
         pass
 
-    def list_accounts(self) -> List[Account]:
+    def list_accounts(self) -> Iterable[Account]:
         pass
 
     def get_organisation_profile(self, include_rule_settings=False) -> Profile:
@@ -110,7 +189,7 @@ class ConformityAPI(Protocol):
     def reset_organisation_profile(self) -> dict:
         pass
 
-    def get_custom_profiles(self) -> List[Profile]:
+    def get_custom_profiles(self) -> Iterable[Profile]:
         pass
 
     def get_profile(self, profile_id: str, include_rule_settings=False) -> Profile:
@@ -189,14 +268,26 @@ class ConformityAPI(Protocol):
     def is_bot_scan_done(self, acct_id: str) -> bool:
         pass
 
-    def get_suppressed_checks(self, acct_id: str, limit=0) -> Iterable[Check]:
+    def get_suppressed_checks(self, acct_id: str, limit=0, offset=0) -> Iterable[Check]:
+        pass
+
+    def count_suppressed_checks(self, acct_id: str) -> int:
         pass
 
     def get_checks(
-        self, acct_id: str, filters: Optional[Dict[str, Any]] = None, limit=0
+        self,
+        acct_id: str,
+        filters: Optional[Dict[str, Any]] = None,
+        limit=0,
+        offset=0,
     ) -> Iterable[Check]:
         pass
 
+    def count_checks(
+        self, acct_id: str, filters: Optional[Dict[str, Any]] = None
+    ) -> int:
+        pass
+
     def get_check_detail(
         self, check_id: str, with_notes=False, notes_limit=100
     ) -> Check:
@@ -207,14 +298,32 @@ class ConformityAPI(Protocol):
     ):
         pass
 
+    def suppress_checks(
+        self,
+        suppressions: Iterable[CheckSuppression],
+        max_workers=4,
+        max_attempts=3,
+        retry_backoff_secs=1.0,
+    ) -> Iterator[CheckSuppressionResult]:
+        pass
+
 
 class DefaultConformityAPI:
+    SUPPRESSED_CHECKS_FILTERS = {"suppressed": True, "suppressedFilterMode": "v2"}
+
     def __init__(
-        self, api_key: str, base_url: str, http: requests.Session = None
+        self,
+        api_key: str,
+        base_url: str,
+        http: requests.Session = None,
+        serializer: Optional[JSONSerializer] = None,
     ) -> None:
         self._api_key = api_key
         self._base_url = base_url.strip().rstrip("/")
         self.http = requests.Session() if http is None else http
+        self._serializer = (
+            default_json_serializer() if serializer is None else serializer
+        )
         self._headers = {
             "Authorization": f"ApiKey {self._api_key}",
             "Content-Type": "application/vnd.api+json",
@@ -265,7 +374,7 @@ Response:
         return self._exec_request("PATCH", url, data=data)
 
     def _exec_request(self, method, url, params=None, data=None):
-        json_data = json.dumps(data, indent=4) if data else None
+        json_data = self._serializer.dumps(data) if data else None
         try:
             resp = self.http.request(
                 method=method,
@@ -275,13 +384,18 @@ Response:
                 headers=self._headers,
             )
         except requests.exceptions.ConnectTimeout as e:
+            _sent.count = sent_request_count() + _requests_sent(error=e)
             raise ConformityConnectionError(
                 f"Cannot connect to {self._base_url}"
             ) from e
+        except Exception as e:
+            _sent.count = sent_request_count() + _requests_sent(error=e)
+            raise e
         else:
+            _sent.count = sent_request_count() + _requests_sent(resp=resp)
             self._raise_for_status(resp)
 
-            return resp.json()
+            return self._serializer.loads(resp.content)
 
     def _validate_api(self):
         try:
@@ -307,9 +421,10 @@ Response:
         res = self._delete_request(f"{self._base_url}/accounts/{acct_id}")
         return res
 
-    def list_accounts(self) -> List[Account]:
+    def list_accounts(self) -> Iterable[Account]:
         res = self._get_request(f"{self._base_url}/accounts")
-        return [Account(acct_data=acct_data) for acct_data in res["data"]]
+        for acct_data in res["data"]:
+            yield Account(acct_data=acct_data)
 
     def get_organisation_external_id(self) -> str:
         if not self._organisation_external_id:
@@ -478,11 +593,10 @@ Response:
         res = self._get_request(f"{self._base_url}/groups/{group_id}")
         return res["data"][0]
 
-    def list_groups(self, include_group_types: List[str] = None) -> List[Group]:
+    def list_groups(self, include_group_types: List[str] = None) -> Iterable[Group]:
         res = self._get_request(f"{self._base_url}/groups")
         if include_group_types is None:
             include_group_types = []
-        groups = []
         for g in res["data"]:
             gattrib = g["attributes"]
             group_type = gattrib.get("group-type", Group.GROUP_TYPE_USER_DEFINED)
@@ -496,8 +610,7 @@ Response:
                 cloud_type=gattrib.get("cloud-type"),
                 cloud_data=gattrib.get("cloud-data"),
             )
-            groups.append(group)
-        return groups
+            yield group
 
     def create_group(self, name, tags=List[str]):
         res = self._post_request(
@@ -532,15 +645,13 @@ Response:
             is_cloud_one_user=user_attrib.get("is-cloud-one-user", False),
         )
 
-    def get_all_users(self) -> List[User]:
+    def get_all_users(self) -> Iterable[User]:
         res = self._get_request(f"{self._base_url}/users")
-        users = []
         for u in res["data"]:
             user = self._user_dict_to_user_obj(u)
             if not user.email:  # skip users who does not have email, e.g. Api key user
                 continue
-            users.append(user)
-        return users
+            yield user
 
     def get_user_details(self, user_id: str) -> dict:
         res = self._get_request(f"{self._base_url}/users/{user_id}")
@@ -694,23 +805,40 @@ Response:
             notes=notes,
         )
 
-    def get_checks(
-        self, acct_id: str, filters: Optional[Dict[str, Any]] = None, limit=0
-    ) -> Iterable[Check]:
-
-        page_size_max = 100
-        page_size = limit if (0 < limit < page_size_max) else page_size_max
-
-        params = {
+    def _checks_params(
+        self, acct_id: str, filters: Optional[Dict[str, Any]], page_size: int
+    ) -> Dict[str, Any]:
+        params: Dict[str, Any] = {
             "accountIds": acct_id,
             "page[size]": page_size,
         }
         if filters:
             for filter_name, filter_val in filters.items():
                 params[f"filter[{filter_name}]"] = filter_val
+        return params
+
+    def get_checks(
+        self,
+        acct_id: str,
+        filters: Optional[Dict[str, Any]] = None,
+        limit=0,
+        offset=0,
+    ) -> Iterable[Check]:
+        """
+        Checks from the `offset`-th one on, e.g. to split the checks of an
+        account between several workers. Offsets that are a multiple of the
+        page size (100) don't read any check twice.
+        """
+
+        page_size_max = 100
+        page_size = limit if (0 < limit < page_size_max) else page_size_max
+
+        params = self._checks_params(
+            acct_id=acct_id, filters=filters, page_size=page_size
+        )
 
         total_items = 0
-        page_num = 0
+        page_num, skip = divmod(offset, page_size)
         while True:
             params["page[number]"] = page_num
             res = self._get_request(
@@ -718,11 +846,12 @@ Response:
                 params=params,
             )
             data = res["data"]
-            for c in data:
+            for c in data[skip:]:
                 yield self._check_dict_to_check_obj(c)
                 total_items += 1
                 if self._limit_reached(limit, total_items):
                     break
+            skip = 0
 
             meta = res["meta"]
             # print(meta)
@@ -730,15 +859,30 @@ Response:
             if self._limit_reached(limit, total_items):
                 break
 
-            if total_items >= meta["total"]:
+            if not data or (page_num + 1) * page_size >= meta["total"]:
                 break
             page_num += 1
 
-    def get_suppressed_checks(self, acct_id: str, limit=0) -> Iterable[Check]:
+    def count_checks(
+        self, acct_id: str, filters: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Number of checks matching the filters, read with a single request"""
+        params = self._checks_params(acct_id=acct_id, filters=filters, page_size=1)
+        params["page[number]"] = 0
+        res = self._get_request(f"{self._base_url}/checks", params=params)
+        return res["meta"]["total"]
+
+    def get_suppressed_checks(self, acct_id: str, limit=0, offset=0) -> Iterable[Check]:
         return self.get_checks(
             acct_id=acct_id,
-            filters={"suppressed": True, "suppressedFilterMode": "v2"},
+            filters=self.SUPPRESSED_CHECKS_FILTERS,
             limit=limit,
+            offset=offset,
+        )
+
+    def count_suppressed_checks(self, acct_id: str) -> int:
+        return self.count_checks(
+            acct_id=acct_id, filters=self.SUPPRESSED_CHECKS_FILTERS
         )
 
     def suppress_check(
@@ -761,6 +905,88 @@ Response:
         )
         return res["data"]
 
+    def _suppress_check_with_retries(
+        self,
+        suppression: CheckSuppression,
+        max_attempts: int,
+        retry_backoff_secs: float,
+    ) -> CheckSuppressionResult:
+        check_id, suppressed_until, note = suppression
+        started = time.time()
+        sent_before = sent_request_count()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.suppress_check(
+                    check_id=check_id, suppressed_until=suppressed_until, note=note
+                )
+                return CheckSuppressionResult(
+                    check_id=check_id,
+                    attempts=attempt,
+                    started=started,
+                    ended=time.time(),
+                    requests=sent_request_count() - sent_before,
+                )
+            except Exception as e:
+                if attempt >= max_attempts or not is_retryable_error(e):
+                    return CheckSuppressionResult(
+                        check_id=check_id,
+                        attempts=attempt,
+                        error=e,
+                        started=started,
+                        ended=time.time(),
+                        requests=sent_request_count() - sent_before,
+                    )
+            time.sleep(retry_backoff_secs * (2 ** (attempt - 1)))
+
+    def suppress_checks(
+        self,
+        suppressions: Iterable[CheckSuppression],
+        max_workers=4,
+        max_attempts=3,
+        retry_backoff_secs=1.0,
+    ) -> Iterator[CheckSuppressionResult]:
+        """
+        Suppresses checks concurrently and yields the outcome of each check as
+        soon as it is known (not necessarily in the given order). The API has
+        no endpoint to suppress several checks at once, so each check is still
+        a PATCH request; at most max_workers of them are in flight, and the
+        suppressions are only pulled from the iterable as workers free up.
+        Retryable errors (see is_retryable_error) are retried with exponential
+        backoff, up to max_attempts per check.
+        """
+        max_workers = max(1, max_workers)
+        it = iter(suppressions)
+        # the suppressions have the priority of the caller, see PriorityRateBudget
+        with ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="suppress-checks",
+            initializer=set_thread_priority,
+            initargs=(thread_priority(),),
+        ) as executor:
+            in_flight: Set[Future] = set()
+            exhausted = False
+            while True:
+                while not exhausted and len(in_flight) < max_workers:
+                    suppression = next(it, None)
+                    if suppression is None:
+                        exhausted = True
+                        break
+                    in_flight.add(
+                        executor.submit(
+                            self._suppress_check_with_retries,
+                            suppression,
+                            max_attempts,
+                            retry_backoff_secs,
+                        )
+                    )
+                if not in_flight:
+                    return
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+
     def get_check_detail(
         self, check_id: str, with_notes=False, notes_limit=100
     ) -> Check:
@@ -777,13 +1003,11 @@ Response:
         bot_status = self.get_account_details(acct_id=acct_id).bot_status
         return bot_status is None
 
-    def get_custom_profiles(self) -> List[Profile]:
+    def get_custom_profiles(self) -> Iterable[Profile]:
         res = self._get_request(f"{self._base_url}/profiles")
-        profiles: List[Profile] = []
         for prof_data in res["data"]:
             settings = {"data": prof_data}
-            profiles.append(Profile(settings=settings))
-        return profiles
+            yield Profile(settings=settings)
 
     def get_profile(self, profile_id: str, include_rule_settings=False) -> Profile:
         params = {"includes": "ruleSettings"} if include_rule_settings else None
@@ -909,6 +1133,301 @@ class ConformityAPIBaseDecorator:
         return getattr(self._api, name)
 
 
+def _call_key(name: str, args: tuple, kwargs: Dict[str, Any]) -> Optional[tuple]:
+    def freeze(value):
+        if isinstance(value, (list, tuple)):
+            return tuple(freeze(v) for v in value)
+        return value
+
+    key = (name, freeze(args), tuple(sorted((k, freeze(v)) for k, v in kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class SingleFlightConformityAPI(ConformityAPIBaseDecorator):
+    """
+    Lets identical reads made at the same time share one request: while a call
+    is in flight, other threads calling the same method with the same arguments
+    wait for it and get its result (or its error) instead of sending the request
+    again. Listings are read completely so that every caller can iterate them.
+    """
+
+    COALESCED_METHODS = {
+        "get_organisation_id",
+        "get_organisation_external_id",
+        "get_all_users",
+        "list_groups",
+        "get_group_details",
+    }
+
+    def __init__(self, api: ConformityAPI) -> None:
+        super().__init__(api)
+        self._lock = threading.Lock()
+        self._in_flight: Dict[tuple, "Future[Any]"] = dict()
+
+    def _single_flight(self, _method: str, *args, **kwargs):
+        key = _call_key(_method, args, kwargs)
+        if key is None:
+            return getattr(self.api, _method)(*args, **kwargs)
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if future is None:
+                future = self._in_flight[key] = Future()
+
+        if not is_leader:
+            result = future.result()
+            # each caller gets its own list
+            return list(result) if isinstance(result, list) else result
+
+        try:
+            result = getattr(self.api, _method)(*args, **kwargs)
+            if isinstance(result, Iterator):
+                result = list(result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise e
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def __getattr__(self, name):
+        if name in self.COALESCED_METHODS:
+            return partial(self._single_flight, name)
+        return super().__getattr__(name)
+
+
+def _invert_mapping(mapping: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    inverted: Dict[str, Set[str]] = dict()
+    for key, values in mapping.items():
+        for value in values:
+            inverted.setdefault(value, set()).add(key)
+    return inverted
+
+
+class CacheStats:
+    """Hit and miss counters per method of a CachingConformityAPI"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = dict()
+        self._misses: Dict[str, int] = dict()
+
+    def record(self, method: str, hit: bool) -> None:
+        counters = self._hits if hit else self._misses
+        with self._lock:
+            counters[method] = counters.get(method, 0) + 1
+
+    @property
+    def hits(self) -> int:
+        return sum(self._hits.values())
+
+    @property
+    def misses(self) -> int:
+        return sum(self._misses.values())
+
+    def per_method(self) -> List[Tuple[str, int, int]]:
+        """(method, hits, misses) sorted by method"""
+        with self._lock:
+            methods = sorted(set(self._hits).union(self._misses))
+            return [(m, self._hits.get(m, 0), self._misses.get(m, 0)) for m in methods]
+
+
+@lru_cache(maxsize=None)
+def _method_signature(method: str) -> Optional[inspect.Signature]:
+    func = getattr(ConformityAPI, method, None)
+    if func is None:
+        return None
+    signature = inspect.signature(func)
+    return signature if "acct_id" in signature.parameters else None
+
+
+def _call_acct_id(method: str, args: tuple, kwargs: Dict[str, Any]) -> Optional[str]:
+    """Account id a call of a ConformityAPI method is made for, if it takes one"""
+    signature = _method_signature(method)
+    if signature is None:
+        return None
+    try:
+        return signature.bind(None, *args, **kwargs).arguments.get("acct_id")
+    except TypeError:
+        return None
+
+
+class CachingConformityAPI(ConformityAPIBaseDecorator):
+    """
+    Keeps the results of reads for `ttl_secs`, per method and arguments, so that
+    reading the same data again (e.g. list_groups while adding managed groups,
+    creating user-defined groups and migrating group configs) does not send
+    another request. At most `max_entries` results are kept, least recently used
+    ones are dropped first. A call that modifies Conformity drops the cached
+    results of the reads it affects, only the ones of its account when both
+    take an account id. Every caller gets its own copy of a cached result.
+
+    list_accounts, checks and the bot scan status are never cached: the first
+    two can be too large to keep in memory and the last one is polled.
+    """
+
+    # read -> calls that change what it returns
+    INVALIDATED_BY = {
+        "current_user": set(),
+        "get_organisation_id": set(),
+        "get_organisation_external_id": set(),
+        "get_all_users": {"invite_user"},
+        # an Azure directory is added as a managed group
+        "list_groups": {"create_group", "create_azure_directory", "delete_group"},
+        "get_group_details": {
+            "create_group",
+            "create_azure_directory",
+            "delete_group",
+        },
+        "get_account_details": {
+            "update_account",
+            "update_account_bot_settings",
+            "update_account_rule_settings",
+            "update_account_rule_setting",
+            "delete_account",
+        },
+        "get_account_access_configuration": {"delete_account"},
+        "get_account_rule_setting": {
+            "update_account_rule_settings",
+            "update_account_rule_setting",
+            "delete_account",
+        },
+        "get_organisation_profile": {
+            "update_organisation_profile",
+            "reset_organisation_profile",
+        },
+        "get_custom_profiles": {"create_new_profile", "delete_profile"},
+        "get_profile": {"create_new_profile", "delete_profile"},
+        "list_organisation_report_configs": {
+            "create_organisation_report_config",
+            "delete_report_config",
+        },
+        "list_group_report_configs": {
+            "create_group_report_config",
+            "delete_report_config",
+            "delete_group",
+        },
+        "list_account_report_configs": {
+            "create_account_report_config",
+            "delete_report_config",
+            "delete_account",
+        },
+        "get_communication_settings": {
+            "create_communication_settings",
+            "delete_communication_settings",
+            "delete_account",
+        },
+    }
+
+    # call -> reads whose cached results it drops
+    INVALIDATES = _invert_mapping(INVALIDATED_BY)
+
+    def __init__(
+        self,
+        api: ConformityAPI,
+        ttl_secs: float = 300,
+        max_entries: int = 1024,
+        stats: Optional[CacheStats] = None,
+    ) -> None:
+        super().__init__(api)
+        self._ttl_secs = ttl_secs
+        self._max_entries = max_entries
+        self._stats = stats or CacheStats()
+        self._lock = threading.Lock()
+        # key -> (expiry time, result, account id), least recently used first
+        self._entries: "OrderedDict[tuple, Tuple[float, Any, Optional[str]]]" = (
+            OrderedDict()
+        )
+        # method -> account id (None for the reads without one) -> keys, so
+        # that dropping the results of a read doesn't go through all entries
+        self._keys: Dict[str, Dict[Optional[str], Set[tuple]]] = dict()
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._stats
+
+    def invalidate_cache(self, *methods: str, acct_id: Optional[str] = None) -> None:
+        """
+        Drops the cached results of the given reads, or of all reads. With
+        `acct_id`, only the results read for that account are dropped of the
+        reads that take an account id.
+        """
+        with self._lock:
+            if not methods:
+                self._entries.clear()
+                self._keys.clear()
+                return
+            for method in methods:
+                keys_per_acct = self._keys.get(method)
+                if not keys_per_acct:
+                    continue
+                if acct_id is not None and _method_signature(method) is not None:
+                    keys = keys_per_acct.pop(acct_id, set())
+                else:
+                    keys = set().union(*keys_per_acct.values())
+                    del self._keys[method]
+                for key in keys:
+                    del self._entries[key]
+
+    def _drop_least_recently_used(self) -> None:
+        key, (_, _, acct_id) = self._entries.popitem(last=False)
+        keys_per_acct = self._keys[key[0]]
+        keys_per_acct[acct_id].discard(key)
+        if not keys_per_acct[acct_id]:
+            del keys_per_acct[acct_id]
+
+    # the method is named by an argument that the methods of ConformityAPI
+    # don't have, e.g. create_group(name=...)
+    def _cached_read(self, _method: str, *args, **kwargs):
+        key = _call_key(_method, args, kwargs)
+        if key is None:
+            return getattr(self.api, _method)(*args, **kwargs)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats.record(_method, hit=True)
+                return copy.deepcopy(entry[1])
+        self._stats.record(_method, hit=False)
+
+        result = getattr(self.api, _method)(*args, **kwargs)
+        if isinstance(result, Iterator):
+            result = list(result)
+        acct_id = _call_acct_id(_method, args, kwargs)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl_secs, result, acct_id)
+            self._entries.move_to_end(key)
+            self._keys.setdefault(_method, dict()).setdefault(acct_id, set()).add(key)
+            while len(self._entries) > self._max_entries:
+                self._drop_least_recently_used()
+        return copy.deepcopy(result)
+
+    def _invalidating_call(self, _method: str, *args, **kwargs):
+        try:
+            return getattr(self.api, _method)(*args, **kwargs)
+        finally:
+            # also when it failed, it might have changed something
+            self.invalidate_cache(
+                *self.INVALIDATES[_method],
+                acct_id=_call_acct_id(_method, args, kwargs),
+            )
+
+    def __getattr__(self, name):
+        if name in self.INVALIDATED_BY:
+            return partial(self._cached_read, name)
+        if name in self.INVALIDATES:
+            return partial(self._invalidating_call, name)
+        return super().__getattr__(name)
+
+
 class LegacyConformityAPI(ConformityAPIBaseDecorator):
     def __init__(self, api: ConformityAPI) -> None:
         super().__init__(api)
@@ -940,7 +1459,7 @@ class WorkaroundFixConformityAPI(ConformityAPIBaseDecorator):
     def get_all_users(self) -> List[User]:
         try:
             self._already_tried_to_access_users = True
-            users = self.api.get_all_users()
+            users = list(self.api.get_all_users())
             self._successfully_accessed_users = True
             return users
         except Exception as e:
@@ -966,17 +1485,20 @@ class WorkaroundFixConformityAPI(ConformityAPIBaseDecorator):
             # print("It is indeed a permission error!")
             raise e
 
-    def list_groups(self, include_group_types: List[str] = None) -> List[Group]:
+    def _iter_or_empty(self, list_func: Callable[[], Iterable[Any]]) -> Iterator[Any]:
+        # the request of a generator is only made once it is iterated
         try:
-            return self.api.list_groups(include_group_types=include_group_types)
+            yield from list_func()
         except ConformityForbiddenError as e:
-            return self._return_empty_obj_or_raise_error([], e)
+            self._return_empty_obj_or_raise_error([], e)
 
-    def get_custom_profiles(self) -> List[Profile]:
-        try:
-            return self.api.get_custom_profiles()
-        except ConformityForbiddenError as e:
-            return self._return_empty_obj_or_raise_error([], e)
+    def list_groups(self, include_group_types: List[str] = None) -> Iterable[Group]:
+        return self._iter_or_empty(
+            lambda: self.api.list_groups(include_group_types=include_group_types)
+        )
+
+    def get_custom_profiles(self) -> Iterable[Profile]:
+        return self._iter_or_empty(self.api.get_custom_profiles)
 
     def list_organisation_report_configs(self) -> List[ReportConfig]:
         try:
@@ -996,7 +1518,7 @@ class WorkaroundFixConformityAPI(ConformityAPIBaseDecorator):
             )
             return self._return_empty_obj_or_raise_error(empty_profile, e)
 
-    def list_accounts(self) -> List[Account]:
+    def list_accounts(self) -> Iterable[Account]:
         accts = self.api.list_accounts()
         if accts is None:
             accts = []
@@ -1027,3 +1549,45 @@ class WorkaroundFixConformityAPI(ConformityAPIBaseDecorator):
                 )
             else:
                 raise e
+
+
+class ReadOnlyConformityAPI(ConformityAPIBaseDecorator):
+    """
+    Rejects every call that would modify Conformity, e.g. when planning a
+    migration without touching either organisation.
+    """
+
+    MUTATING_METHODS = {
+        "add_aws_account",
+        "add_azure_subscription",
+        "delete_account",
+        "update_account",
+        "update_account_bot_settings",
+        "update_account_rule_settings",
+        "update_account_rule_setting",
+        "update_organisation_profile",
+        "reset_organisation_profile",
+        "create_new_profile",
+        "delete_profile",
+        "create_organisation_report_config",
+        "create_group_report_config",
+        "create_account_report_config",
+        "delete_report_config",
+        "create_group",
+        "delete_group",
+        "create_azure_directory",
+        "create_communication_settings",
+        "delete_communication_settings",
+        "invite_user",
+        "suppress_check",
+        "suppress_checks",
+    }
+
+    def __getattr__(self, name):
+        if name in self.MUTATING_METHODS:
+
+            def _reject(*args, **kwargs):
+                raise ConformityError(f"Not allowed on a read-only API: {name}")
+
+            return _reject
+        return super().__getattr__(name)
@@ -0,0 +1,47 @@
+import json
+from typing import Any
+
+from .typing import Protocol
+
+
+class JSONSerializer(Protocol):
+    name: str
+
+    def dumps(self, obj: Any) -> bytes:
+        pass
+
+    def loads(self, data: bytes) -> Any:
+        pass
+
+
+class StdlibJSONSerializer:
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonJSONSerializer:
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._orjson = orjson
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._orjson.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self._orjson.loads(data)
+
+
+def default_json_serializer() -> JSONSerializer:
+    """Uses orjson when it is installed, e.g. pip install conformity-migration-tool[fast-json]"""
+    try:
+        return OrjsonJSONSerializer()
+    except ImportError:
+        return StdlibJSONSerializer()
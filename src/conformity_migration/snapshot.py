@@ -0,0 +1,535 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from .conformity_api import (
+    ConformityAPI,
+    ConformityError,
+    ConformityResourceNotFoundError,
+    ReadOnlyConformityAPI,
+)
+from .models import (
+    Account,
+    AccountDetails,
+    Check,
+    CommunicationSettings,
+    Group,
+    Note,
+    Profile,
+    ReportConfig,
+    Rule,
+    User,
+)
+
+SNAPSHOT_SCHEMA_VERSION = 1
+
+# record kinds
+KIND_CURRENT_USER = "current-user"
+KIND_ORGANISATION = "organisation"
+KIND_USER = "user"
+KIND_GROUP = "group"
+KIND_GROUP_DETAILS = "group-details"
+KIND_ACCOUNT = "account"
+KIND_ACCOUNT_DETAILS = "account-details"
+KIND_ACCOUNT_ACCESS = "account-access"
+KIND_RULE = "rule"
+KIND_CHECK = "check"
+KIND_COM_SETTING = "com-setting"
+KIND_REPORT_CONFIG = "report-config"
+KIND_ORG_PROFILE = "org-profile"
+KIND_PROFILE = "profile"
+KIND_PROFILE_DETAILS = "profile-details"
+
+# parent of report configs
+ORGANISATION_PARENT = "organisation"
+
+
+def _encode(data: Any) -> bytes:
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+
+def _decode(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def _note_to_dict(note: Note) -> Dict[str, Any]:
+    return vars(note)
+
+
+def _dict_to_note(n: Dict[str, Any]) -> Note:
+    return Note(note=n["note"], created_by=n["created_by"], created_ts=n["created_ts"])
+
+
+def _user_to_dict(user: User) -> Dict[str, Any]:
+    return vars(user)
+
+
+def _dict_to_user(u: Dict[str, Any]) -> User:
+    return User(**u)
+
+
+def _group_to_dict(group: Group) -> Dict[str, Any]:
+    return {
+        "group_id": group.group_id,
+        "name": group.name,
+        "tags": group.tags,
+        "group_type": group.group_type,
+        "cloud_type": group.cloud_type,
+        "cloud_data": group.cloud_data,
+    }
+
+
+def _dict_to_group(g: Dict[str, Any]) -> Group:
+    return Group(**g)
+
+
+def _check_to_dict(check: Check) -> Dict[str, Any]:
+    c = dict(vars(check))
+    c["notes"] = [_note_to_dict(n) for n in check.notes]
+    return c
+
+
+def _dict_to_check(c: Dict[str, Any]) -> Check:
+    c = dict(c)
+    c["notes"] = [_dict_to_note(n) for n in c.get("notes", [])]
+    return Check(**c)
+
+
+def _rule_to_dict(rule: Rule) -> Dict[str, Any]:
+    return {
+        "setting": rule.setting,
+        "notes": [_note_to_dict(n) for n in rule.notes],
+    }
+
+
+def _dict_to_rule(r: Dict[str, Any]) -> Rule:
+    return Rule(
+        setting=r["setting"], notes=[_dict_to_note(n) for n in r.get("notes", [])]
+    )
+
+
+def _com_setting_to_dict(cs: CommunicationSettings) -> Dict[str, Any]:
+    return {
+        "com_setting_id": cs.com_setting_id,
+        "channel": cs.channel,
+        "enabled": cs.enabled,
+        "filter": cs.filter,
+        "configuration": cs.configuration,
+    }
+
+
+def _dict_to_com_setting(cs: Dict[str, Any]) -> CommunicationSettings:
+    return CommunicationSettings(**cs)
+
+
+class SnapshotWriter:
+    """
+    Writes records into a snapshot file: a SQLite database where each record
+    is stored as zlib-compressed JSON, keyed by its kind, parent and key.
+    Records are written into a temporary file next to the snapshot file, which
+    replaces it only once closed, so a failed export keeps the previous one.
+    """
+
+    def __init__(self, path: Union[str, Path], commit_every=500) -> None:
+        self._path = Path(path)
+        self._tmp_path = self._path.with_name(self._path.name + ".tmp")
+        if self._tmp_path.exists():
+            # left by an export that was interrupted
+            self._tmp_path.unlink()
+        self._conn = sqlite3.connect(str(self._tmp_path))
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE records (
+                kind TEXT NOT NULL,
+                parent TEXT NOT NULL,
+                key TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (kind, parent, key)
+            );
+            CREATE INDEX records_kind_key ON records (kind, key);
+            """
+        )
+        self._commit_every = commit_every
+        self._uncommitted = 0
+        self._seq = 0
+        self.record_count = 0
+
+    def put(self, kind: str, key: str, data: Any, parent: str = "") -> None:
+        self._seq += 1
+        self._conn.execute(
+            "INSERT OR REPLACE INTO records (kind, parent, key, seq, data) VALUES (?, ?, ?, ?, ?)",
+            (kind, parent, key, self._seq, _encode(data)),
+        )
+        self.record_count += 1
+        self._uncommitted += 1
+        if self._uncommitted >= self._commit_every:
+            self._conn.commit()
+            self._uncommitted = 0
+
+    def set_meta(self, name: str, value: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value)
+        )
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.execute("VACUUM")
+        self._conn.close()
+        os.replace(self._tmp_path, self._path)
+
+    def discard(self) -> None:
+        self._conn.close()
+        self._tmp_path.unlink()
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def export_snapshot(
+    api: ConformityAPI,
+    path: Union[str, Path],
+    on_progress: Optional[Callable[[str], None]] = None,
+) -> int:
+    """
+    Streams the whole organisation behind the API into a snapshot file, one
+    record at a time, and returns the number of records written.
+    """
+
+    def progress(msg: str):
+        if on_progress is not None:
+            on_progress(msg)
+
+    with SnapshotWriter(path) as w:
+        w.set_meta("schema_version", str(SNAPSHOT_SCHEMA_VERSION))
+        w.set_meta("created_ts", str(int(time.time())))
+
+        w.put(KIND_CURRENT_USER, "", _user_to_dict(api.current_user()))
+        w.put(
+            KIND_ORGANISATION,
+            "",
+            {
+                "id": api.get_organisation_id(),
+                "external_id": api.get_organisation_external_id(),
+            },
+        )
+
+        progress("Users")
+        for user in api.get_all_users():
+            w.put(KIND_USER, user.user_id, _user_to_dict(user))
+
+        progress("Organisation Profile")
+        org_profile = api.get_organisation_profile(include_rule_settings=True)
+        w.put(KIND_ORG_PROFILE, "", org_profile.settings)
+
+        progress("Custom Profiles")
+        for profile in api.get_custom_profiles():
+            w.put(KIND_PROFILE, profile.profile_id, profile.settings)
+            profile_with_rules = api.get_profile(
+                profile_id=profile.profile_id, include_rule_settings=True
+            )
+            w.put(KIND_PROFILE_DETAILS, profile.profile_id, profile_with_rules.settings)
+
+        progress("Organisation Report Configs")
+        for rconf in api.list_organisation_report_configs():
+            w.put(
+                KIND_REPORT_CONFIG,
+                rconf.report_config_id,
+                rconf.data,
+                parent=ORGANISATION_PARENT,
+            )
+
+        progress("Organisation Communication Settings")
+        for cs in api.get_communication_settings(acct_id=""):
+            w.put(KIND_COM_SETTING, cs.com_setting_id, _com_setting_to_dict(cs))
+
+        progress("Groups")
+        for group in api.list_groups():
+            w.put(KIND_GROUP, group.group_id, _group_to_dict(group))
+            if group.group_type == Group.GROUP_TYPE_MANAGED_GROUP:
+                details = api.get_group_details(group_id=group.group_id)
+                w.put(KIND_GROUP_DETAILS, group.group_id, details)
+            for rconf in api.list_group_report_configs(group_id=group.group_id):
+                w.put(
+                    KIND_REPORT_CONFIG,
+                    rconf.report_config_id,
+                    rconf.data,
+                    parent=f"group:{group.group_id}",
+                )
+
+        for acct in api.list_accounts():
+            progress(f"Account: {acct.name}")
+            _export_account(api=api, w=w, acct=acct)
+
+        return w.record_count
+
+
+def _export_account(api: ConformityAPI, w: SnapshotWriter, acct: Account) -> None:
+    acct_id = acct.account_id
+    w.put(KIND_ACCOUNT, acct_id, acct.data)
+
+    details = api.get_account_details(acct_id=acct_id)
+    w.put(KIND_ACCOUNT_DETAILS, acct_id, details.data)
+
+    if acct.cloud_type == "aws":
+        try:
+            access_conf = api.get_account_access_configuration(acct_id=acct_id)
+            w.put(KIND_ACCOUNT_ACCESS, acct_id, access_conf)
+        except ConformityResourceNotFoundError:
+            pass
+
+    for rule in details.rules:
+        rule_with_notes = api.get_account_rule_setting(
+            acct_id=acct_id, rule_id=rule.rule_id, with_notes=True
+        )
+        w.put(KIND_RULE, rule.rule_id, _rule_to_dict(rule_with_notes), parent=acct_id)
+
+    for cs in api.get_communication_settings(acct_id=acct_id):
+        w.put(KIND_COM_SETTING, cs.com_setting_id, _com_setting_to_dict(cs), acct_id)
+
+    for rconf in api.list_account_report_configs(acct_id=acct_id):
+        w.put(
+            KIND_REPORT_CONFIG,
+            rconf.report_config_id,
+            rconf.data,
+            parent=f"account:{acct_id}",
+        )
+
+    for check in api.get_suppressed_checks(acct_id=acct_id):
+        if not check.notes:
+            check.notes = api.get_check_detail(
+                check_id=check.check_id, with_notes=True
+            ).notes
+        w.put(KIND_CHECK, check.check_id, _check_to_dict(check), parent=acct_id)
+
+
+class SnapshotConformityAPI:
+    """
+    Read-only ConformityAPI backed by a snapshot file created by export_snapshot().
+    Records are read from the file on demand, so memory stays flat regardless
+    of the size of the organisation.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self._path = Path(path)
+        if not self._path.is_file():
+            raise FileNotFoundError(f"Snapshot file does not exist: {path}")
+        self._local = threading.local()
+        version = (
+            self._conn()
+            .execute("SELECT value FROM meta WHERE name = 'schema_version'")
+            .fetchone()
+        )
+        if version is None or int(version[0]) != SNAPSHOT_SCHEMA_VERSION:
+            raise ConformityError(f"Unsupported snapshot file: {path}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self._path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def _get(self, kind: str, key: str = "", parent: str = "") -> Any:
+        row = (
+            self._conn()
+            .execute(
+                "SELECT data FROM records WHERE kind = ? AND parent = ? AND key = ?",
+                (kind, parent, key),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise ConformityResourceNotFoundError(
+                f"Not found in snapshot: {kind} {key}"
+            )
+        return _decode(row[0])
+
+    def _iter(self, kind: str, parent: str = "") -> Iterator[Any]:
+        cursor = self._conn().execute(
+            "SELECT data FROM records WHERE kind = ? AND parent = ? ORDER BY seq",
+            (kind, parent),
+        )
+        for (data,) in cursor:
+            yield _decode(data)
+
+    def __getattr__(self, name):
+        if name in ReadOnlyConformityAPI.MUTATING_METHODS:
+
+            def _reject(*args, **kwargs):
+                raise ConformityError(f"Not allowed on a snapshot: {name}")
+
+            return _reject
+        raise AttributeError(name)
+
+    def current_user(self) -> User:
+        return _dict_to_user(self._get(KIND_CURRENT_USER))
+
+    def get_organisation_id(self) -> str:
+        return self._get(KIND_ORGANISATION)["id"]
+
+    def get_organisation_external_id(self) -> str:
+        return self._get(KIND_ORGANISATION)["external_id"]
+
+    def get_all_users(self) -> Iterable[User]:
+        for u in self._iter(KIND_USER):
+            yield _dict_to_user(u)
+
+    def get_organisation_profile(self, include_rule_settings=False) -> Profile:
+        settings = self._get(KIND_ORG_PROFILE)
+        if not include_rule_settings:
+            settings.pop("included", None)
+        return Profile(settings=settings)
+
+    def get_custom_profiles(self) -> Iterable[Profile]:
+        for settings in self._iter(KIND_PROFILE):
+            yield Profile(settings=settings)
+
+    def get_profile(self, profile_id: str, include_rule_settings=False) -> Profile:
+        settings = self._get(KIND_PROFILE_DETAILS, key=profile_id)
+        if not include_rule_settings:
+            settings.pop("included", None)
+        return Profile(settings=settings)
+
+    def list_organisation_report_configs(self) -> List[ReportConfig]:
+        return [
+            ReportConfig(data=d)
+            for d in self._iter(KIND_REPORT_CONFIG, parent=ORGANISATION_PARENT)
+        ]
+
+    def list_group_report_configs(self, group_id: str) -> List[ReportConfig]:
+        return [
+            ReportConfig(data=d)
+            for d in self._iter(KIND_REPORT_CONFIG, parent=f"group:{group_id}")
+        ]
+
+    def list_account_report_configs(self, acct_id: str) -> List[ReportConfig]:
+        return [
+            ReportConfig(data=d)
+            for d in self._iter(KIND_REPORT_CONFIG, parent=f"account:{acct_id}")
+        ]
+
+    def list_groups(
+        self, include_group_types: Optional[List[str]] = None
+    ) -> Iterable[Group]:
+        for g in self._iter(KIND_GROUP):
+            group = _dict_to_group(g)
+            if include_group_types and group.group_type not in include_group_types:
+                continue
+            yield group
+
+    def get_group_details(self, group_id: str) -> Dict[str, Any]:
+        return self._get(KIND_GROUP_DETAILS, key=group_id)
+
+    def list_accounts(self) -> Iterable[Account]:
+        for acct_data in self._iter(KIND_ACCOUNT):
+            yield Account(acct_data=acct_data)
+
+    def get_account_details(self, acct_id: str) -> AccountDetails:
+        return AccountDetails(acct_data=self._get(KIND_ACCOUNT_DETAILS, key=acct_id))
+
+    def get_account_access_configuration(self, acct_id: str) -> Dict[str, Any]:
+        return self._get(KIND_ACCOUNT_ACCESS, key=acct_id)
+
+    def get_account_bot_settings(self, acct_id: str) -> dict:
+        return self.get_account_details(acct_id=acct_id).bot_settings or {}
+
+    def get_account_rules_settings(self, acct_id: str) -> list:
+        return [r.setting for r in self.get_account_details(acct_id=acct_id).rules]
+
+    def get_account_rule_setting(
+        self, acct_id: str, rule_id: str, with_notes=False
+    ) -> Rule:
+        rule = _dict_to_rule(self._get(KIND_RULE, key=rule_id, parent=acct_id))
+        if not with_notes:
+            rule.notes = []
+        return rule
+
+    def get_communication_settings(self, acct_id: str) -> List[CommunicationSettings]:
+        return [
+            _dict_to_com_setting(cs)
+            for cs in self._iter(KIND_COM_SETTING, parent=acct_id)
+        ]
+
+    def is_bot_scan_done(self, acct_id: str) -> bool:
+        return True
+
+    def _check_matches(self, check: Check, filters: Dict[str, Any]) -> bool:
+        rule_ids = filters.get("ruleIds")
+        services = filters.get("services")
+        regions = filters.get("regions")
+        resource = filters.get("resource")
+        return (
+            (not rule_ids or check.rule_id in rule_ids)
+            and (not services or check.service in services)
+            and (not regions or check.region in regions)
+            and (not resource or check.resource == resource)
+        )
+
+    def get_checks(
+        self,
+        acct_id: str,
+        filters: Optional[Dict[str, Any]] = None,
+        limit=0,
+        offset=0,
+    ) -> Iterable[Check]:
+        """Only the suppressed checks are part of a snapshot."""
+        if filters and filters.get("suppressed") is False:
+            return
+        matched = 0
+        total = 0
+        for c in self._iter(KIND_CHECK, parent=acct_id):
+            check = _dict_to_check(c)
+            if filters and not self._check_matches(check, filters):
+                continue
+            matched += 1
+            if matched <= offset:
+                continue
+            yield check
+            total += 1
+            if 0 < limit <= total:
+                return
+
+    def count_checks(
+        self, acct_id: str, filters: Optional[Dict[str, Any]] = None
+    ) -> int:
+        return sum(1 for _ in self.get_checks(acct_id=acct_id, filters=filters))
+
+    def get_suppressed_checks(self, acct_id: str, limit=0, offset=0) -> Iterable[Check]:
+        return self.get_checks(
+            acct_id=acct_id, filters={"suppressed": True}, limit=limit, offset=offset
+        )
+
+    def count_suppressed_checks(self, acct_id: str) -> int:
+        return self.count_checks(acct_id=acct_id, filters={"suppressed": True})
+
+    def get_check_detail(
+        self, check_id: str, with_notes=False, notes_limit=100
+    ) -> Check:
+        row = (
+            self._conn()
+            .execute(
+                "SELECT data FROM records WHERE kind = ? AND key = ?",
+                (KIND_CHECK, check_id),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise ConformityResourceNotFoundError(f"Check not in snapshot: {check_id}")
+        check = _dict_to_check(_decode(row[0]))
+        check.notes = check.notes[:notes_limit] if with_notes else []
+        return check
@@ -0,0 +1,156 @@
+import csv
+from pathlib import Path
+from typing import (
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from conformity_migration.cloud_accounts import (
+    CloudAccountAdder,
+    get_cloud_account_adder,
+)
+from conformity_migration.conformity_api import (
+    CloudOneConformityAPI,
+    ConformityAPI,
+    LegacyConformityAPI,
+)
+from conformity_migration.models import Account, Group
+
+from .di import app_config
+from .sharding import Shard
+from .spill import SpillDict
+
+AccountEnv = Tuple[str, str]
+
+
+# number of legacy accounts to add to CloudOne Conformity that are held in memory at once
+ACCOUNT_ADD_BATCH_SIZE = 100
+
+
+def read_accts_file(accounts_file: str) -> Set[AccountEnv]:
+    accts = set()
+    accounts_path = Path(accounts_file.strip())
+    if not accounts_path.exists():
+        raise FileNotFoundError(f"File does not exists: {accounts_file}")
+    if not accounts_path.is_file():
+        raise FileNotFoundError(f"Not a regular file: {accounts_file}")
+
+    with open(accounts_path, newline="", mode="r") as fh:
+        csvr = csv.reader(fh, dialect="excel")
+        for row in csvr:
+            acct_name = row[0]
+            acct_env = row[1] if len(row) > 1 else ""
+            accts.add((acct_name, acct_env))
+    return accts
+
+
+def acct_env_suffix(acct_environment: str) -> str:
+    return f" ({acct_environment})" if acct_environment else ""
+
+
+def acct_label(acct: Account) -> str:
+    return f"{acct.name}{acct_env_suffix(acct.environment)}"
+
+
+def spill_dict() -> SpillDict:
+    return SpillDict(threshold=app_config()["SPILL_TO_DISK_THRESHOLD"])
+
+
+def cloud_account_adders(
+    legacy_api: ConformityAPI,
+    c1_api: ConformityAPI,
+    updated_aws_stacks: Union[bool, Collection[str]] = False,
+) -> Callable[[str], Optional[CloudAccountAdder]]:
+    """
+    Returns a function that creates the account adder of a cloud type once.
+    See AWSCloudAccountAdder for updated_aws_stacks.
+    """
+    adders: Dict[str, Optional[CloudAccountAdder]] = dict()
+
+    def acct_adder_for(cloud_type: str) -> Optional[CloudAccountAdder]:
+        if cloud_type not in adders:
+            adders[cloud_type] = get_cloud_account_adder(
+                cloud_type=cloud_type,
+                legacy_api=legacy_api,
+                c1_api=c1_api,
+                updated_aws_stacks=updated_aws_stacks,
+            )
+        return adders[cloud_type]
+
+    return acct_adder_for
+
+
+def index_c1_accounts(
+    c1_accts: Iterable[Account],
+    acct_adder_for: Callable[[str], Optional[CloudAccountAdder]],
+) -> Dict[str, Dict[str, str]]:
+    """
+    Returns {cloud_type: {account unique attribute: CloudOne account id}} so
+    that only the attributes needed for matching are kept in memory.
+    """
+    index: Dict[str, Dict[str, str]] = dict()
+    for c1_acct in c1_accts:
+        acct_adder = acct_adder_for(c1_acct.cloud_type)
+        if acct_adder is None:
+            continue
+        cloud_type_index = index.setdefault(c1_acct.cloud_type, dict())
+        cloud_type_index.setdefault(
+            acct_adder.account_uniq_attrib(c1_acct), c1_acct.account_id
+        )
+    return index
+
+
+def include_exclude_accts(
+    legacy_accts: Iterable[Account],
+    include_accts=Optional[Set[AccountEnv]],
+    exclude_accts=Optional[Set[AccountEnv]],
+    shard: Optional[Shard] = None,
+) -> Iterable[Account]:
+    # a value of None means it will not choose any account to include -- all accounts will be added to Cloud One unless in the excluded list
+    # a value of an empty set means it will include nothing -- no account will be added to Cloud One
+    if include_accts is not None:
+        legacy_accts = (
+            acct
+            for acct in legacy_accts
+            if (acct.name, acct.environment) in include_accts
+        )
+
+    # a value of None or of an empty set means the same thing: it will exclude nothing
+    if exclude_accts:
+        legacy_accts = (
+            acct
+            for acct in legacy_accts
+            if (acct.name, acct.environment) not in exclude_accts
+        )
+
+    if shard is not None:
+        legacy_accts = (
+            acct for acct in legacy_accts if shard.includes(acct.account_id)
+        )
+
+    return legacy_accts
+
+
+def missing_managed_groups(
+    legacy_api: LegacyConformityAPI, c1_api: CloudOneConformityAPI
+) -> Iterator[Group]:
+    legacy_managed_groups = legacy_api.list_groups(
+        include_group_types=[Group.GROUP_TYPE_MANAGED_GROUP]
+    )
+    c1_managed_groups = c1_api.list_groups(
+        include_group_types=[Group.GROUP_TYPE_MANAGED_GROUP]
+    )
+    c1_managed_groups_set = set(c1_managed_groups)
+
+    for mg in legacy_managed_groups:
+        if mg in c1_managed_groups_set:
+            # log.info(f"Managed Group {mg.name} ({mg.cloud_type.upper()}) already exists!")
+            continue
+        yield mg
@@ -4,7 +4,7 @@ import json
 import multiprocessing as mp
 import time
 from dataclasses import dataclass
-from typing import Iterable, Tuple
+from typing import Iterable, Optional, Tuple
 
 import boto3
 import click
@@ -17,6 +17,7 @@ from mypy_boto3_cloudformation.type_defs import (
 
 from .cli import include_exclude_accts, read_accts_file
 from .di import c1_conformity_api, legacy_conformity_api
+from .profiling import profiled, worker_profile_out
 
 
 @dataclass
@@ -227,6 +228,13 @@ def generate_csv(csv_file: str, include_accounts_file: str, exclude_accounts_fil
     type=str,
     help="CSV file containing accounts that will be excluded. Each row should consists of 2 fields: first is the account name and second is the environment as they appear on Conformity Dashboard.",
 )
+@click.option(
+    "--profile-out",
+    type=click.Path(file_okay=True, dir_okay=False, writable=True),
+    required=False,
+    default=None,
+    help="Profiles the command, including its worker processes, and writes the profile to this file: a cProfile (pstats) file, or stack samples for flame graphs when it ends with .folded",
+)
 @click.pass_context
 def update_stack(
     ctx,
@@ -241,7 +249,10 @@ def update_stack(
     cross_account_role_name: str,
     include_accounts_file: str,
     exclude_accounts_file: str,
+    profile_out: Optional[str],
 ):
+    # written once the command is done, with the profiles of the worker processes
+    ctx.with_resource(profiled(profile_out))
     # region = ctx.obj["region"]
     # profile = ctx.obj["profile"]
     if not external_id:
@@ -285,7 +296,9 @@ def update_stack(
     accts = list(accts)
     proc_count = min(len(accts), 10)
     with mp.Pool(processes=proc_count) as pool:
-        params = _update_stack_params(accts=accts, external_id=external_id)
+        params = _update_stack_params(
+            accts=accts, external_id=external_id, profile_out=profile_out
+        )
         pool.map(_update_stack_worker, params)
 
 
@@ -306,16 +319,19 @@ class AccountStackInfo:
 def _update_stack_params(
     accts: Iterable[AccountStackInfo],
     external_id: str,
-) -> Iterable[Tuple[AccountStackInfo, str]]:
+    profile_out: Optional[str] = None,
+) -> Iterable[Tuple[AccountStackInfo, str, Optional[str]]]:
     for acct in accts:
-        yield (acct, external_id)
+        yield (acct, external_id, profile_out)
 
 
-def _update_stack_worker(params: Tuple[AccountStackInfo, str]):
+def _update_stack_worker(params: Tuple[AccountStackInfo, str, Optional[str]]):
     # print(f"[Process: {os.getpid()}] Params: {params}")
-    acct, external_id = params
+    acct, external_id, profile_out = params
     try:
-        _update_stack(acct=acct, external_id=external_id)
+        # added to profile_out once update_stack is done
+        with profiled(worker_profile_out(profile_out) if profile_out else None):
+            _update_stack(acct=acct, external_id=external_id)
     except Exception as e:
         print(f"Failed to update stack for {acct.account_name}. Error: {e}")
 
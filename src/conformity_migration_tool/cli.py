@@ -1,27 +1,47 @@
 import atexit
-import csv
 import os
+import sys
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
-from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import click
 import yaml
-from PyInquirer import prompt
 
-from conformity_migration.cloud_accounts import get_cloud_account_adder
+from conformity_migration.cloud_accounts import (
+    AzureCloudAccountAdder,
+    CloudAccountAdder,
+)
 from conformity_migration.conformity_api import (
+    CheckSuppression,
+    CheckSuppressionResult,
     CloudOneConformityAPI,
     ConformityAPI,
     ConformityError,
     LegacyConformityAPI,
+    ReadOnlyConformityAPI,
 )
 from conformity_migration.models import (
     Account,
     AccountDetails,
     Check,
-    CommunicationSettings,
     Group,
     Note,
     Profile,
@@ -29,23 +49,84 @@ from conformity_migration.models import (
     Rule,
     User,
 )
+from conformity_migration.snapshot import export_snapshot
 
 from . import __version__ as tool_version
+from .accounts import (
+    ACCOUNT_ADD_BATCH_SIZE,
+    AccountEnv,
+    acct_env_suffix,
+    acct_label,
+    cloud_account_adders,
+    include_exclude_accts,
+    index_c1_accounts,
+    missing_managed_groups,
+    read_accts_file,
+    spill_dict,
+)
+from .communication import candidate_communication_settings
+from .concurrency import format_concurrency_limits
 from .di import (
+    api_cache_stats,
     app_config,
     c1_conformity_api,
+    concurrency_limit,
+    event_log,
+    http_metrics,
     legacy_conformity_api,
     logger,
+    progress_tracker,
+    rate_budget,
+    snapshot_legacy_conformity_api,
+    span_timers,
+    status_line,
+    tracer,
+    use_shard_log_files,
     user_config_path,
 )
-from .utils import str2bool
+from .events import (
+    ERROR,
+    OK,
+    RUN,
+    format_run_stats,
+    merge_shard_event_files,
+    summarize_events_file,
+)
+from .manual_actions import collect_manual_actions, prompt_azure_app_client_id
+from .metrics import format_cache_stats, format_http_metrics
+from .plan import format_plan, plan_migration
+from .priority import (
+    format_rate_budgets,
+    set_thread_priority,
+    task_priority,
+    thread_priority,
+)
+from .profiling import format_span_timers, profiled
+from .progress import ACCOUNTS, CHECKS, RULES, Countdown, ProgressDisplay
+from .prompts import (
+    ask_choices,
+    ask_confirmation,
+    ask_confirmation_or_auto_overwrite,
+    ask_confirmation_with_text_verification,
+    ask_input,
+    ask_when_mobile_verification__done,
+    ask_when_user_invite_done,
+)
+from .scheduler import TaskGraph, current_task_name
+from .sharding import Shard
+from .spill import SpillDict
+from .utils import chunked, prompt_lock, str2bool
+from .verify import (
+    MismatchReport,
+    RequestBudget,
+    RequestBudgetExhausted,
+    format_summary,
+    verify_migration,
+)
 
 log = logger()
 
 
-AccountEnv = Tuple[str, str]
-
-
 def create_user_config(user_conf_path: Path):
     if user_conf_path.exists():
         recreate_ok = ask_confirmation(
@@ -91,20 +172,6 @@ def create_user_config(user_conf_path: Path):
         return yaml.dump(conf, fh)
 
 
-def cloud_type_accts_map(accts: List[Account]) -> Dict[str, List[Account]]:
-    accts_map: Dict[str, List[Account]] = dict()
-
-    for acct in accts:
-        cloud_type_accts = accts_map.setdefault(acct.cloud_type, [])
-        cloud_type_accts.append(acct)
-
-    return accts_map
-
-
-def acct_env_suffix(acct_environment: str) -> str:
-    return f" ({acct_environment})" if acct_environment else ""
-
-
 def empty_legacy_conformity(legacy_api: LegacyConformityAPI):
     empty_conformity(api=legacy_api, conformity_type="Legacy")
 
@@ -140,7 +207,7 @@ def empty_conformity(api: ConformityAPI, conformity_type: str):
         log.info(f" -- {cs_id}")
         api.delete_communication_settings(com_setting_id=cs_id)
 
-    groups = api.list_groups()
+    groups = list(api.list_groups())
     for group in groups:
         log.info(f"Deleting Report Configs for group {group.name}")
         for rconf in api.list_group_report_configs(group_id=group.group_id):
@@ -178,87 +245,292 @@ this tool can migrate the Organisation Profile settings. Follow these steps to i
         done = ask_confirmation(msg="Are you done?", ask_if_sure=True)
 
 
+class MigrationContext:
+    """
+    Organisation-level state shared between migration tasks. It is filled in by
+    the "users" task which every task that needs it depends on.
+    """
+
+    def __init__(self) -> None:
+        self.legacy_users: List[User] = []
+        self.c1_users: List[User] = []
+        self.c1_org_id = ""
+
+
 def run_migration(
     legacy_api: LegacyConformityAPI,
     c1_api: CloudOneConformityAPI,
     include_accts=Optional[Set[AccountEnv]],
     exclude_accts=Optional[Set[AccountEnv]],
+    max_workers=1,
+    manual_actions_file: Optional[str] = None,
+    shard: Optional[Shard] = None,
 ):
-    # this is part of workaround fix for Conformity Public API
-    # will initialize Organisation Profile
-    prompt_initialize_organisation_profile()
+    """
+    With a shard, only its accounts are migrated, and the organisation-level
+    configurations only by the first shard (see Shard).
+    """
+    migrates_organisation = shard is None or shard.migrates_organisation
 
-    exec_migration_func(lambda: update_organisation_profile(legacy_api, c1_api))
+    if migrates_organisation:
+        # this is part of workaround fix for Conformity Public API
+        # will initialize Organisation Profile
+        prompt_initialize_organisation_profile()
+
+    manual_actions = collect_manual_actions(
+        legacy_api=legacy_api,
+        c1_api=c1_api,
+        include_accts=include_accts,
+        exclude_accts=exclude_accts,
+        manual_actions_file=manual_actions_file,
+        shard=shard,
+    )
 
-    exec_migration_func(lambda: add_managed_groups(legacy_api, c1_api))
+    ctx = MigrationContext()
+    graph = TaskGraph(
+        max_workers=max_workers, task_context=task_span, task_priority=task_priority
+    )
 
-    log.info("Adding all cloud accounts", flush=True)
-    cloud_accts_to_migrate = exec_migration_func(
-        lambda: add_cloud_accounts(
+    if migrates_organisation:
+        add_organisation_migration_tasks(
+            graph=graph,
+            legacy_api=legacy_api,
+            c1_api=c1_api,
+            ctx=ctx,
+            azure_app_keys=manual_actions.azure_app_keys,
+        )
+    else:
+        graph.add(
+            "managed-groups",
+            lambda: exec_migration_func(
+                lambda: wait_for_azure_directories(
+                    legacy_api=legacy_api,
+                    c1_api=c1_api,
+                    include_accts=include_accts,
+                    exclude_accts=exclude_accts,
+                    shard=shard,  # type: ignore
+                )
+            ),
+        )
+
+    accounts_deps = ["managed-groups"]
+    if migrates_organisation:
+        # accounts are added once the organisation profile they inherit is
+        # migrated; user-defined groups (which select accounts by the tags set
+        # by account:settings) and custom profiles (which accounts don't refer
+        # to) can be created meanwhile
+        accounts_deps.append("org-profile")
+    graph.add(
+        "accounts",
+        lambda: add_cloud_accounts_and_migration_tasks(
+            graph=graph,
             legacy_api=legacy_api,
             c1_api=c1_api,
+            ctx=ctx,
             include_accts=include_accts,
             exclude_accts=exclude_accts,
+            shard=shard,
+            updated_aws_stacks=manual_actions.updated_aws_stacks,
+        ),
+        deps=accounts_deps,
+    )
+
+    graph.add(
+        "users",
+        lambda: migrate_users(legacy_api, c1_api, ctx, invite=migrates_organisation),
+    )
+
+    with event_log().operation(RUN):
+        graph.run()
+
+
+def add_organisation_migration_tasks(
+    graph: TaskGraph,
+    legacy_api: LegacyConformityAPI,
+    c1_api: CloudOneConformityAPI,
+    ctx: MigrationContext,
+    azure_app_keys: Dict[str, str],
+):
+    """Adds the tasks migrating the organisation-level configurations"""
+    graph.add(
+        "org-profile",
+        lambda: exec_migration_func(
+            lambda: update_organisation_profile(legacy_api, c1_api)
+        ),
+    )
+
+    graph.add(
+        "managed-groups",
+        lambda: exec_migration_func(
+            lambda: add_managed_groups(legacy_api, c1_api, azure_app_keys)
+        ),
+    )
+
+    graph.add(
+        "user-groups",
+        lambda: exec_migration_func(
+            lambda: create_user_defined_groups(legacy_api, c1_api)
+        ),
+    )
+
+    graph.add(
+        "custom-profiles",
+        lambda: exec_migration_func(lambda: copy_custom_profiles(legacy_api, c1_api)),
+    )
+
+    graph.add(
+        "org-report-configs",
+        lambda: exec_migration_func(
+            lambda: copy_organisation_report_configs(legacy_api, c1_api)
+        ),
+    )
+
+    graph.add(
+        "group-configs",
+        lambda: exec_migration_func(
+            lambda: migrate_all_groups_configs(legacy_api, c1_api)
+        ),
+        deps=["managed-groups", "user-groups"],
+    )
+
+    def copy_org_communication_channel_settings():
+        log.info(
+            "Copying communication channel settings (organisation-level)", flush=True
+        )
+        exec_migration_func(
+            lambda: copy_communication_channel_settings(
+                legacy_api=legacy_api,
+                c1_api=c1_api,
+                legacy_acct_id="",
+                c1_acct_id="",
+                legacy_users=ctx.legacy_users,
+                c1_users=ctx.c1_users,
+                c1_org_id=ctx.c1_org_id,
+            )
         )
+
+    graph.add(
+        "org-comm-settings", copy_org_communication_channel_settings, deps=["users"]
     )
-    if cloud_accts_to_migrate is None:
-        cloud_accts_to_migrate = dict()
 
+
+def task_span(task_name: str) -> ContextManager:
+    if task_name.startswith("account:"):
+        # account:<legacy account id>:<stage>[:<chunk>]
+        _, legacy_acct_id, stage = task_name.split(":", 3)[:3]
+        return tracer().span(
+            task_name, category="account", legacy_account=legacy_acct_id, stage=stage
+        )
+    return tracer().span(task_name, category="stage")
+
+
+def show_migration_plan(
+    legacy_api: ConformityAPI,
+    c1_api: ConformityAPI,
+    include_accts=Optional[Set[AccountEnv]],
+    exclude_accts=Optional[Set[AccountEnv]],
+    max_workers=1,
+):
+    plan = plan_migration(
+        legacy_api=legacy_api,
+        c1_api=c1_api,
+        include_accts=include_accts,
+        exclude_accts=exclude_accts,
+    )
+    app_conf = app_config()
+    log.info("")
+    log.info(
+        format_plan(
+            plan=plan,
+            rate_limit_per_sec=app_conf["API_RATE_LIMIT_PER_SEC"],
+            avg_latency_secs=app_conf["API_ESTIMATED_LATENCY_SECS"],
+            max_workers=max_workers,
+        )
+    )
+
+
+def invalidate_cached_reads(api: ConformityAPI, *methods: str):
+    # only there when the API results are cached, see API_CACHE_TTL_SECS
+    invalidate_cache = getattr(api, "invalidate_cache", None)
+    if invalidate_cache is not None:
+        invalidate_cache(*methods)
+
+
+def migrate_users(
+    legacy_api: LegacyConformityAPI,
+    c1_api: CloudOneConformityAPI,
+    ctx: MigrationContext,
+    invite=True,
+):
     log.info("Retrieving Legacy Conformity Users", flush=True)
-    legacy_users = legacy_api.get_all_users()
+    legacy_users = list(legacy_api.get_all_users())
 
     log.info("Retrieving CloudOne Conformity Users", flush=True)
-    c1_users = c1_api.get_all_users()
+    c1_users = list(c1_api.get_all_users())
 
-    users_to_invite = set(legacy_users).difference(set(c1_users))
+    # without invite, the users are only read, e.g. by shards other than the first
+    users_to_invite = set(legacy_users).difference(set(c1_users)) if invite else set()
     if users_to_invite:
         invite_users(users_to_invite)
 
-    users_to_verify_mobile = [user for user in legacy_users if user.is_mobile_verified]
+    users_to_verify_mobile = [
+        user for user in legacy_users if invite and user.is_mobile_verified
+    ]
     if users_to_verify_mobile:
         verify_users_mobile_numbers(users_to_verify_mobile)
 
     if any([users_to_invite, users_to_verify_mobile]):
         log.info("Retrieving updated list of CloudOne Conformity Users", flush=True)
-        c1_users = c1_api.get_all_users()
+        # the users were invited outside of this tool
+        invalidate_cached_reads(c1_api, "get_all_users")
+        c1_users = list(c1_api.get_all_users())
 
-    exec_migration_func(lambda: create_user_defined_groups(legacy_api, c1_api))
+    ctx.legacy_users = legacy_users
+    ctx.c1_users = c1_users
+    ctx.c1_org_id = c1_api.get_organisation_id()
 
-    exec_migration_func(lambda: copy_custom_profiles(legacy_api, c1_api))
 
-    exec_migration_func(lambda: copy_organisation_report_configs(legacy_api, c1_api))
-
-    exec_migration_func(lambda: migrate_all_groups_configs(legacy_api, c1_api))
-
-    c1_org_id = c1_api.get_organisation_id()
-
-    log.info("Copying communication channel settings (organisation-level)", flush=True)
-    exec_migration_func(
-        lambda: copy_communication_channel_settings(
+def add_cloud_accounts_and_migration_tasks(
+    graph: TaskGraph,
+    legacy_api: LegacyConformityAPI,
+    c1_api: CloudOneConformityAPI,
+    ctx: MigrationContext,
+    include_accts=Optional[Set[AccountEnv]],
+    exclude_accts=Optional[Set[AccountEnv]],
+    shard: Optional[Shard] = None,
+    updated_aws_stacks: Union[bool, Collection[str]] = False,
+):
+    log.info("Adding all cloud accounts", flush=True)
+    cloud_accts_to_migrate = exec_migration_func(
+        lambda: add_cloud_accounts(
             legacy_api=legacy_api,
             c1_api=c1_api,
-            legacy_acct_id="",
-            c1_acct_id="",
-            legacy_users=legacy_users,
-            c1_users=c1_users,
-            c1_org_id=c1_org_id,
+            include_accts=include_accts,
+            exclude_accts=exclude_accts,
+            shard=shard,
+            updated_aws_stacks=updated_aws_stacks,
         )
     )
-
-    for _, acct_id_map in cloud_accts_to_migrate.items():
-        for legacy_acct_id, c1_acct_id in acct_id_map.items():
-            exec_migration_func(
-                lambda: migrate_account_configurations(
+    if cloud_accts_to_migrate is None:
+        return
+    progress_tracker().add_total(ACCOUNTS, len(cloud_accts_to_migrate))
+
+    def account_migration_tasks():
+        # account tasks are added as the graph has room for them, so the tasks
+        # of all the accounts are never in memory at once
+        with cloud_accts_to_migrate:
+            for legacy_acct_id, c1_acct_id in cloud_accts_to_migrate.items():
+                add_account_migration_tasks(
+                    graph=graph,
                     legacy_api=legacy_api,
                     c1_api=c1_api,
                     legacy_acct_id=legacy_acct_id,
                     c1_acct_id=c1_acct_id,
-                    legacy_users=legacy_users,
-                    c1_users=c1_users,
-                    c1_org_id=c1_org_id,
+                    ctx=ctx,
                 )
-            )
-            log.info("")
+                yield
+
+    graph.add_feeder(account_migration_tasks())
 
 
 def migrate_all_groups_configs(
@@ -305,29 +577,19 @@ def update_organisation_profile(
     c1_api.update_organisation_profile(profile=legacy_org_profile)
 
 
-def include_exclude_accts(
-    legacy_accts: List[Account],
-    include_accts=Optional[Set[AccountEnv]],
-    exclude_accts=Optional[Set[AccountEnv]],
-) -> List[Account]:
-    # a value of None means it will not choose any account to include -- all accounts will be added to Cloud One unless in the excluded list
-    # a value of an empty set means it will include nothing -- no account will be added to Cloud One
-    if include_accts is not None:
-        legacy_accts = [
-            acct
-            for acct in legacy_accts
-            if (acct.name, acct.environment) in include_accts
-        ]
-
-    # a value of None or of an empty set means the same thing: it will exclude nothing
-    if exclude_accts:
-        legacy_accts = [
-            acct
-            for acct in legacy_accts
-            if (acct.name, acct.environment) not in exclude_accts
-        ]
-
-    return legacy_accts
+def add_cloud_account(
+    acct_adder: CloudAccountAdder,
+    acct: Account,
+    access: "Future[Optional[Dict[str, Any]]]",
+) -> Optional[str]:
+    acct_access = access.result()
+    if acct_access is None:
+        # reading it failed and was skipped
+        return None
+    log.info(f" --> Account: {acct.name}{acct_env_suffix(acct.environment)}")
+    return exec_migration_func(
+        lambda: acct_adder.account_add(acct=acct, access=acct_access)
+    )
 
 
 def add_cloud_accounts(
@@ -335,61 +597,103 @@ def add_cloud_accounts(
     c1_api: CloudOneConformityAPI,
     include_accts=Optional[Set[AccountEnv]],
     exclude_accts=Optional[Set[AccountEnv]],
-) -> Dict[str, Dict[str, str]]:
-
-    c1_accts = c1_api.list_accounts()
-    legacy_accts = legacy_api.list_accounts()
+    shard: Optional[Shard] = None,
+    updated_aws_stacks: Union[bool, Collection[str]] = False,
+) -> SpillDict:
+    """
+    Adds the legacy accounts missing in CloudOne Conformity and returns the
+    legacy account ids to migrate, mapped to their CloudOne account id.
+    See AWSCloudAccountAdder for updated_aws_stacks.
+
+    Accounts are processed as they are read from the legacy API, in batches:
+    the access configurations of a whole batch are read concurrently, and the
+    accounts are added concurrently as soon as their access configuration is
+    read. Added accounts are returned in the order they were added.
+    """
+    app_conf = app_config()
+    acct_adder_for = cloud_account_adders(
+        legacy_api=legacy_api, c1_api=c1_api, updated_aws_stacks=updated_aws_stacks
+    )
+    c1_accts_index = index_c1_accounts(c1_api.list_accounts(), acct_adder_for)
 
     legacy_accts = include_exclude_accts(
-        legacy_accts=legacy_accts,
+        legacy_accts=legacy_api.list_accounts(),
         include_accts=include_accts,
         exclude_accts=exclude_accts,
+        shard=shard,
     )
 
-    legacy_cloud_type_accts_map = cloud_type_accts_map(legacy_accts)
-    c1_cloud_type_accts_map = cloud_type_accts_map(c1_accts)
-
-    cloud_accts_to_migrate: Dict[str, Dict[str, str]] = dict()
-
-    for cloud_type, legacy_accts in legacy_cloud_type_accts_map.items():
-        acct_adder = get_cloud_account_adder(
-            cloud_type=cloud_type, legacy_api=legacy_api, c1_api=c1_api
-        )
-        if acct_adder is None:
-            log.info(f"Does not support {cloud_type.upper()} yet! Skipping it.")
-            continue
+    cloud_accts_to_migrate = spill_dict()
 
-        log.info(f"Adding {cloud_type.upper()} accounts to CloudOne Conformity:")
-        c1_cloud_type_accounts = c1_cloud_type_accts_map.get(cloud_type, [])
+    def accts_to_add() -> Iterator[Tuple[CloudAccountAdder, Account]]:
+        seen_cloud_types: Set[str] = set()
 
-        accts_to_migrate: Dict[str, str] = dict()
-        cloud_accts_to_migrate[cloud_type] = accts_to_migrate
         for acct in legacy_accts:
+            cloud_type = acct.cloud_type
+            acct_adder = acct_adder_for(cloud_type)
+            if cloud_type not in seen_cloud_types:
+                seen_cloud_types.add(cloud_type)
+                if acct_adder is None:
+                    log.info(f"Does not support {cloud_type.upper()} yet! Skipping it.")
+                else:
+                    log.info(
+                        f"Adding {cloud_type.upper()} accounts to CloudOne Conformity:"
+                    )
+            if acct_adder is None:
+                continue
+
             c1_acct_id: str
             exists, c1_acct_id = acct_adder.account_exists(
-                c1_accts=c1_cloud_type_accounts, acct=acct
+                c1_accts_index=c1_accts_index.get(cloud_type, {}), acct=acct
             )
+            if not exists:
+                yield acct_adder, acct
+                continue
+
             env_suffix = acct_env_suffix(acct.environment)
-            if exists:
-                log.info(
-                    f"Account {acct.name}{env_suffix} already exists in CloudOne Conformity!"
-                )
-                if not (
-                    ask_confirmation_or_auto_overwrite(
-                        "Do you want to migrate configurations for this account (will overwrite existing ones)?",
-                        ask_if_sure=True,
-                    )
-                ):
-                    continue
-            else:
-                log.info(f" --> Account: {acct.name}{env_suffix}")
-                c1_acct_id = exec_migration_func(
-                    lambda: acct_adder.account_add(acct=acct)  # type: ignore
+            log.info(
+                f"Account {acct.name}{env_suffix} already exists in CloudOne Conformity!"
+            )
+            if ask_confirmation_or_auto_overwrite(
+                "Do you want to migrate configurations for this account (will overwrite existing ones)?",
+                ask_if_sure=True,
+            ):
+                cloud_accts_to_migrate[acct.account_id] = c1_acct_id
+
+    # the requests of the pools have the priority of the task adding the accounts
+    with ThreadPoolExecutor(
+        max_workers=max(1, app_conf["ACCOUNT_ACCESS_READ_WIDTH"]),
+        thread_name_prefix="account-access",
+        initializer=set_thread_priority,
+        initargs=(thread_priority(),),
+    ) as readers, ThreadPoolExecutor(
+        max_workers=max(1, app_conf["ACCOUNT_ADD_WIDTH"]),
+        thread_name_prefix="account-add",
+        initializer=set_thread_priority,
+        initargs=(thread_priority(),),
+    ) as writers:
+        for batch in chunked(accts_to_add(), ACCOUNT_ADD_BATCH_SIZE):
+            accesses = [
+                readers.submit(
+                    exec_migration_func, partial(acct_adder.account_access, acct)
                 )
-                if not c1_acct_id:
-                    continue
-
-            accts_to_migrate[acct.account_id] = c1_acct_id
+                for acct_adder, acct in batch
+            ]
+            adds = {
+                writers.submit(add_cloud_account, acct_adder, acct, access): acct
+                for (acct_adder, acct), access in zip(batch, accesses)
+            }
+            for fut in as_completed(adds):
+                try:
+                    c1_acct_id = fut.result()
+                except Exception:
+                    # stop adding accounts, as when they were added one by one;
+                    # the ones already being added are found existing on rerun
+                    for pending in adds:
+                        pending.cancel()
+                    raise
+                if c1_acct_id:
+                    cloud_accts_to_migrate[adds[fut].account_id] = c1_acct_id
 
     return cloud_accts_to_migrate
 
@@ -408,7 +712,7 @@ def copy_custom_profiles(
     legacy_api: LegacyConformityAPI, c1_api: CloudOneConformityAPI
 ):
     log.info("Copying Custom Profiles", flush=True)
-    legacy_profiles = legacy_api.get_custom_profiles()
+    legacy_profiles = list(legacy_api.get_custom_profiles())
     c1_profiles = c1_api.get_custom_profiles()
 
     legacy_profiles_set = set(legacy_profiles)
@@ -491,8 +795,14 @@ def copy_account_report_configs(
     for report_config in legacy_report_configs:
         log.info(f"    --> Report Config: {report_config.title}")
         exec_migration_func(
-            lambda: c1_api.create_account_report_config(
-                report_conf=report_config.configuration, acct_id=c1_acct_id
+            partial(
+                record_operation,
+                "report-config",
+                lambda: c1_api.create_account_report_config(
+                    report_conf=report_config.configuration, acct_id=c1_acct_id
+                ),
+                c1_account=c1_acct_id,
+                title=report_config.title,
             )
         )
 
@@ -522,8 +832,14 @@ def copy_group_report_configs(
     for report_config in legacy_report_configs:
         log.info(f"    --> Report Config: {report_config.title}")
         exec_migration_func(
-            lambda: c1_api.create_group_report_config(
-                report_conf=report_config.configuration, group_id=c1_group_id
+            partial(
+                record_operation,
+                "report-config",
+                lambda: c1_api.create_group_report_config(
+                    report_conf=report_config.configuration, group_id=c1_group_id
+                ),
+                c1_group=c1_group_id,
+                title=report_config.title,
             )
         )
 
@@ -549,8 +865,13 @@ def copy_organisation_report_configs(
     for report_config in legacy_report_configs:
         log.info(f"  --> Report Config: {report_config.title}")
         exec_migration_func(
-            lambda: c1_api.create_organisation_report_config(
-                report_conf=report_config.configuration
+            partial(
+                record_operation,
+                "report-config",
+                lambda: c1_api.create_organisation_report_config(
+                    report_conf=report_config.configuration
+                ),
+                title=report_config.title,
             )
         )
 
@@ -566,7 +887,9 @@ def create_user_defined_groups(
         c1_api.list_groups(include_group_types=[Group.GROUP_TYPE_USER_DEFINED])
     )
 
+    group_count = 0
     for group in legacy_groups:
+        group_count += 1
         log.info(f" --> Group: {group.name}, Tags: {group.tags}", end="", flush=True)
         if group in c1_groups:
             log.info(" - Already exists! Skipping it.")
@@ -575,18 +898,21 @@ def create_user_defined_groups(
             lambda: c1_api.create_group(name=group.name, tags=group.tags)
         )
 
-    if not legacy_groups:
+    if not group_count:
         log.info(" --> No group found.")
 
 
-def add_azure_group(mg: Group, c1_api: CloudOneConformityAPI):
+def add_azure_group(
+    mg: Group, c1_api: CloudOneConformityAPI, app_client_key: Optional[str] = None
+):
     azure_conf = mg.cloud_data["azure"]  # type: ignore
     directory_name = mg.name
     directory_id = azure_conf["directoryId"]
     app_client_id = azure_conf["applicationId"]
-    app_client_key = prompt_azure_app_client_id(
-        directory_name, directory_id, app_client_id
-    )
+    if not app_client_key:
+        app_client_key = prompt_azure_app_client_id(
+            directory_name, directory_id, app_client_id
+        )
     c1_api.create_azure_directory(
         name=mg.name,
         directory_id=directory_id,
@@ -595,79 +921,72 @@ def add_azure_group(mg: Group, c1_api: CloudOneConformityAPI):
     )
 
 
-def add_managed_groups(legacy_api: LegacyConformityAPI, c1_api: CloudOneConformityAPI):
-    legacy_managed_groups = legacy_api.list_groups(
-        include_group_types=[Group.GROUP_TYPE_MANAGED_GROUP]
-    )
-    c1_managed_groups = c1_api.list_groups(
-        include_group_types=[Group.GROUP_TYPE_MANAGED_GROUP]
-    )
-    c1_managed_groups_set = set(c1_managed_groups)
-
-    for mg in legacy_managed_groups:
-        if mg in c1_managed_groups_set:
-            # log.info(f"Managed Group {mg.name} ({mg.cloud_type.upper()}) already exists!")
-            continue
-        if mg.cloud_type == "azure":
-            exec_migration_func(lambda: add_azure_group(mg=mg, c1_api=c1_api))
-
-
-def prompt_azure_app_client_id(directory_name, directory_id, app_client_id) -> str:
-    log.info(
-        f"""
-Please enter the App registration key for the following Active Directory:
-If you lost the key, you may generate a new Client Secret on your Azure App Registration.
-    Active Directory Name: {directory_name}
-    Active Directory Tenant ID: {directory_id}
-    App registration Application ID: {app_client_id}
-"""
+def wait_for_azure_directories(
+    legacy_api: LegacyConformityAPI,
+    c1_api: CloudOneConformityAPI,
+    include_accts: Optional[Set[AccountEnv]],
+    exclude_accts: Optional[Set[AccountEnv]],
+    shard: Shard,
+):
+    """
+    Waits until the Azure directories (managed groups) of the Azure
+    subscriptions of a shard are added to CloudOne by the first shard, which
+    adds them before its own accounts (see Shard). Fails with the directories
+    still missing after MANAGED_GROUPS_WAIT_TIMEOUT_IN_SECS.
+    """
+    app_conf = app_config()
+    legacy_accts = include_exclude_accts(
+        legacy_accts=legacy_api.list_accounts(),
+        include_accts=include_accts,
+        exclude_accts=exclude_accts,
+        shard=shard,
     )
-    return ask_input("App registration key:", mask_input=True)
-
-
-def _filter_users_with_verified_mobile(
-    c1_user_ids: List[str],
-    mobile_verified_c1_users: Set[str],
-    c1_user_id_email_map: Dict[str, str],
-) -> List[str]:
-
-    c1_user_ids_set = set(c1_user_ids)
-    unverified_user_ids = c1_user_ids_set.difference(mobile_verified_c1_users)
-    for user_id in unverified_user_ids:
-        email = c1_user_id_email_map.get(user_id, user_id)
-        log.warn(
-            f"User {email} doesn't have a mobile number verified. Excluding from SMS notification"
+    group_ids = {
+        acct.managed_group_id
+        for acct in legacy_accts
+        if acct.cloud_type == AzureCloudAccountAdder.cloud_type
+    }
+    if not group_ids:
+        return
+    deadline = time.monotonic() + app_conf["MANAGED_GROUPS_WAIT_TIMEOUT_IN_SECS"]
+    while True:
+        # added by another process, which the cached groups don't tell
+        invalidate_cached_reads(c1_api, "list_groups")
+        missing = [
+            mg.name
+            for mg in missing_managed_groups(legacy_api=legacy_api, c1_api=c1_api)
+            if mg.group_id in group_ids
+        ]
+        if not missing:
+            return
+        if time.monotonic() >= deadline:
+            raise click.ClickException(
+                f"Azure directories missing in CloudOne Conformity: {', '.join(missing)}. "
+                f"They are added by the first shard (--shard 0/{shard.count}), which has to "
+                "add them before the other shards can add their Azure subscriptions."
+            )
+        log.info(
+            f"Waiting for the first shard to add the Azure directories: {', '.join(missing)}",
+            flush=True,
         )
+        time.sleep(app_conf["MANAGED_GROUPS_CHECK_INTERVAL_IN_SECS"])
 
-    verified_c1_user_ids = c1_user_ids_set.intersection(mobile_verified_c1_users)
-    return list(verified_c1_user_ids)
 
-
-def _legacy_user_ids_to_c1_user_ids(
-    legacy_user_ids: List[str],
-    legacy_user_id_email_map: Dict[str, str],
-    c1_email_user_id_map: Dict[str, str],
-    channel: str,
-) -> List[str]:
-    c1_user_ids = []
-    for legacy_user_id in legacy_user_ids:
-        email = legacy_user_id_email_map.get(legacy_user_id)
-        if email is None:
-            log.warn(
-                f"Cannot find email of Legacy Conformity user with an ID of: {legacy_user_id}. Excluding user from {channel} notification."
-            )
-            continue
-
-        c1_user_id = c1_email_user_id_map.get(email)
-        if c1_user_id is None:
-            log.warn(
-                f"Cannot find corresponding user in CloudOne Conformity: {email}. Excluding user from {channel} notification."
+def add_managed_groups(
+    legacy_api: LegacyConformityAPI,
+    c1_api: CloudOneConformityAPI,
+    azure_app_keys: Optional[Dict[str, str]] = None,
+):
+    """azure_app_keys are the App registration keys per directory id, see collect_manual_actions"""
+    azure_app_keys = azure_app_keys or {}
+    for mg in missing_managed_groups(legacy_api=legacy_api, c1_api=c1_api):
+        if mg.cloud_type == "azure":
+            app_client_key = azure_app_keys.get(mg.cloud_data["azure"]["directoryId"])
+            exec_migration_func(
+                lambda: add_azure_group(
+                    mg=mg, c1_api=c1_api, app_client_key=app_client_key
+                )
             )
-            continue
-
-        c1_user_ids.append(c1_user_id)
-
-    return c1_user_ids
 
 
 def copy_communication_channel_settings(
@@ -679,152 +998,274 @@ def copy_communication_channel_settings(
     c1_users: List[User],
     c1_org_id: str,
 ):
-    legacy_user_id_email_map = {user.user_id: user.email for user in legacy_users}
-    c1_email_user_id_map = {user.email: user.user_id for user in c1_users}
-    c1_user_id_email_map = {user.user_id: user.email for user in c1_users}
-    mobile_verified_c1_users = {
-        user.user_id for user in c1_users if user.is_mobile_verified
-    }
-
-    legacy_com_settings = legacy_api.get_communication_settings(acct_id=legacy_acct_id)
-    candidate_com_settings: Set[CommunicationSettings] = set()
-    for s in legacy_com_settings:
-        legacy_conf = s.configuration
-        c1_conf = legacy_conf
-        if s.channel in ("email", "sms"):
-            c1_conf["users"] = _legacy_user_ids_to_c1_user_ids(
-                legacy_conf["users"],
-                legacy_user_id_email_map,
-                c1_email_user_id_map,
-                s.channel,
-            )
-            if s.channel == "sms":
-                c1_conf["users"] = _filter_users_with_verified_mobile(
-                    c1_conf["users"], mobile_verified_c1_users, c1_user_id_email_map
-                )
-
-        candidate_com_settings.add(
-            CommunicationSettings(
-                com_setting_id=s.com_setting_id,
-                channel=s.channel,
-                enabled=s.enabled,
-                filter=s.filter,
-                configuration=c1_conf,
-            )
+    with event_log().operation(
+        "comm-settings", legacy_account=legacy_acct_id, c1_account=c1_acct_id
+    ) as ids:
+        candidate_com_settings = candidate_communication_settings(
+            legacy_com_settings=legacy_api.get_communication_settings(
+                acct_id=legacy_acct_id
+            ),
+            legacy_users=legacy_users,
+            c1_users=c1_users,
         )
 
-    c1_com_settings = set(c1_api.get_communication_settings(acct_id=c1_acct_id))
-    new_com_settings = candidate_com_settings.difference(c1_com_settings)
-    if new_com_settings:
-        c1_api.create_communication_settings(
-            com_settings=new_com_settings, acct_id=c1_acct_id, org_id=c1_org_id
-        )
+        c1_com_settings = set(c1_api.get_communication_settings(acct_id=c1_acct_id))
+        new_com_settings = candidate_com_settings.difference(c1_com_settings)
+        ids["created"] = len(new_com_settings)
+        if new_com_settings:
+            c1_api.create_communication_settings(
+                com_settings=new_com_settings, acct_id=c1_acct_id, org_id=c1_org_id
+            )
 
 
-def migrate_account_configurations(
+def add_account_migration_tasks(
+    graph: TaskGraph,
     legacy_api: LegacyConformityAPI,
     c1_api: CloudOneConformityAPI,
     legacy_acct_id: str,
     c1_acct_id: str,
-    legacy_users: List[User],
-    c1_users: List[User],
-    c1_org_id: str,
+    ctx: MigrationContext,
 ):
+    """
+    Adds the tasks migrating the configurations of a single account. Rules,
+    communication settings, report configs and suppressed checks are only added
+    once the account settings are migrated, and don't depend on each other.
+    Account tasks are transient so the graph forgets them once they are done.
+
+    Rules and suppressed checks are split into tasks of a fixed size (see
+    RULES_TASK_CHUNK_SIZE and SUPPRESSED_CHECKS_TASK_CHUNK_SIZE), so that the
+    workers share the work of a large account instead of one of them migrating
+    it while the others are idle.
+    """
+    task_prefix = f"account:{legacy_acct_id}"
+    app_conf = app_config()
 
-    legacy_acct_details = legacy_api.get_account_details(acct_id=legacy_acct_id)
-    name = legacy_acct_details.name
-    environment = legacy_acct_details.environment
-    cloud_type = legacy_acct_details.cloud_type
-    env_suffix = acct_env_suffix(environment)
-    log.info(
-        f"Migrating account configurations for: {name}{env_suffix} [{cloud_type.upper()}]:"
-    )
-
-    log.info("  --> Updating account tags", flush=True)
-    exec_migration_func(
-        lambda: c1_api.update_account(
-            acct_id=c1_acct_id,
-            name=name,
-            environment=environment,
-            tags=legacy_acct_details.tags,
+    def migrate_settings():
+        legacy_acct_details = exec_migration_func(
+            lambda: migrate_account_settings(
+                legacy_api=legacy_api,
+                c1_api=c1_api,
+                legacy_acct_id=legacy_acct_id,
+                c1_acct_id=c1_acct_id,
+            )
         )
-    )
-
-    log.info("  --> Copying account bot settings", flush=True)
-    # bot_settings = legacy_api.get_account_bot_settings(acct_id=legacy_acct_id)
-    bot_settings = legacy_acct_details.bot_settings
-    if bot_settings:
-        bot_settings.pop("lastModifiedFrom", None)
-        bot_settings.pop("lastModifiedBy", None)
-        if cloud_type == "aws" and str2bool(
-            os.getenv("ENABLE_C1_AWS_CONFORMITY_BOT", "False")
-        ):
-            bot_settings["disabled"] = None
-        exec_migration_func(
-            lambda: c1_api.update_account_bot_settings(
-                acct_id=c1_acct_id, settings=bot_settings
+        if legacy_acct_details is None:
+            progress_tracker().done(ACCOUNTS, ok=False)
+            return
+        label = acct_label(legacy_acct_details)
+        rules = legacy_acct_details.rules
+        progress_tracker().add_total(RULES, len(rules))
+        if rules:
+            log.info(f"  --> [{label}] Copying account rules settings:", flush=True)
+        account_tasks: List[Tuple[str, Callable[[], None]]] = [
+            (f"rules:{i}", partial(migrate_rules, rules_chunk))
+            for i, rules_chunk in enumerate(
+                chunked(rules, max(1, app_conf["RULES_TASK_CHUNK_SIZE"]))
             )
+        ]
+        account_tasks += [
+            ("comm-settings", partial(migrate_com_settings, label)),
+            ("report-configs", migrate_report_configs),
+        ]
+        # the account is done once all of its tasks are
+        remaining_tasks = Countdown(
+            len(account_tasks) + 1, on_zero=lambda: progress_tracker().done(ACCOUNTS)
         )
-
-    log.info("  --> Copying account rules settings:", flush=True)
-    exec_migration_func(
-        lambda: copy_account_rules_settings(
-            legacy_api=legacy_api,
-            c1_api=c1_api,
-            legacy_acct_id=legacy_acct_id,
-            c1_acct_id=c1_acct_id,
-            legacy_acct_details=legacy_acct_details,
-            legacy_users=legacy_users,
+        account_tasks.append(
+            (
+                "suppressed-checks",
+                partial(migrate_suppressed_checks, label, remaining_tasks),
+            )
         )
-    )
-
-    log.info("  --> Copying communication channel settings", flush=True)
-    exec_migration_func(
-        lambda: copy_communication_channel_settings(
-            legacy_api=legacy_api,
-            c1_api=c1_api,
-            legacy_acct_id=legacy_acct_id,
-            c1_acct_id=c1_acct_id,
-            legacy_users=legacy_users,
-            c1_users=c1_users,
-            c1_org_id=c1_org_id,
+        for task_name, task_func in account_tasks:
+            add_account_task(task_name, task_func, remaining_tasks)
+
+    def add_account_task(
+        task_name: str, task_func: Callable[[], None], remaining_tasks: Countdown
+    ):
+        graph.add(
+            f"{task_prefix}:{task_name}",
+            partial(account_task, task_func, remaining_tasks),
+            transient=True,
         )
-    )
 
-    exec_migration_func(
-        lambda: copy_account_report_configs(
-            legacy_api=legacy_api,
-            c1_api=c1_api,
-            legacy_acct_id=legacy_acct_id,
-            c1_acct_id=c1_acct_id,
-        )
-    )
+    def account_task(task_func: Callable[[], None], remaining_tasks: Countdown):
+        try:
+            task_func()
+        finally:
+            remaining_tasks.count_down()
 
-    if has_suppressed_check(legacy_api=legacy_api, acct_id=legacy_acct_id):
-        log.info("  --> Waiting for bot scan to finish ")
+    def migrate_rules(rules: List[Rule]):
         exec_migration_func(
-            lambda: wait_for_bot_scan_to_finish(c1_api=c1_api, acct_id=c1_acct_id)
+            lambda: copy_account_rules_settings(
+                legacy_api=legacy_api,
+                c1_api=c1_api,
+                legacy_acct_id=legacy_acct_id,
+                c1_acct_id=c1_acct_id,
+                rules=rules,
+                legacy_users=ctx.legacy_users,
+            )
         )
 
-        log.info("  --> Copying suppressed checks")
+    def migrate_com_settings(label: str):
+        log.info(
+            f"  --> [{label}] Copying communication channel settings",
+            flush=True,
+        )
         exec_migration_func(
-            lambda: copy_suppressed_checks(
+            lambda: copy_communication_channel_settings(
                 legacy_api=legacy_api,
                 c1_api=c1_api,
                 legacy_acct_id=legacy_acct_id,
                 c1_acct_id=c1_acct_id,
+                legacy_users=ctx.legacy_users,
+                c1_users=ctx.c1_users,
+                c1_org_id=ctx.c1_org_id,
             )
         )
-    else:
-        log.info("  --> No suppressed check found to migrate")
 
+    def migrate_report_configs():
+        exec_migration_func(
+            lambda: copy_account_report_configs(
+                legacy_api=legacy_api,
+                c1_api=c1_api,
+                legacy_acct_id=legacy_acct_id,
+                c1_acct_id=c1_acct_id,
+            )
+        )
 
-def copy_account_rule_setting(
-    legacy_api: LegacyConformityAPI,
-    c1_api: CloudOneConformityAPI,
-    legacy_acct_id: str,
-    c1_acct_id: str,
-    rule: Rule,
+    def migrate_suppressed_checks(label: str, remaining_tasks: Countdown):
+        checks_count = exec_migration_func(
+            lambda: prepare_account_suppressed_checks(
+                legacy_api=legacy_api,
+                c1_api=c1_api,
+                legacy_acct_id=legacy_acct_id,
+                c1_acct_id=c1_acct_id,
+                label=label,
+            )
+        )
+        if not checks_count:
+            return
+        progress_tracker().add_total(CHECKS, checks_count)
+        log.info(f"  --> [{label}] Copying {checks_count} suppressed checks")
+        exec_migration_func(
+            lambda: add_suppressed_checks_tasks(checks_count, remaining_tasks)
+        )
+
+    def add_suppressed_checks_tasks(checks_count: int, remaining_tasks: Countdown):
+        # the checks are listed once, by this task, rather than read by every
+        # chunk from its offset: the listing has no set order and changes as
+        # checks are suppressed or expire, so offsets could skip or repeat some
+        chunk_size = max(1, app_conf["SUPPRESSED_CHECKS_TASK_CHUNK_SIZE"])
+        legacy_checks = legacy_api.get_suppressed_checks(acct_id=legacy_acct_id)
+        listed = 0
+        try:
+            for i, checks_chunk in enumerate(chunked(legacy_checks, chunk_size)):
+                listed += len(checks_chunk)
+                # counted before this task is counted down, so the account can't
+                # be done before its chunks are
+                remaining_tasks.add(1)
+                add_account_task(
+                    f"suppressed-checks:{i}",
+                    partial(migrate_suppressed_checks_chunk, checks_chunk),
+                    remaining_tasks,
+                )
+        finally:
+            # checks suppressed or expired since they were counted
+            progress_tracker().add_total(CHECKS, listed - checks_count)
+
+    def migrate_suppressed_checks_chunk(legacy_checks: List[Check]):
+        exec_migration_func(
+            lambda: copy_suppressed_checks(
+                legacy_api=legacy_api,
+                c1_api=c1_api,
+                legacy_acct_id=legacy_acct_id,
+                c1_acct_id=c1_acct_id,
+                legacy_checks=legacy_checks,
+            )
+        )
+
+    graph.add(
+        f"{task_prefix}:settings", migrate_settings, deps=["users"], transient=True
+    )
+
+
+def migrate_account_settings(
+    legacy_api: LegacyConformityAPI,
+    c1_api: CloudOneConformityAPI,
+    legacy_acct_id: str,
+    c1_acct_id: str,
+) -> AccountDetails:
+
+    with event_log().operation(
+        "account", legacy_account=legacy_acct_id, c1_account=c1_acct_id
+    ):
+        legacy_acct_details = legacy_api.get_account_details(acct_id=legacy_acct_id)
+        name = legacy_acct_details.name
+        environment = legacy_acct_details.environment
+        cloud_type = legacy_acct_details.cloud_type
+        label = acct_label(legacy_acct_details)
+        log.info(
+            f"Migrating account configurations for: {label} [{cloud_type.upper()}]:"
+        )
+
+        log.info(f"  --> [{label}] Updating account tags", flush=True)
+        exec_migration_func(
+            lambda: c1_api.update_account(
+                acct_id=c1_acct_id,
+                name=name,
+                environment=environment,
+                tags=legacy_acct_details.tags,
+            )
+        )
+
+        log.info(f"  --> [{label}] Copying account bot settings", flush=True)
+        # bot_settings = legacy_api.get_account_bot_settings(acct_id=legacy_acct_id)
+        bot_settings = legacy_acct_details.bot_settings
+        if bot_settings:
+            bot_settings.pop("lastModifiedFrom", None)
+            bot_settings.pop("lastModifiedBy", None)
+            if cloud_type == "aws" and str2bool(
+                os.getenv("ENABLE_C1_AWS_CONFORMITY_BOT", "False")
+            ):
+                bot_settings["disabled"] = None
+            exec_migration_func(
+                lambda: c1_api.update_account_bot_settings(
+                    acct_id=c1_acct_id, settings=bot_settings
+                )
+            )
+
+    return legacy_acct_details
+
+
+def prepare_account_suppressed_checks(
+    legacy_api: LegacyConformityAPI,
+    c1_api: CloudOneConformityAPI,
+    legacy_acct_id: str,
+    c1_acct_id: str,
+    label: str,
+) -> int:
+    """
+    Returns the number of suppressed checks of the account, once they can be
+    copied to CloudOne.
+    """
+    checks_count = legacy_api.count_suppressed_checks(acct_id=legacy_acct_id)
+    if not checks_count:
+        log.info(f"  --> [{label}] No suppressed check found to migrate")
+        return 0
+
+    log.info(f"  --> [{label}] Waiting for bot scan to finish ")
+    exec_migration_func(
+        lambda: wait_for_bot_scan_to_finish(c1_api=c1_api, acct_id=c1_acct_id)
+    )
+    return checks_count
+
+
+def copy_account_rule_setting(
+    c1_api: CloudOneConformityAPI,
+    c1_acct_id: str,
+    rule: Rule,
+    rule_with_notes: "Future[Rule]",
     user_map: dict,
 ):
     rule_id = rule.rule_id
@@ -832,20 +1273,24 @@ def copy_account_rule_setting(
         f"    --> Rule: {rule_id} ({'enabled' if rule.enabled else 'disabled'})",
         flush=True,
     )
-    rule_with_notes = legacy_api.get_account_rule_setting(
-        acct_id=legacy_acct_id, rule_id=rule_id, with_notes=True
-    )
+    ok = False
+    try:
+        with event_log().operation("rule", c1_account=c1_acct_id, rule=rule_id):
+            rule_with_notes = rule_with_notes.result()
 
-    note_msg = create_new_note_from_history_of_notes(
-        notes=rule_with_notes.notes, user_map=user_map
-    )
+            note_msg = create_new_note_from_history_of_notes(
+                notes=rule_with_notes.notes, user_map=user_map
+            )
 
-    c1_api.update_account_rule_setting(
-        acct_id=c1_acct_id,
-        rule_id=rule_id,
-        setting=rule_with_notes.setting,
-        note=note_msg,
-    )
+            c1_api.update_account_rule_setting(
+                acct_id=c1_acct_id,
+                rule_id=rule_id,
+                setting=rule_with_notes.setting,
+                note=note_msg,
+            )
+        ok = True
+    finally:
+        progress_tracker().done(RULES, ok=ok)
 
 
 def copy_account_rules_settings(
@@ -853,22 +1298,42 @@ def copy_account_rules_settings(
     c1_api: CloudOneConformityAPI,
     legacy_acct_id: str,
     c1_acct_id: str,
-    legacy_acct_details: AccountDetails,
+    rules: List[Rule],
     legacy_users: List[User],
 ):
 
     user_map = {user.user_id: user for user in legacy_users}
-    for rule in legacy_acct_details.rules:
-        exec_migration_func(
-            lambda: copy_account_rule_setting(
-                legacy_api=legacy_api,
-                c1_api=c1_api,
-                legacy_acct_id=legacy_acct_id,
-                c1_acct_id=c1_acct_id,
-                rule=rule,
-                user_map=user_map,
+    if not rules:
+        return
+
+    # the notes of all the rules are fetched ahead so that reading them
+    # overlaps with updating the rules already fetched
+    width = app_config()["RULE_NOTES_PREFETCH_WIDTH"]
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(width, len(rules))),
+        thread_name_prefix="rule-notes",
+        initializer=set_thread_priority,
+        initargs=(thread_priority(),),
+    ) as executor:
+        rules_with_notes: Dict[str, Future[Rule]] = {
+            rule.rule_id: executor.submit(
+                legacy_api.get_account_rule_setting,
+                acct_id=legacy_acct_id,
+                rule_id=rule.rule_id,
+                with_notes=True,
+            )
+            for rule in rules
+        }
+        for rule in rules:
+            exec_migration_func(
+                lambda: copy_account_rule_setting(
+                    c1_api=c1_api,
+                    c1_acct_id=c1_acct_id,
+                    rule=rule,
+                    rule_with_notes=rules_with_notes[rule.rule_id],
+                    user_map=user_map,
+                )
             )
-        )
 
 
 def truncate_txt_to_length(txt: str, length=-1, truncated_suffix="") -> str:
@@ -913,13 +1378,35 @@ def create_new_note_from_history_of_notes(
     return note_msg
 
 
+def record_operation(unit: str, func: Callable[[], Any], **ids) -> Any:
+    """Calls func and records it in the event log, see EventLog"""
+    with event_log().operation(unit, **ids):
+        return func()
+
+
+def migration_stage() -> Optional[str]:
+    """
+    Stage of the migration run by the current thread, i.e. the name of its task
+    without the account id and chunk (e.g. "account:rules"), or "main" outside
+    of the tasks. None in other threads (e.g. requests read ahead in a pool),
+    whose time is part of the stage that started them.
+    """
+    task_name = current_task_name()
+    if task_name is None:
+        return "main" if threading.current_thread() is threading.main_thread() else None
+    if task_name.startswith("account:"):
+        return "account:" + task_name.split(":", 3)[2]
+    return task_name
+
+
 def exec_migration_func(migration_func: Callable) -> Any:
-    if not str2bool(os.getenv("SKIP_MIGRATION_FAILURES", "False")):
-        return migration_func()
-    try:
-        return migration_func()
-    except Exception:
-        log.exception("There was a failure in migration")
+    with span_timers().span(migration_stage()):
+        if not str2bool(os.getenv("SKIP_MIGRATION_FAILURES", "False")):
+            return migration_func()
+        try:
+            return migration_func()
+        except Exception:
+            log.exception("There was a failure in migration")
 
 
 def wait_for_bot_scan_to_finish(c1_api: CloudOneConformityAPI, acct_id: str):
@@ -928,17 +1415,26 @@ def wait_for_bot_scan_to_finish(c1_api: CloudOneConformityAPI, acct_id: str):
         continue
 
 
-def has_suppressed_check(legacy_api: LegacyConformityAPI, acct_id: str) -> bool:
-    checks = legacy_api.get_suppressed_checks(acct_id=acct_id, limit=1)
-    return len(list(checks)) > 0
+def legacy_check_notes(legacy_api: LegacyConformityAPI, check: Check) -> List[Note]:
+    # the /checks list already includes the notes of a check when it has some
+    if check.notes:
+        return check.notes
+    legacy_check_detail = legacy_api.get_check_detail(
+        check_id=check.check_id, with_notes=True
+    )
+    return legacy_check_detail.notes
 
 
-def copy_suppressed_check(
+def prepare_check_suppression(
     legacy_api: LegacyConformityAPI,
     c1_api: CloudOneConformityAPI,
     c1_acct_id: str,
     legacy_check: Check,
-):
+) -> Optional[CheckSuppression]:
+    """
+    Finds the CloudOne check matching a legacy suppressed check and returns
+    how to suppress it, or None when there is no match.
+    """
     log.info(
         f"    --> {legacy_check.rule_id}|{legacy_check.region}|{legacy_check.service}|{legacy_check.resource_name}|{legacy_check.resource}",
         flush=True,
@@ -957,20 +1453,19 @@ def copy_suppressed_check(
     c1_check = c1_checks_map.get(legacy_check)
     if c1_check is None:
         show_instructions_for_missing_check(legacy_check)
-        return
-    legacy_check_detail = legacy_api.get_check_detail(
-        check_id=legacy_check.check_id, with_notes=True
+        return None
+    note_msg = get_most_recent_note_msg(
+        legacy_check_notes(legacy_api=legacy_api, check=legacy_check)
     )
-    note_msg = get_most_recent_note_msg(legacy_check_detail.notes)
     if not note_msg:
         note_msg = "[Migration tool: No note found from the source Check]"
     note_msg = truncate_txt_to_length(txt=note_msg, length=200, truncated_suffix="..")
     # log.info(f"Note: {note_msg}")
-    c1_api.suppress_check(
-        check_id=c1_check.check_id,
-        suppressed_until=legacy_check.suppressed_until,
-        note=note_msg,
-    )
+    return (c1_check.check_id, legacy_check.suppressed_until, note_msg)
+
+
+# number of suppressed checks of an account that are held in memory at once
+SUPPRESSED_CHECKS_CHUNK_SIZE = 100
 
 
 def copy_suppressed_checks(
@@ -978,17 +1473,71 @@ def copy_suppressed_checks(
     c1_api: CloudOneConformityAPI,
     legacy_acct_id: str,
     c1_acct_id: str,
+    legacy_checks: Optional[Iterable[Check]] = None,
 ):
-    legacy_checks = legacy_api.get_suppressed_checks(acct_id=legacy_acct_id)
-    for legacy_check in legacy_checks:
-        exec_migration_func(
-            lambda: copy_suppressed_check(
-                legacy_api=legacy_api,
-                c1_api=c1_api,
-                c1_acct_id=c1_acct_id,
-                legacy_check=legacy_check,
+    """
+    Copies the given suppressed checks of an account, all of them by default.
+    Their total is expected to be known by the progress tracker already.
+    """
+    app_conf = app_config()
+    if legacy_checks is None:
+        legacy_checks = legacy_api.get_suppressed_checks(acct_id=legacy_acct_id)
+    with ThreadPoolExecutor(
+        max_workers=max(1, app_conf["SUPPRESSED_CHECKS_READ_WIDTH"]),
+        thread_name_prefix="check-reads",
+        initializer=set_thread_priority,
+        initargs=(thread_priority(),),
+    ) as executor:
+
+        def suppressions() -> Iterator[CheckSuppression]:
+            # the CloudOne check and the legacy notes of a chunk of checks are
+            # read ahead so that reading them overlaps with the suppressions
+            for chunk in chunked(legacy_checks, SUPPRESSED_CHECKS_CHUNK_SIZE):
+                futures = [
+                    executor.submit(
+                        exec_migration_func,
+                        partial(
+                            prepare_check_suppression,
+                            legacy_api=legacy_api,
+                            c1_api=c1_api,
+                            c1_acct_id=c1_acct_id,
+                            legacy_check=legacy_check,
+                        ),
+                    )
+                    for legacy_check in chunk
+                ]
+                for fut in futures:
+                    suppression = fut.result()
+                    if suppression is None:
+                        # missing in CloudOne or failed to be looked up
+                        progress_tracker().done(CHECKS, ok=False)
+                    else:
+                        yield suppression
+
+        failures: List[CheckSuppressionResult] = []
+        for result in c1_api.suppress_checks(
+            suppressions(),
+            max_workers=app_conf["SUPPRESSED_CHECKS_WRITE_WIDTH"],
+            max_attempts=app_conf["SUPPRESSED_CHECKS_WRITE_ATTEMPTS"],
+        ):
+            progress_tracker().done(CHECKS, ok=result.ok)
+            event_log().write(
+                unit="check",
+                ids={"c1_account": c1_acct_id, "check": result.check_id},
+                started=result.started,
+                ended=result.ended,
+                requests=result.requests,
+                outcome=OK if result.ok else ERROR,
+                error=str(result.error or ""),
             )
-        )
+            if not result.ok:
+                failures.append(result)
+                log.error(
+                    f"    --> Failed to suppress check {result.check_id} after {result.attempts} attempt(s): {result.error}"
+                )
+
+    if failures and not str2bool(os.getenv("SKIP_MIGRATION_FAILURES", "False")):
+        raise failures[0].error  # type: ignore
 
 
 def show_instructions_for_missing_check(check: Check):
@@ -1005,138 +1554,35 @@ def show_instructions_for_missing_check(check: Check):
 
 
 def verify_users_mobile_numbers(users_to_verify_mobile: Iterable[User]):
-    log.info(
-        """
+    with prompt_lock:
+        log.info(
+            """
 Please have the following users in your CloudOne Account to have their mobile
 numbers verified. If they are one of the recipients for SMS notifications,
 then it is important to do this now before we proceed with migration:
 """
-    )
-    for user in users_to_verify_mobile:
-        log.info(
-            f" --> {user.first_name} {user.last_name}; Email={user.email}; Mobile={user.mobile_number}"
         )
-    log.info("")
-    ask_when_mobile_verification__done()
+        for user in users_to_verify_mobile:
+            log.info(
+                f" --> {user.first_name} {user.last_name}; Email={user.email}; Mobile={user.mobile_number}"
+            )
+        log.info("")
+        ask_when_mobile_verification__done()
 
 
 def invite_users(users_to_invite: Iterable[User]):
-    log.info(
-        """
+    with prompt_lock:
+        log.info(
+            """
 Please invite the following users to your CloudOne Account.
 If they are one of the recipients for your communication channel,
 then it is important to add them now before we proceed with migration:
 """
-    )
-    for user in users_to_invite:
-        log.info(f" --> {user.first_name} {user.last_name}; Email={user.email}")
-    log.info("")
-    ask_when_user_invite_done()
-
-
-def ask_confirmation_or_auto_overwrite(
-    msg: str, default=False, ask_if_sure=False
-) -> bool:
-    if str2bool(os.getenv("C1_CONFORMITY_OVERWRITE_ALL", "False")):
-        return True
-
-    return ask_confirmation(msg=msg, default=default, ask_if_sure=ask_if_sure)
-
-
-def ask_confirmation_with_text_verification(
-    msg: str, verify_text: str, default=False
-) -> bool:
-    questions = [
-        {
-            "type": "confirm",
-            "message": msg,
-            "name": "continue",
-            "default": default,
-        },
-    ]
-    answer = prompt(questions=questions)
-    cont = answer["continue"]
-    if not cont:
-        return False
-
-    entered_text = input(
-        f"Please enter the text '{verify_text}' to confirm this (exclude single quote): "
-    )
-    return entered_text == verify_text
-
-
-def ask_confirmation(msg: str, default=False, ask_if_sure=False) -> bool:
-    questions = [
-        {
-            "type": "confirm",
-            "message": msg,
-            "name": "continue",
-            "default": default,
-        },
-    ]
-    while True:
-        answer = prompt(questions=questions)
-        cont = answer["continue"]
-        if not ask_if_sure or not cont:
-            return cont
-
-        sure = ask_confirmation(
-            f"You chose {'Yes' if cont else 'No'}. Are you sure?", default=False
-        )
-        if sure:
-            return cont
-
-
-def ask_choices(msg: str, choices: List[str], default=1):
-    questions = [
-        {
-            "type": "list",
-            "message": msg,
-            "name": "choice",
-            "choices": choices,
-            "default": default,
-        },
-    ]
-    answer = prompt(questions=questions)
-    return answer["choice"]
-
-
-def ask_when_mobile_verification__done() -> None:
-    while True:
-
-        is_done = ask_confirmation(
-            "Are you done with mobile verification?",
-            default=False,
-            ask_if_sure=True,
-        )
-        if is_done:
-            return
-
-
-def ask_when_user_invite_done() -> None:
-    while True:
-
-        is_done = ask_confirmation(
-            "Are you done adding the users to Cloud One?",
-            default=False,
-            ask_if_sure=True,
         )
-        if is_done:
-            return
-
-
-def ask_input(msg: str, mask_input=False) -> str:
-    name = "input"
-    questions = [
-        {
-            "type": "password" if mask_input else "input",
-            "message": msg,
-            "name": name,
-            "default": "",
-        },
-    ]
-    answer = prompt(questions=questions)
-    return answer[name]
+        for user in users_to_invite:
+            log.info(f" --> {user.first_name} {user.last_name}; Email={user.email}")
+        log.info("")
+        ask_when_user_invite_done()
 
 
 def pretty_print_com_settings(com_settings):
@@ -1206,6 +1652,79 @@ def configure():
     default=False,
     help="Enables bot settings for all migrated AWS accounts on Cloud One Conformity.",
 )
+@click.option(
+    "--max-workers",
+    type=click.IntRange(min=1),
+    envvar="MIGRATION_MAX_WORKERS",
+    show_envvar=True,
+    required=False,
+    default=None,
+    help="Number of migration tasks that can run at the same time. Defaults to MIGRATION_MAX_WORKERS in the tool's config.yml.",
+)
+@click.option(
+    "--plan",
+    "plan_only",
+    is_flag=True,
+    required=False,
+    default=False,
+    help="Only shows the requests the migration would make per stage and endpoint, and estimates how long it would take. Nothing is changed in Legacy or Cloud One Conformity.",
+)
+@click.option(
+    "--legacy-snapshot",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True),
+    required=False,
+    default=None,
+    help="Snapshot file created by the 'export' command. Legacy Conformity configurations will be read from this file instead of the Legacy Conformity API.",
+)
+@click.option(
+    "--legacy-cache",
+    is_flag=True,
+    envvar="LEGACY_HTTP_CACHE",
+    show_envvar=True,
+    required=False,
+    default=False,
+    help="Keeps the responses of Legacy Conformity on disk (see LEGACY_HTTP_CACHE_DIR in the tool's config.yml) and reuses them in later runs instead of reading Legacy Conformity again. Meant for rehearsing a migration while Legacy Conformity doesn't change.",
+)
+@click.option(
+    "--refresh-legacy-cache",
+    is_flag=True,
+    envvar="REFRESH_LEGACY_HTTP_CACHE",
+    show_envvar=True,
+    required=False,
+    default=False,
+    help="Reads Legacy Conformity again and replaces the responses kept by --legacy-cache.",
+)
+@click.option(
+    "--manual-actions-file",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True),
+    required=False,
+    default=None,
+    help="YAML file with the actions the migration otherwise asks for before it starts: 'azure_app_keys' maps Azure Active Directory tenant ids to their App registration key, and 'aws_stacks_updated: true' confirms that the ExternalID of the CloudConformity stack of every AWS account to add is updated.",
+)
+@click.option(
+    "--profile-out",
+    type=click.Path(file_okay=True, dir_okay=False, writable=True),
+    required=False,
+    default=None,
+    help="Profiles the command and writes the profile to this file: a cProfile (pstats) file, or stack samples for flame graphs when it ends with .folded",
+)
+@click.option(
+    "--trace-out",
+    type=click.Path(file_okay=True, dir_okay=False, writable=True),
+    envvar="TRACE_FILE",
+    show_envvar=True,
+    required=False,
+    default=None,
+    help="Writes a span per migration stage, account task and HTTP request to this file in the Chrome Trace Event format, to be opened with e.g. ui.perfetto.dev or chrome://tracing.",
+)
+@click.option(
+    "--shard",
+    type=str,
+    callback=lambda ctx, param, value: parse_shard_option(value),
+    required=False,
+    default=None,
+    help="Migrates only one of N partitions of the accounts, given as i/N (e.g. 0/4 to 3/4), so that N processes or machines can migrate at the same time. Accounts are assigned by a hash of their Legacy Conformity id, and organisation-level configurations are only migrated by shard 0. Each shard records its events in its own file, see 'merge-events'.",
+)
 def run(
     skip_aws_prompt: bool,
     overwrite_all: bool,
@@ -1213,7 +1732,22 @@ def run(
     include_accounts_file: str,
     exclude_accounts_file: str,
     enable_aws_bot: bool,
+    max_workers: Optional[int],
+    plan_only: bool,
+    legacy_snapshot: Optional[str],
+    legacy_cache: bool,
+    refresh_legacy_cache: bool,
+    manual_actions_file: Optional[str],
+    profile_out: Optional[str],
+    trace_out: Optional[str],
+    shard: Optional[Shard],
 ):
+    # written once the command is done
+    click.get_current_context().with_resource(profiled(profile_out))
+    os.environ["TRACE_FILE"] = trace_out or ""
+    os.environ["MIGRATION_SHARD"] = str(shard) if shard else ""
+    if shard:
+        use_shard_log_files(shard)
     include_accts: Optional[Set[AccountEnv]] = None
     exclude_accts: Optional[Set[AccountEnv]] = None
     if include_accounts_file:
@@ -1227,41 +1761,314 @@ def run(
         "True" if skip_migration_failures else "False"
     )
     os.environ["ENABLE_C1_AWS_CONFORMITY_BOT"] = "True" if enable_aws_bot else "False"
+    set_legacy_cache_env(legacy_cache, refresh_legacy_cache)
+    if max_workers is None:
+        max_workers = app_config()["MIGRATION_MAX_WORKERS"]
+    if plan_only:
+        if shard is not None:
+            raise click.UsageError("--shard can't be used with --plan")
+        try:
+            show_migration_plan(
+                legacy_api=ReadOnlyConformityAPI(_legacy_api(legacy_snapshot)),
+                c1_api=ReadOnlyConformityAPI(c1_conformity_api()),
+                include_accts=include_accts,
+                exclude_accts=exclude_accts,
+                max_workers=max_workers,
+            )
+        except ConformityError as e:
+            log.error(e)
+            log.error(e.details)
+        log_api_metrics()
+        return
     try:
-        run_migration(
-            legacy_api=legacy_conformity_api(),
-            c1_api=c1_conformity_api(),
+        with progress_display(), tracer().span(
+            "run", category="run", run_id=event_log().run_id
+        ):
+            run_migration(
+                legacy_api=_legacy_api(legacy_snapshot),
+                c1_api=c1_conformity_api(),
+                include_accts=include_accts,
+                exclude_accts=exclude_accts,
+                max_workers=max_workers,
+                manual_actions_file=manual_actions_file,
+                shard=shard,
+            )
+    except ConformityError as e:
+        log.error(e)
+        log.error(e.details)
+        # raise e
+    log_api_metrics()
+
+
+@cli.command(
+    help="Verifies that the accounts were migrated to Cloud One Conformity and reports the differences. Nothing is changed in Legacy or Cloud One Conformity."
+)
+@click.option(
+    "--include-accounts-file",
+    required=False,
+    type=str,
+    help="CSV file containing accounts that will be verified. Each row should consists of 2 fields: first is the account name and second is the environment as they appear on Conformity Dashboard.",
+)
+@click.option(
+    "--exclude-accounts-file",
+    required=False,
+    type=str,
+    help="CSV file containing accounts that will not be verified. Each row should consists of 2 fields: first is the account name and second is the environment as they appear on Conformity Dashboard.",
+)
+@click.option(
+    "--enable-aws-bot",
+    is_flag=True,
+    envvar="ENABLE_C1_AWS_CONFORMITY_BOT",
+    show_envvar=True,
+    required=False,
+    default=False,
+    help="Use it if the migration was run with --enable-aws-bot. The bot status of AWS accounts will not be compared.",
+)
+@click.option(
+    "--max-workers",
+    type=click.IntRange(min=1),
+    envvar="MIGRATION_MAX_WORKERS",
+    show_envvar=True,
+    required=False,
+    default=None,
+    help="Number of verification tasks that can run at the same time. Defaults to MIGRATION_MAX_WORKERS in the tool's config.yml.",
+)
+@click.option(
+    "--max-requests",
+    type=click.IntRange(min=0),
+    required=False,
+    default=0,
+    show_default=True,
+    help="Maximum number of API calls to make. Accounts that don't fit in it are reported as unverified. 0 means no limit.",
+)
+@click.option(
+    "--report",
+    "report_file",
+    type=click.File(mode="w"),
+    required=False,
+    default="conformity-migration-verify.jsonl",
+    show_default=True,
+    help="File to write the JSON Lines report to. Use - for the standard output.",
+)
+@click.option(
+    "--legacy-snapshot",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True),
+    required=False,
+    default=None,
+    help="Snapshot file created by the 'export' command to compare Cloud One Conformity with.",
+)
+@click.option(
+    "--legacy-cache",
+    is_flag=True,
+    envvar="LEGACY_HTTP_CACHE",
+    show_envvar=True,
+    required=False,
+    default=False,
+    help="Keeps the responses of Legacy Conformity on disk (see LEGACY_HTTP_CACHE_DIR in the tool's config.yml) and reuses them in later runs instead of reading Legacy Conformity again. Meant for rehearsing a migration while Legacy Conformity doesn't change.",
+)
+@click.option(
+    "--refresh-legacy-cache",
+    is_flag=True,
+    envvar="REFRESH_LEGACY_HTTP_CACHE",
+    show_envvar=True,
+    required=False,
+    default=False,
+    help="Reads Legacy Conformity again and replaces the responses kept by --legacy-cache.",
+)
+def verify(
+    include_accounts_file: str,
+    exclude_accounts_file: str,
+    enable_aws_bot: bool,
+    max_workers: Optional[int],
+    max_requests: int,
+    report_file,
+    legacy_snapshot: Optional[str],
+    legacy_cache: bool,
+    refresh_legacy_cache: bool,
+):
+    include_accts: Optional[Set[AccountEnv]] = None
+    exclude_accts: Optional[Set[AccountEnv]] = None
+    if include_accounts_file:
+        include_accts = read_accts_file(accounts_file=include_accounts_file)
+    if exclude_accounts_file:
+        exclude_accts = read_accts_file(accounts_file=exclude_accounts_file)
+
+    os.environ["ENABLE_C1_AWS_CONFORMITY_BOT"] = "True" if enable_aws_bot else "False"
+    set_legacy_cache_env(legacy_cache, refresh_legacy_cache)
+    if max_workers is None:
+        max_workers = app_config()["MIGRATION_MAX_WORKERS"]
+
+    report = MismatchReport(out=report_file)
+    budget = RequestBudget(max_requests=max_requests)
+    try:
+        verify_migration(
+            legacy_api=ReadOnlyConformityAPI(_legacy_api(legacy_snapshot)),
+            c1_api=ReadOnlyConformityAPI(c1_conformity_api()),
+            report=report,
+            budget=budget,
             include_accts=include_accts,
             exclude_accts=exclude_accts,
+            max_workers=max_workers,
+        )
+    except (ConformityError, RequestBudgetExhausted) as e:
+        log.error(e)
+        if isinstance(e, ConformityError):
+            log.error(e.details)
+        sys.exit(2)
+
+    summary = report.write_summary(requests_used=budget.used)
+    log.info(f"Verification report written to: {report_file.name}")
+    for line in format_summary(summary):
+        log.info(line)
+    log_api_metrics()
+    if summary["mismatches"] or summary["unverified"]:
+        sys.exit(1)
+
+
+def progress_display() -> ProgressDisplay:
+    app_conf = app_config()
+    return ProgressDisplay(
+        tracker=progress_tracker(),
+        metrics=http_metrics(),
+        status_line=status_line(),
+        log_summary=log.info,
+        is_tty=sys.stdout.isatty(),
+        refresh_secs=app_conf["PROGRESS_REFRESH_SECS"],
+        interval_secs=app_conf["PROGRESS_SUMMARY_INTERVAL_SECS"],
+    )
+
+
+def log_api_metrics():
+    metrics = http_metrics()
+    if metrics.endpoints():
+        log.info("")
+        log.info(format_http_metrics(metrics))
+    cache_stats = {api: api_cache_stats(api) for api in ("legacy", "c1")}
+    if any(stats.hits or stats.misses for stats in cache_stats.values()):
+        log.info("")
+        log.info(format_cache_stats(cache_stats))
+    if metrics.concurrency_limits:
+        log.info("")
+        log.info(
+            format_concurrency_limits(
+                {api: concurrency_limit(api) for api in metrics.concurrency_limits}
+            )
+        )
+    budgets = [(api, rate_budget(api)) for api in ("legacy", "c1")]
+    if any(stats.requests for _, budget in budgets for _, stats in budget.stats()):
+        log.info("")
+        log.info(format_rate_budgets(budgets))
+    if span_timers().stages():
+        log.info("")
+        log.info(format_span_timers(span_timers()))
+
+
+def parse_shard_option(value: Optional[str]) -> Optional[Shard]:
+    if not value:
+        return None
+    try:
+        return Shard.parse(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def set_legacy_cache_env(legacy_cache: bool, refresh_legacy_cache: bool):
+    # refreshing the cache implies using it
+    legacy_cache = legacy_cache or refresh_legacy_cache
+    os.environ["LEGACY_HTTP_CACHE"] = "True" if legacy_cache else "False"
+    os.environ["REFRESH_LEGACY_HTTP_CACHE"] = (
+        "True" if refresh_legacy_cache else "False"
+    )
+
+
+def _legacy_api(legacy_snapshot: Optional[str]) -> LegacyConformityAPI:
+    if legacy_snapshot:
+        return snapshot_legacy_conformity_api(snapshot_path=legacy_snapshot)
+    return legacy_conformity_api()
+
+
+@cli.command(
+    "export",
+    help="Exports Legacy Conformity accounts and configurations into a local snapshot file that can be used with 'run --legacy-snapshot'.",
+)
+@click.argument("snapshot-file")
+def export(snapshot_file: str):
+    try:
+        record_count = export_snapshot(
+            api=legacy_conformity_api(),
+            path=snapshot_file,
+            on_progress=lambda msg: log.info(f"Exporting {msg}", flush=True),
         )
+        log.info(f"Exported {record_count} records to {snapshot_file}")
     except ConformityError as e:
         log.error(e)
         log.error(e.details)
         # raise e
+    log_api_metrics()
+
 
+@cli.command(
+    help="Summarizes a run recorded in the event log (see EVENT_LOG_FILE in the tool's config.yml): throughput per kind of operation and the slowest operations."
+)
+@click.argument("events-file", required=False, default=None)
+@click.option(
+    "--run",
+    "run_id",
+    type=str,
+    required=False,
+    default=None,
+    help="Id of the run to summarize. Defaults to the last run in the event log.",
+)
+@click.option(
+    "--top",
+    type=click.IntRange(min=0),
+    required=False,
+    default=10,
+    show_default=True,
+    help="Number of slowest operations to show.",
+)
+def stats(events_file: Optional[str], run_id: Optional[str], top: int):
+    events_file = events_file or app_config()["EVENT_LOG_FILE"]
+    if not events_file or not Path(events_file).is_file():
+        log.error(f"Event log not found: {events_file}")
+        sys.exit(1)
+    run_stats = summarize_events_file(events_file, run_id=run_id, slowest_count=top)
+    if not run_stats.units:
+        log.error(f"No events of run {run_stats.run_id} in {events_file}")
+        sys.exit(1)
+    for line in format_run_stats(run_stats):
+        log.info(line)
 
-def read_accts_file(accounts_file: str) -> Set[AccountEnv]:
-    accts = set()
-    accounts_path = Path(accounts_file.strip())
-    if not accounts_path.exists():
-        raise FileNotFoundError(f"File does not exists: {accounts_file}")
-    if not accounts_path.is_file():
-        raise FileNotFoundError(f"Not a regular file: {accounts_file}")
 
-    with open(accounts_path, newline="", mode="r") as fh:
-        csvr = csv.reader(fh, dialect="excel")
-        for row in csvr:
-            acct_name = row[0]
-            acct_env = row[1] if len(row) > 1 else ""
-            accts.add((acct_name, acct_env))
-    return accts
+@cli.command(
+    "merge-events",
+    help="Merges the last run recorded in the event log of each shard (see 'run --shard') into OUT_FILE as a single run, to be summarized with the 'stats' command.",
+)
+@click.argument("out-file", type=click.Path(file_okay=True, dir_okay=False))
+@click.argument(
+    "shard-files",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True),
+)
+def merge_events(out_file: str, shard_files: Tuple[str, ...]):
+    run_id = merge_shard_event_files(out_file=out_file, shard_files=shard_files)
+    log.info(f"Merged {len(shard_files)} shard(s) into run {run_id} of {out_file}")
 
 
 @cli.command(
     "empty-legacy",
     help="Deletes all accounts and configurations in Legacy Conformity",
 )
-def empty_legacy():
+@click.option(
+    "--profile-out",
+    type=click.Path(file_okay=True, dir_okay=False, writable=True),
+    required=False,
+    default=None,
+    help="Profiles the command and writes the profile to this file: a cProfile (pstats) file, or stack samples for flame graphs when it ends with .folded",
+)
+def empty_legacy(profile_out: Optional[str]):
+    click.get_current_context().with_resource(profiled(profile_out))
     try:
         empty_legacy_conformity(legacy_api=legacy_conformity_api())
     except ConformityError as e:
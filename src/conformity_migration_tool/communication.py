@@ -0,0 +1,93 @@
+from typing import Dict, Iterable, List, Set
+
+from conformity_migration.models import CommunicationSettings, User
+
+from .di import logger
+
+log = logger()
+
+
+def _legacy_user_ids_to_c1_user_ids(
+    legacy_user_ids: List[str],
+    legacy_user_id_email_map: Dict[str, str],
+    c1_email_user_id_map: Dict[str, str],
+    channel: str,
+) -> List[str]:
+    c1_user_ids = []
+    for legacy_user_id in legacy_user_ids:
+        email = legacy_user_id_email_map.get(legacy_user_id)
+        if email is None:
+            log.warn(
+                f"Cannot find email of Legacy Conformity user with an ID of: {legacy_user_id}. Excluding user from {channel} notification."
+            )
+            continue
+
+        c1_user_id = c1_email_user_id_map.get(email)
+        if c1_user_id is None:
+            log.warn(
+                f"Cannot find corresponding user in CloudOne Conformity: {email}. Excluding user from {channel} notification."
+            )
+            continue
+
+        c1_user_ids.append(c1_user_id)
+
+    return c1_user_ids
+
+
+def _filter_users_with_verified_mobile(
+    c1_user_ids: List[str],
+    mobile_verified_c1_users: Set[str],
+    c1_user_id_email_map: Dict[str, str],
+) -> List[str]:
+
+    c1_user_ids_set = set(c1_user_ids)
+    unverified_user_ids = c1_user_ids_set.difference(mobile_verified_c1_users)
+    for user_id in unverified_user_ids:
+        email = c1_user_id_email_map.get(user_id, user_id)
+        log.warn(
+            f"User {email} doesn't have a mobile number verified. Excluding from SMS notification"
+        )
+
+    verified_c1_user_ids = c1_user_ids_set.intersection(mobile_verified_c1_users)
+    return list(verified_c1_user_ids)
+
+
+def candidate_communication_settings(
+    legacy_com_settings: Iterable[CommunicationSettings],
+    legacy_users: List[User],
+    c1_users: List[User],
+) -> Set[CommunicationSettings]:
+    legacy_user_id_email_map = {user.user_id: user.email for user in legacy_users}
+    c1_email_user_id_map = {user.email: user.user_id for user in c1_users}
+    c1_user_id_email_map = {user.user_id: user.email for user in c1_users}
+    mobile_verified_c1_users = {
+        user.user_id for user in c1_users if user.is_mobile_verified
+    }
+
+    candidate_com_settings: Set[CommunicationSettings] = set()
+    for s in legacy_com_settings:
+        legacy_conf = s.configuration
+        c1_conf = legacy_conf
+        if s.channel in ("email", "sms"):
+            c1_conf["users"] = _legacy_user_ids_to_c1_user_ids(
+                legacy_conf["users"],
+                legacy_user_id_email_map,
+                c1_email_user_id_map,
+                s.channel,
+            )
+            if s.channel == "sms":
+                c1_conf["users"] = _filter_users_with_verified_mobile(
+                    c1_conf["users"], mobile_verified_c1_users, c1_user_id_email_map
+                )
+
+        candidate_com_settings.add(
+            CommunicationSettings(
+                com_setting_id=s.com_setting_id,
+                channel=s.channel,
+                enabled=s.enabled,
+                filter=s.filter,
+                configuration=c1_conf,
+            )
+        )
+
+    return candidate_com_settings
@@ -0,0 +1,172 @@
+import math
+import threading
+import time
+from typing import Dict, List, Optional
+
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+
+from .metrics import HTTPMetrics, retry_history
+
+# share of the gap between the latency and its baseline that the baseline
+# catches up after the limit was decreased because of the latency, so that a
+# lasting change (e.g. a busier time of day) doesn't keep the limit low
+BASELINE_DRIFT = 0.25
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+def _is_overloaded_status(status: Optional[int]) -> bool:
+    return status is not None and (status == 429 or status >= 500)
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    Limit of the requests sent to an API at the same time, adjusted to what
+    the API can take (additive increase, multiplicative decrease). It grows by
+    one after every `window` responses whose 95th percentile latency stayed
+    within `latency_tolerance` times the lowest one seen, provided the limit
+    was reached meanwhile. It is multiplied by `backoff` when the API shows
+    it's overloaded: a 429 or 5xx response, a failed request or a rising
+    latency.
+
+    Only the responses to requests sent since the last decrease are taken into
+    account, so that a burst of 429s answering requests sent under the old
+    limit decreases it only once.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit=1,
+        max_limit=16,
+        window=20,
+        latency_tolerance=1.5,
+        backoff=0.5,
+    ) -> None:
+        self._cond = threading.Condition()
+        self._min_limit = max(1, min_limit)
+        self._max_limit = max(self._min_limit, max_limit)
+        self._limit = float(self._clamp(initial_limit))
+        self._window = max(1, window)
+        self._latency_tolerance = latency_tolerance
+        self._backoff = backoff
+        self._latencies: List[float] = []
+        self._saturated = False
+        self._baseline_p95: Optional[float] = None
+        # incremented on every decrease, see release()
+        self._epoch = 0
+        self.in_flight = 0
+        self.decreases = 0
+        self.lowest = self.highest = self.limit
+
+    def _clamp(self, limit: float) -> float:
+        return min(self._max_limit, max(self._min_limit, limit))
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _set_limit(self, limit: float) -> None:
+        self._limit = self._clamp(limit)
+        self.lowest = min(self.lowest, self.limit)
+        self.highest = max(self.highest, self.limit)
+
+    def acquire(self) -> int:
+        """
+        Waits until one more request can be sent. Returns the token to give to
+        release() once it's answered.
+        """
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            if self.in_flight >= self.limit:
+                self._saturated = True
+            return self._epoch
+
+    def release(self, token: int, latency_secs: float, overloaded: bool) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if token == self._epoch:
+                if overloaded:
+                    self._decrease()
+                else:
+                    self._latencies.append(latency_secs)
+                    if len(self._latencies) >= self._window:
+                        self._adjust()
+            self._cond.notify_all()
+
+    def _new_window(self) -> None:
+        self._latencies = []
+        self._saturated = False
+
+    def _decrease(self) -> None:
+        self._set_limit(self._limit * self._backoff)
+        self.decreases += 1
+        self._epoch += 1
+        self._new_window()
+
+    def _adjust(self) -> None:
+        p95 = _percentile(self._latencies, 95)
+        if self._baseline_p95 is None or p95 < self._baseline_p95:
+            self._baseline_p95 = p95
+        if p95 > self._baseline_p95 * self._latency_tolerance:
+            self._baseline_p95 += (p95 - self._baseline_p95) * BASELINE_DRIFT
+            self._decrease()
+            return
+        if self._saturated:
+            self._set_limit(self._limit + 1)
+        self._new_window()
+
+
+class AdaptiveConcurrencyHTTPAdapter(BaseAdapter):
+    def __init__(
+        self,
+        adapter: BaseAdapter,
+        limit: AdaptiveConcurrencyLimit,
+        metrics: HTTPMetrics,
+        api: str,
+    ):
+        self._adapter = adapter
+        self._limit = limit
+        self._metrics = metrics
+        self._api = api
+        metrics.set_concurrency_limit(api, limit.limit)
+
+    def send(self, request: PreparedRequest, *args, **kwargs) -> Response:
+        token = self._limit.acquire()
+        started = time.perf_counter()
+        overloaded = True
+        try:
+            resp = self._adapter.send(request, *args, **kwargs)
+            # includes the responses retried by urllib3 (see API_RETRY_COUNT)
+            overloaded = _is_overloaded_status(resp.status_code) or any(
+                _is_overloaded_status(attempt.status) for attempt in retry_history(resp)
+            )
+            return resp
+        finally:
+            self._limit.release(
+                token,
+                latency_secs=time.perf_counter() - started,
+                overloaded=overloaded,
+            )
+            self._metrics.set_concurrency_limit(self._api, self._limit.limit)
+
+    def close(self) -> None:
+        return self._adapter.close()
+
+
+def format_concurrency_limits(limits: Dict[str, AdaptiveConcurrencyLimit]) -> str:
+    lines = ["Adaptive concurrency limit per API:"]
+    lines.append(
+        f"  {'API':<7} {'Final':>6} {'Lowest':>7} {'Highest':>8} {'Decreases':>10}"
+    )
+    for api, limit in limits.items():
+        lines.append(
+            f"  {api:<7} {limit.limit:>6} {limit.lowest:>7} {limit.highest:>8} {limit.decreases:>10}"
+        )
+    return "\n".join(lines)
@@ -1,31 +1,53 @@
+import atexit
+import json
 import logging
 import os
+import queue
 import random
+import socket
 import sys
 from functools import lru_cache
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
 import yaml
 from requests import Response, Session
 from requests.adapters import BaseAdapter, HTTPAdapter
 from urllib3 import Retry
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.request import ACCEPT_ENCODING
 from vcr import VCR
 
 from conformity_migration.conformity_api import (
+    CacheStats,
+    CachingConformityAPI,
     CloudOneConformityAPI,
+    ConformityAPI,
     DefaultConformityAPI,
     LegacyConformityAPI,
+    SingleFlightConformityAPI,
     WorkaroundFixConformityAPI,
 )
+from conformity_migration.snapshot import SnapshotConformityAPI
 
+from .concurrency import AdaptiveConcurrencyHTTPAdapter, AdaptiveConcurrencyLimit
+from .events import EventLog
+from .http_cache import DiskCache, DiskCacheHTTPAdapter
 from .logger import (
     AppLogger,
+    AppQueueHandler,
     Logger,
     NoStrackTraceExceptionFormatter,
     WithStrackTraceExceptionFormatter,
 )
+from .metrics import HTTPMetrics, MetricsHTTPAdapter
+from .priority import PriorityRateBudget, PriorityRateBudgetHTTPAdapter
+from .profiling import SpanTimers
+from .progress import ProgressTracker, StatusLine, StatusLineStreamHandler
+from .sharding import Shard
+from .tracing import Tracer, TracingHTTPAdapter
 from .utils import str2bool
 
 script_dirpath = Path(__file__).parent
@@ -74,7 +96,9 @@ class LoggerHTTPAdapter(BaseAdapter):
 
     def _build_req_resp_txt(self, resp: Response):
         req = resp.request
-        req_body = str(req.body) if req.body else ""
+        req_body = req.body if req.body else ""
+        if isinstance(req_body, bytes):
+            req_body = req_body.decode("utf-8", errors="replace")
         return f"""[Request]
 {req.method} {req.url}
 
@@ -147,11 +171,71 @@ class VcrHTTPAdapter(BaseAdapter):
         return self._adapter.close()
 
 
-def _http_adapter() -> BaseAdapter:
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections are created with the given socket options"""
+
+    def __init__(self, socket_options: List[Tuple[int, int, int]], **kwargs):
+        self._socket_options = socket_options
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = self._socket_options
+        return super().init_poolmanager(*args, **kwargs)
+
+
+def _socket_options() -> List[Tuple[int, int, int]]:
+    app_conf = app_config()
+    options = list(HTTPConnection.default_socket_options)
+    if not app_conf["HTTP_TCP_NODELAY"]:
+        options = [opt for opt in options if opt[1] != socket.TCP_NODELAY]
+    if app_conf["HTTP_TCP_KEEPALIVE"]:
+        options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        # not every platform lets these be set per socket
+        tcp_keepalive_options = [
+            ("TCP_KEEPIDLE", "HTTP_TCP_KEEPALIVE_IDLE_SECS"),
+            ("TCP_KEEPINTVL", "HTTP_TCP_KEEPALIVE_INTERVAL_SECS"),
+            ("TCP_KEEPCNT", "HTTP_TCP_KEEPALIVE_COUNT"),
+        ]
+        for opt_name, conf_name in tcp_keepalive_options:
+            if hasattr(socket, opt_name):
+                options.append(
+                    (socket.IPPROTO_TCP, getattr(socket, opt_name), app_conf[conf_name])
+                )
+    return options
+
+
+class HistoryRetry(Retry):
+    """
+    Retry whose error, once it gives up, tells how many attempts were made
+    before (see conformity_api.sent_request_count), which a response would
+    tell otherwise.
+    """
+
+    def increment(self, *args, **kwargs) -> Retry:  # type: ignore[override]
+        try:
+            return super().increment(*args, **kwargs)
+        except MaxRetryError as e:
+            e.retry_history = self.history  # type: ignore[attr-defined]
+            raise e
+
+
+@lru_cache(maxsize=1)
+def _shared_http_adapter() -> HTTPAdapter:
+    """
+    The connection pools shared by the Legacy and Cloud One sessions and by
+    every thread using them. Connections are kept alive and reused; with
+    HTTP_POOL_BLOCK a thread waits for a free connection instead of opening
+    one that is thrown away afterwards, so at most HTTP_POOL_MAXSIZE
+    connections are opened per host.
+    """
     app_conf = app_config()
 
-    adapter = HTTPAdapter(
-        max_retries=Retry(
+    return PooledHTTPAdapter(
+        socket_options=_socket_options(),
+        pool_connections=app_conf["HTTP_POOL_CONNECTIONS"],
+        pool_maxsize=app_conf["HTTP_POOL_MAXSIZE"],
+        pool_block=app_conf["HTTP_POOL_BLOCK"],
+        max_retries=HistoryRetry(
             total=None,
             connect=0,
             read=0,
@@ -162,11 +246,15 @@ def _http_adapter() -> BaseAdapter:
             status_forcelist=app_conf["API_RETRY_HTTP_STATUSES"],
             allowed_methods=False,  # false means retry on all Methods
             respect_retry_after_header=True,
-        )
+        ),
     )
 
-    adapter = TimeoutHTTPAdapter(
-        adapter,
+
+def _http_adapter() -> BaseAdapter:
+    app_conf = app_config()
+
+    adapter: BaseAdapter = TimeoutHTTPAdapter(
+        _shared_http_adapter(),
         conn_timeout=app_conf["API_CONNECTION_TIMEOUT"],
         read_timeout=app_conf["API_READ_TIMEOUT"],
     )
@@ -176,26 +264,150 @@ def _http_adapter() -> BaseAdapter:
     return adapter
 
 
+def _json_body_matcher(r1, r2) -> bool:
+    """
+    Compares request bodies as JSON so that cassettes still match when only the
+    formatting of the body changed (e.g. recorded with indented JSON).
+    """
+    if r1.body == r2.body:
+        return True
+    try:
+        return json.loads(r1.body) == json.loads(r2.body)
+    except (TypeError, ValueError):
+        return False
+
+
 def _vcr_adapter(
     adapter: BaseAdapter,
     vcr_file: str,
     vcr_mode: str,
     fake_api_key: str,
-    decode_compressed_response=False,
+    decode_compressed_response=True,
 ) -> BaseAdapter:
     if vcr_file:
         vcr = VCR(
             record_mode=vcr_mode,
-            match_on=("method", "scheme", "host", "port", "path", "query", "body"),
+            match_on=(
+                "method",
+                "scheme",
+                "host",
+                "port",
+                "path",
+                "query",
+                "json_body",
+            ),
             filter_headers=[("Authorization", f"ApiKey {fake_api_key}")],
-            decode_compressed_response=True,
+            decode_compressed_response=decode_compressed_response,
         )
+        vcr.register_matcher("json_body", _json_body_matcher)
         adapter = VcrHTTPAdapter(adapter=adapter, vcr=vcr, vcr_file=vcr_file)
     return adapter
 
 
-def _legacy_http() -> Session:
+@lru_cache(maxsize=1)
+def event_log() -> EventLog:
+    path = app_config()["EVENT_LOG_FILE"]
+    if not path:
+        return EventLog()
+    shard = os.getenv("MIGRATION_SHARD", "")
+    if shard:
+        # shards may run at the same time, each in its own file
+        path = Shard.parse(shard).file_name(path)
+    events = EventLog(out=open(path, mode="a", encoding="utf-8"), shard=shard)
+    atexit.register(events.close)
+    return events
+
+
+@lru_cache(maxsize=1)
+def tracer() -> Tracer:
+    path = os.getenv("TRACE_FILE", "")
+    if not path:
+        return Tracer()
+    trace = Tracer(out=open(path, mode="w", encoding="utf-8"))
+    atexit.register(trace.close)
+    return trace
+
+
+def _tracing_adapter(adapter: BaseAdapter, api: str) -> BaseAdapter:
+    if tracer().enabled:
+        adapter = TracingHTTPAdapter(adapter=adapter, tracer=tracer(), api=api)
+    return adapter
+
+
+@lru_cache(maxsize=1)
+def http_metrics() -> HTTPMetrics:
+    return HTTPMetrics()
+
+
+@lru_cache(maxsize=None)
+def concurrency_limit(api: str) -> AdaptiveConcurrencyLimit:
+    """Each API (i.e. base URL) has its own limit, adjusted independently"""
+    app_conf = app_config()
+    return AdaptiveConcurrencyLimit(
+        initial_limit=app_conf["ADAPTIVE_CONCURRENCY_INITIAL_LIMIT"],
+        min_limit=app_conf["ADAPTIVE_CONCURRENCY_MIN_LIMIT"],
+        max_limit=app_conf["ADAPTIVE_CONCURRENCY_MAX_LIMIT"],
+        window=app_conf["ADAPTIVE_CONCURRENCY_WINDOW"],
+        latency_tolerance=app_conf["ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE"],
+    )
+
+
+def _concurrency_adapter(adapter: BaseAdapter, api: str) -> BaseAdapter:
+    if app_config()["ADAPTIVE_CONCURRENCY"]:
+        adapter = AdaptiveConcurrencyHTTPAdapter(
+            adapter=adapter,
+            limit=concurrency_limit(api),
+            metrics=http_metrics(),
+            api=api,
+        )
+    return adapter
+
+
+@lru_cache(maxsize=None)
+def rate_budget(api: str) -> PriorityRateBudget:
+    """Each API key has its own rate limit"""
+    app_conf = app_config()
+    return PriorityRateBudget(
+        rate_per_sec=app_conf["API_RATE_LIMIT_PER_SEC"],
+        shares=app_conf["API_RATE_PRIORITY_SHARES"],
+    )
+
+
+def _rate_budget_adapter(adapter: BaseAdapter, api: str, base_url: str) -> BaseAdapter:
+    app_conf = app_config()
+    if app_conf["API_RATE_BUDGET"] and app_conf["API_RATE_LIMIT_PER_SEC"] > 0:
+        # outside of the concurrency limit, so that a request waiting for the
+        # budget doesn't hold a slot meanwhile
+        adapter = PriorityRateBudgetHTTPAdapter(
+            adapter=adapter, budget=rate_budget(api), base_url=base_url
+        )
+    return adapter
+
+
+@lru_cache(maxsize=1)
+def progress_tracker() -> ProgressTracker:
+    return ProgressTracker()
+
+
+@lru_cache(maxsize=1)
+def span_timers() -> SpanTimers:
+    return SpanTimers()
+
+
+@lru_cache(maxsize=1)
+def status_line() -> StatusLine:
+    return StatusLine(stream=sys.stdout)
+
+
+def _session() -> Session:
     sess = Session()
+    # gzip and deflate, plus br when brotli is installed (see the "brotli" extra)
+    sess.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    return sess
+
+
+def _legacy_http(base_url: str) -> Session:
+    sess = _session()
     adapter = _http_adapter()
     adapter = _vcr_adapter(
         adapter=adapter,
@@ -203,12 +415,27 @@ def _legacy_http() -> Session:
         vcr_mode=os.getenv("LEG_VCR_MODE", "none"),
         fake_api_key="fake-api-key-for-legacy_conformity",
     )
+    adapter = MetricsHTTPAdapter(adapter=adapter, metrics=http_metrics(), api="legacy")
+    adapter = _concurrency_adapter(adapter, api="legacy")
+    adapter = _rate_budget_adapter(adapter, api="legacy", base_url=base_url)
+    adapter = _tracing_adapter(adapter, api="legacy")
+    if str2bool(os.getenv("LEGACY_HTTP_CACHE", "False")):
+        app_conf = app_config()
+        cache = DiskCache(
+            cache_dir=Path(app_conf["LEGACY_HTTP_CACHE_DIR"]),
+            max_bytes=app_conf["LEGACY_HTTP_CACHE_MAX_MB"] * 1024**2,
+        )
+        adapter = DiskCacheHTTPAdapter(
+            adapter=adapter,
+            cache=cache,
+            refresh=str2bool(os.getenv("REFRESH_LEGACY_HTTP_CACHE", "False")),
+        )
     sess.mount("https://", adapter=adapter)
     return sess
 
 
-def _c1_http() -> Session:
-    sess = Session()
+def _c1_http(base_url: str) -> Session:
+    sess = _session()
     adapter = _http_adapter()
     adapter = _vcr_adapter(
         adapter=adapter,
@@ -218,66 +445,139 @@ def _c1_http() -> Session:
     )
     if str2bool(os.getenv("FAKE_C1_HTTP_ERROR", "False")):
         adapter = FakeErrorHTTPAdapter(adapter=adapter)
+    adapter = MetricsHTTPAdapter(adapter=adapter, metrics=http_metrics(), api="c1")
+    adapter = _concurrency_adapter(adapter, api="c1")
+    adapter = _rate_budget_adapter(adapter, api="c1", base_url=base_url)
+    adapter = _tracing_adapter(adapter, api="c1")
     sess.mount("https://", adapter=adapter)
     return sess
 
 
+@lru_cache(maxsize=None)
+def api_cache_stats(api: str) -> CacheStats:
+    return CacheStats()
+
+
+def _caching_api(api: ConformityAPI, name: str) -> ConformityAPI:
+    app_conf = app_config()
+    ttl_secs = app_conf["API_CACHE_TTL_SECS"]
+    if not ttl_secs:
+        return api
+    return CachingConformityAPI(
+        api,
+        ttl_secs=ttl_secs,
+        max_entries=app_conf["API_CACHE_MAX_ENTRIES"],
+        stats=api_cache_stats(name),
+    )
+
+
 def legacy_conformity_api() -> LegacyConformityAPI:
     user_conf = user_config()
     api_key = user_conf["LEGACY_CONFORMITY"]["API_KEY"]
     base_url = user_conf["LEGACY_CONFORMITY"]["API_BASE_URL"]
 
-    api = DefaultConformityAPI(api_key=api_key, base_url=base_url, http=_legacy_http())
+    api = DefaultConformityAPI(
+        api_key=api_key, base_url=base_url, http=_legacy_http(base_url)
+    )
     api = WorkaroundFixConformityAPI(api)
+    api = SingleFlightConformityAPI(api)
+    api = _caching_api(api, name="legacy")
     api = LegacyConformityAPI(api)
     return api
 
 
+def snapshot_legacy_conformity_api(snapshot_path: str) -> LegacyConformityAPI:
+    return LegacyConformityAPI(SnapshotConformityAPI(path=snapshot_path))
+
+
 def c1_conformity_api() -> CloudOneConformityAPI:
     user_conf = user_config()
     api_key = user_conf["CLOUD_ONE_CONFORMITY"]["API_KEY"]
     base_url = user_conf["CLOUD_ONE_CONFORMITY"]["API_BASE_URL"]
 
-    api = DefaultConformityAPI(api_key=api_key, base_url=base_url, http=_c1_http())
+    api = DefaultConformityAPI(
+        api_key=api_key, base_url=base_url, http=_c1_http(base_url)
+    )
     api = WorkaroundFixConformityAPI(api)
+    api = SingleFlightConformityAPI(api)
+    api = _caching_api(api, name="c1")
     api = CloudOneConformityAPI(api)
     return api
 
 
-@lru_cache(maxsize=1)
-def logger() -> Logger:
-    logger = logging.getLogger("app")
-    logger.setLevel(logging.INFO)
+LOG_FILE = "conformity-migration.log"
+ERROR_LOG_FILE = "conformity-migration-error.log"
 
-    ch = logging.StreamHandler(stream=sys.stdout)
-    ch.setLevel(logging.INFO)
-    ch_fmt = NoStrackTraceExceptionFormatter(fmt="%(message)s")
-    ch.setFormatter(ch_fmt)
-    ch.addFilter(lambda logrec: not logrec.file_only)  # type: ignore
-    logger.addHandler(ch)
 
+@lru_cache(maxsize=1)
+def _log_file_handlers() -> Tuple[RotatingFileHandler, RotatingFileHandler]:
     fh_fmt = WithStrackTraceExceptionFormatter(
         fmt="[%(asctime)s] %(levelname)s %(message)s"
     )
 
+    # the files are only opened once written to, see use_shard_log_files
     log_fh = RotatingFileHandler(
-        filename="conformity-migration.log", maxBytes=1024**2, backupCount=4
+        filename=LOG_FILE, maxBytes=1024**2, backupCount=4, delay=True
     )
     log_fh.setLevel(logging.DEBUG)
     log_fh.setFormatter(fmt=fh_fmt)
-    logger.addHandler(log_fh)
 
     err_fh = RotatingFileHandler(
-        filename="conformity-migration-error.log", maxBytes=1024**2, backupCount=4
+        filename=ERROR_LOG_FILE, maxBytes=1024**2, backupCount=4, delay=True
     )
     err_fh.setLevel(logging.ERROR)
     err_fh.setFormatter(fmt=fh_fmt)
-    logger.addHandler(err_fh)
+    return log_fh, err_fh
+
+
+def use_shard_log_files(shard: Shard) -> None:
+    """
+    Writes the log files of a shard apart from the ones of the shards running at
+    the same time, which would otherwise rotate them under each other.
+    """
+    for handler, path in zip(_log_file_handlers(), (LOG_FILE, ERROR_LOG_FILE)):
+        # the handler lock is held while a record is written
+        handler.acquire()
+        try:
+            if handler.stream is not None:
+                handler.stream.close()
+                handler.stream = None
+            handler.baseFilename = os.path.abspath(shard.file_name(path))
+        finally:
+            handler.release()
+
+
+@lru_cache(maxsize=1)
+def logger() -> Logger:
+    logger = logging.getLogger("app")
+    logger.setLevel(logging.INFO)
+
+    # clears the progress status line before writing, see ProgressDisplay
+    ch = StatusLineStreamHandler(stream=sys.stdout, status_line=status_line())
+    ch.setLevel(logging.INFO)
+    ch_fmt = NoStrackTraceExceptionFormatter(fmt="%(message)s")
+    ch.setFormatter(ch_fmt)
+    ch.addFilter(lambda logrec: not logrec.file_only)  # type: ignore
+
+    log_fh, err_fh = _log_file_handlers()
+
+    # the handlers write to the terminal and the files in a background thread,
+    # so logging doesn't slow down the threads sending requests
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+    logger.addHandler(AppQueueHandler(log_queue))
 
     log_backoff = app_config()["LOG_BACKOFF"]
     if log_backoff:
         backoff_logger = logging.getLogger("backoff")
-        backoff_logger.addHandler(log_fh)
-        backoff_logger.addHandler(err_fh)
+        backoff_logger.addHandler(AppQueueHandler(log_queue, file_only=True))
+
+    listener = QueueListener(log_queue, ch, log_fh, err_fh, respect_handler_level=True)
+    listener.start()
+    # writes what is still in the queue when the tool exits
+    atexit.register(listener.stop)
+
+    def flush():
+        log_queue.join()
+        status_line().clear()
 
-    return AppLogger(logger=logger)
+    return AppLogger(logger=logger, flush=flush)
@@ -0,0 +1,271 @@
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .metrics import thread_request_count
+
+OK = "ok"
+ERROR = "error"
+
+# the unit of a whole migration run
+RUN = "run"
+
+
+def new_run_id() -> str:
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{os.getpid()}"
+
+
+class EventLog:
+    """
+    Writes one JSON object per line for every unit of a migration (e.g. an
+    account, a rule, a suppressed check): its ids, when it started and ended,
+    how many requests its thread sent, and whether it failed. Records of all
+    runs are appended to the same file and tagged with the id of their run,
+    and with their shard when the migration is sharded (see Shard). Without
+    `out`, nothing is written.
+    """
+
+    def __init__(
+        self, out: Optional[IO[str]] = None, run_id: str = "", shard: str = ""
+    ) -> None:
+        self._out = out
+        self.run_id = run_id or new_run_id()
+        self._shard = shard
+        self._lock = threading.Lock()
+
+    def write(
+        self,
+        unit: str,
+        ids: Dict[str, Any],
+        started: float,
+        ended: float,
+        requests: int,
+        outcome: str = OK,
+        error: str = "",
+    ) -> None:
+        if self._out is None:
+            return
+        record = {
+            "run": self.run_id,
+            "unit": unit,
+            "ids": ids,
+            "start": round(started, 6),
+            "end": round(ended, 6),
+            "duration_secs": round(ended - started, 6),
+            "requests": requests,
+            "outcome": outcome,
+        }
+        if error:
+            record["error"] = error
+        if self._shard:
+            record["shard"] = self._shard
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._out.write(line)
+
+    @contextmanager
+    def operation(self, unit: str, **ids) -> Iterator[Dict[str, Any]]:
+        """
+        Records the unit of work done in the `with` block. More ids can be added
+        to the yielded dict. An exception is recorded and raised again.
+        """
+        started = time.time()
+        requests_before = thread_request_count()
+        outcome, error = OK, ""
+        try:
+            yield ids
+        except Exception as e:
+            outcome, error = ERROR, str(e)
+            raise e
+        finally:
+            self.write(
+                unit=unit,
+                ids=ids,
+                started=started,
+                ended=time.time(),
+                requests=thread_request_count() - requests_before,
+                outcome=outcome,
+                error=error,
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._out is not None:
+                self._out.close()
+                self._out = None
+
+
+def read_events(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def last_run_id(events: Iterable[Dict[str, Any]]) -> str:
+    run_id = ""
+    for event in events:
+        run_id = event["run"]
+    return run_id
+
+
+def merged_run_id(run_ids: List[str]) -> str:
+    """Id of the run made of the runs of all the shards, see merge_shard_events"""
+    return f"{min(run_ids)}-merged"
+
+
+def merge_shard_events(
+    events: Iterable[Dict[str, Any]], shard_run_id: str, run_id: str
+) -> Iterator[Dict[str, Any]]:
+    """
+    Events of the run of a single shard, tagged with the id of the merged run
+    so that the runs of all the shards are summarized as one. The id of the
+    run of the shard is kept as "shard_run".
+    """
+    for event in events:
+        if event["run"] == shard_run_id:
+            event["shard_run"] = shard_run_id
+            event["run"] = run_id
+            yield event
+
+
+def merge_shard_event_files(out_file: str, shard_files: Sequence[str]) -> str:
+    """
+    Appends the last run of the event log of each shard to out_file as a
+    single run, like the event log itself, and returns the id of that run.
+    """
+    shard_run_ids = []
+    for shard_file in shard_files:
+        with open(shard_file, mode="r", encoding="utf-8") as fh:
+            shard_run_ids.append(last_run_id(read_events(fh)))
+    run_id = merged_run_id(shard_run_ids)
+    with open(out_file, mode="a", encoding="utf-8") as out:
+        for shard_file, shard_run_id in zip(shard_files, shard_run_ids):
+            with open(shard_file, mode="r", encoding="utf-8") as fh:
+                for event in merge_shard_events(
+                    read_events(fh), shard_run_id=shard_run_id, run_id=run_id
+                ):
+                    out.write(json.dumps(event) + "\n")
+    return run_id
+
+
+class UnitStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.requests = 0
+        self.durations: List[float] = []
+        self.first_start = float("inf")
+        self.last_end = 0.0
+
+    def add(self, event: Dict[str, Any]) -> None:
+        self.count += 1
+        if event["outcome"] != OK:
+            self.errors += 1
+        self.requests += event["requests"]
+        self.durations.append(event["duration_secs"])
+        self.first_start = min(self.first_start, event["start"])
+        self.last_end = max(self.last_end, event["end"])
+
+    @property
+    def elapsed_secs(self) -> float:
+        return max(0.0, self.last_end - self.first_start)
+
+    @property
+    def per_sec(self) -> float:
+        return self.count / self.elapsed_secs if self.elapsed_secs else 0.0
+
+    def percentile(self, pct: float) -> float:
+        durations = sorted(self.durations)
+        return durations[min(len(durations) - 1, int(len(durations) * pct))]
+
+
+class RunStats:
+    def __init__(self, run_id: str, slowest_count=10) -> None:
+        self.run_id = run_id
+        self.units: Dict[str, UnitStats] = dict()
+        self._slowest_count = slowest_count
+        # min-heap of (duration, sequence, event)
+        self._slowest: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._seq = 0
+
+    def add(self, event: Dict[str, Any]) -> None:
+        self.units.setdefault(event["unit"], UnitStats()).add(event)
+        if event["unit"] == RUN:
+            return
+        self._seq += 1
+        entry = (event["duration_secs"], self._seq, event)
+        if len(self._slowest) < self._slowest_count:
+            heapq.heappush(self._slowest, entry)
+        elif entry[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    @property
+    def slowest(self) -> List[Dict[str, Any]]:
+        return [event for _, _, event in sorted(self._slowest, reverse=True)]
+
+
+def summarize_events(
+    events: Iterable[Dict[str, Any]], run_id: str, slowest_count=10
+) -> RunStats:
+    stats = RunStats(run_id=run_id, slowest_count=slowest_count)
+    for event in events:
+        if event["run"] == run_id:
+            stats.add(event)
+    return stats
+
+
+def summarize_events_file(
+    events_file: str, run_id: Optional[str] = None, slowest_count=10
+) -> RunStats:
+    """Summarizes a run of an event log file, by default its last run"""
+    if not run_id:
+        with open(events_file, mode="r", encoding="utf-8") as fh:
+            run_id = last_run_id(read_events(fh))
+    with open(events_file, mode="r", encoding="utf-8") as fh:
+        return summarize_events(
+            read_events(fh), run_id=run_id, slowest_count=slowest_count
+        )
+
+
+def _format_ids(ids: Dict[str, Any]) -> str:
+    return ", ".join(f"{key}={value}" for key, value in ids.items())
+
+
+def format_run_stats(stats: RunStats) -> List[str]:
+    units = sorted(stats.units.items())
+    run = stats.units.get(RUN)
+    lines = [f"Run: {stats.run_id}"]
+    if run is not None:
+        lines.append(f"Duration: {run.elapsed_secs:.1f}s")
+    lines.append(
+        f"  {'Unit':<15} {'Count':>8} {'Errors':>7} {'Per sec':>8} {'Mean s':>8} {'p95 s':>8} {'Max s':>8} {'Requests':>9}"
+    )
+    for unit, unit_stats in units:
+        mean = sum(unit_stats.durations) / unit_stats.count
+        lines.append(
+            f"  {unit:<15} {unit_stats.count:>8} {unit_stats.errors:>7} {unit_stats.per_sec:>8.2f} "
+            f"{mean:>8.2f} {unit_stats.percentile(0.95):>8.2f} {max(unit_stats.durations):>8.2f} {unit_stats.requests:>9}"
+        )
+    if stats.slowest:
+        lines.append("Slowest operations:")
+        for event in stats.slowest:
+            lines.append(
+                f"  {event['duration_secs']:>8.2f}s {event['unit']:<15} {event['outcome']:<5} {_format_ids(event['ids'])}"
+            )
+    return lines
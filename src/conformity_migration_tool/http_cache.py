@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+# headers about the transfer of a body, which is stored already decoded
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+# responses being written
+TMP_PREFIX = ".tmp-"
+
+
+def _normalized_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, query, ""))
+
+
+def cache_key(request: PreparedRequest) -> str:
+    """
+    Content address of a GET request: its URL with the query parameters sorted,
+    and a fingerprint of the API key it is sent with, so that responses of
+    different organisations are never mixed up.
+    """
+    api_key_fingerprint = hashlib.sha256(
+        str(request.headers.get("Authorization", "")).encode("utf-8")
+    ).hexdigest()
+    url = _normalized_url(request.url or "")
+    return hashlib.sha256(f"{url}\n{api_key_fingerprint}".encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Response bodies stored as files named after their cache key. When the files
+    take more than `max_bytes`, the least recently used ones are deleted.
+
+    Which ones are the least recently used is kept in memory, read once from
+    the last modification times of the files (which get updates for the next
+    runs), so that evicting doesn't list the whole cache directory every time.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int) -> None:
+        self._dir = cache_dir
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # cache key -> size of the stored responses, the least recently used first
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._total_bytes = 0
+
+    def _path(self, key: str) -> Path:
+        return self._dir.joinpath(key[:2], key)
+
+    def _files(self) -> List[Tuple[float, int, Path]]:
+        """(last used time, size, path) of every stored response"""
+        files = []
+        for path in self._dir.glob("*/*"):
+            if path.name.startswith(TMP_PREFIX):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _ensure_index(self) -> "OrderedDict[str, int]":
+        if self._index is None:
+            self._index = OrderedDict(
+                (path.name, size) for _, size, path in sorted(self._files())
+            )
+            self._total_bytes = sum(self._index.values())
+        return self._index
+
+    def get(self, key: str) -> Optional[Tuple[dict, bytes]]:
+        path = self._path(key)
+        try:
+            with open(path, mode="rb") as fh:
+                meta = json.loads(fh.readline())
+                body = fh.read()
+            os.utime(path)  # marks it as recently used for the next runs
+        except (FileNotFoundError, ValueError):
+            return None
+        with self._lock:
+            if self._index is not None and key in self._index:
+                self._index.move_to_end(key)
+        return meta, body
+
+    def put(self, key: str, meta: dict, body: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=TMP_PREFIX)
+        with os.fdopen(fd, mode="wb") as fh:
+            fh.write(json.dumps(meta).encode("utf-8") + b"\n")
+            fh.write(body)
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            index = self._ensure_index()
+            os.replace(tmp_path, path)
+            self._total_bytes += size - index.pop(key, 0)
+            index[key] = size
+            if self._total_bytes > self._max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        index = self._ensure_index()
+        while self._total_bytes > self._max_bytes and index:
+            key, size = index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._index = OrderedDict()
+            self._total_bytes = 0
+
+
+class DiskCacheHTTPAdapter(BaseAdapter):
+    """
+    Answers GET requests with the successful responses stored by earlier runs.
+    Meant for Legacy Conformity, which does not change while it is migrated, so
+    that rehearsing a migration again only sends requests to Cloud One.
+
+    With `refresh`, stored responses are not used but replaced with new ones.
+    Any other request (e.g. a DELETE by empty-legacy) means Legacy Conformity is
+    being changed, so the whole cache is dropped.
+    """
+
+    def __init__(self, adapter: BaseAdapter, cache: DiskCache, refresh=False):
+        self._adapter = adapter
+        self._cache = cache
+        self._refresh = refresh
+
+    def _cached_response(
+        self, request: PreparedRequest, meta: dict, body: bytes
+    ) -> Response:
+        resp = Response()
+        resp.status_code = meta["status"]
+        resp.reason = meta["reason"]
+        resp.headers = CaseInsensitiveDict(meta["headers"])
+        resp.encoding = meta["encoding"]
+        resp.url = request.url or ""
+        resp.request = request
+        resp._content = body
+        return resp
+
+    def send(self, request: PreparedRequest, *args, **kwargs) -> Response:
+        if request.method != "GET":
+            self._cache.clear()
+            return self._adapter.send(request, *args, **kwargs)
+
+        key = cache_key(request)
+        if not self._refresh:
+            cached = self._cache.get(key)
+            if cached is not None:
+                meta, body = cached
+                return self._cached_response(request, meta, body)
+
+        resp = self._adapter.send(request, *args, **kwargs)
+        if resp.status_code == 200:
+            meta = {
+                "status": resp.status_code,
+                "reason": resp.reason,
+                "encoding": resp.encoding,
+                "headers": {
+                    name: value
+                    for name, value in resp.headers.items()
+                    if name.lower() not in DROPPED_HEADERS
+                },
+            }
+            self._cache.put(key, meta=meta, body=resp.content)
+        return resp
+
+    def close(self) -> None:
+        return self._adapter.close()
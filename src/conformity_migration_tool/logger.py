@@ -1,4 +1,7 @@
+import copy
 import logging
+from logging.handlers import QueueHandler
+from typing import Callable, Optional
 
 
 class Logger:
@@ -17,10 +20,17 @@ class Logger:
     def exception(self, msg: object, *args, file_only=False, **kwargs) -> None:
         ...
 
+    def flush(self) -> None:
+        """Waits until the messages logged so far are written, e.g. before prompting the user"""
+        ...
+
 
 class AppLogger(Logger):
-    def __init__(self, logger: logging.Logger) -> None:
+    def __init__(
+        self, logger: logging.Logger, flush: Optional[Callable[[], None]] = None
+    ) -> None:
         self.logger = logger
+        self._flush = flush
 
     def _prepare_for_log(self, kwargs: dict, file_only=False):
         # remove these params from converted print statements
@@ -50,6 +60,30 @@ class AppLogger(Logger):
         self._prepare_for_log(kwargs, file_only=file_only)
         return self.logger.exception(msg, *args, **kwargs)
 
+    def flush(self) -> None:
+        if self._flush is not None:
+            self._flush()
+
+
+class AppQueueHandler(QueueHandler):
+    """
+    Puts records on a queue that a QueueListener writes to the actual handlers
+    in the background. Unlike QueueHandler, the exception of a record is left
+    for those handlers to format, with or without its stack trace.
+    """
+
+    def __init__(self, queue, file_only=False) -> None:
+        super().__init__(queue)
+        self._file_only = file_only
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if self._file_only:
+            record.file_only = True
+        return record
+
 
 class NoStrackTraceExceptionFormatter(logging.Formatter):
     def formatException(self, exc_info) -> str:
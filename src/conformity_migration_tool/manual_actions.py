@@ -0,0 +1,226 @@
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Collection, Dict, List, Optional, Set, Union
+
+import yaml
+
+from conformity_migration.cloud_accounts import AWSCloudAccountAdder, prompt_continue
+from conformity_migration.conformity_api import (
+    CloudOneConformityAPI,
+    LegacyConformityAPI,
+)
+from conformity_migration.models import Account
+
+from .accounts import (
+    ACCOUNT_ADD_BATCH_SIZE,
+    AccountEnv,
+    acct_label,
+    cloud_account_adders,
+    include_exclude_accts,
+    index_c1_accounts,
+    missing_managed_groups,
+)
+from .di import app_config, logger
+from .prompts import ask_input
+from .sharding import Shard
+from .utils import chunked, prompt_lock, str2bool
+
+log = logger()
+
+
+# CSV file listing the AWS accounts whose CloudConformity stack needs a new ExternalID
+AWS_STACK_UPDATES_FILE = "conformity-migration-aws-stacks.csv"
+
+
+def read_manual_actions_file(manual_actions_file: str) -> Dict[str, Any]:
+    with open(manual_actions_file, mode="r") as fh:
+        return yaml.load(fh, Loader=yaml.SafeLoader) or {}
+
+
+class ManualActions:
+    """What the user gave before the migration started, see collect_manual_actions"""
+
+    def __init__(self) -> None:
+        # App registration keys per Azure directory id
+        self.azure_app_keys: Dict[str, str] = dict()
+        # see AWSCloudAccountAdder
+        self.updated_aws_stacks: Union[bool, Collection[str]] = False
+
+
+def collect_manual_actions(
+    legacy_api: LegacyConformityAPI,
+    c1_api: CloudOneConformityAPI,
+    include_accts=Optional[Set[AccountEnv]],
+    exclude_accts=Optional[Set[AccountEnv]],
+    manual_actions_file: Optional[str] = None,
+    shard: Optional[Shard] = None,
+) -> ManualActions:
+    """
+    Gathers every action needed from the user before the migration starts, so
+    that it then runs without stopping for them: the App registration key of
+    every Azure directory to add, and the update of the CloudConformity stack of
+    every AWS account to add, which are listed together and confirmed once.
+    Both can instead be given in the manual actions file. With a shard, only
+    its AWS accounts are listed, and the Azure directories (which are added
+    with the organisation-level configurations) only by the first shard.
+    """
+    actions: Dict[str, Any] = dict()
+    if manual_actions_file:
+        actions = read_manual_actions_file(manual_actions_file)
+
+    manual_actions = ManualActions()
+    if shard is None or shard.migrates_organisation:
+        log.info("Collecting App registration keys of Azure directories", flush=True)
+        manual_actions.azure_app_keys = collect_azure_app_keys(
+            legacy_api=legacy_api,
+            c1_api=c1_api,
+            known_keys=actions.get("azure_app_keys") or {},
+        )
+
+    skip_aws_prompt = str2bool(os.getenv("SKIP_AWS_PROMPT", "False"))
+    if actions.get("aws_stacks_updated", False):
+        manual_actions.updated_aws_stacks = True
+    elif not skip_aws_prompt:
+        log.info("Collecting AWS accounts to add", flush=True)
+        # adding these accounts doesn't stop for their stack anymore, the
+        # others (e.g. whose access configuration couldn't be read) still do
+        manual_actions.updated_aws_stacks = collect_aws_stack_updates(
+            legacy_api=legacy_api,
+            c1_api=c1_api,
+            include_accts=include_accts,
+            exclude_accts=exclude_accts,
+            shard=shard,
+        )
+    return manual_actions
+
+
+def collect_azure_app_keys(
+    legacy_api: LegacyConformityAPI,
+    c1_api: CloudOneConformityAPI,
+    known_keys: Dict[str, str],
+) -> Dict[str, str]:
+    azure_app_keys: Dict[str, str] = dict()
+    for mg in missing_managed_groups(legacy_api=legacy_api, c1_api=c1_api):
+        if mg.cloud_type != "azure":
+            continue
+        azure_conf = mg.cloud_data["azure"]
+        directory_id = azure_conf["directoryId"]
+        app_client_key = known_keys.get(directory_id)
+        if not app_client_key:
+            app_client_key = prompt_azure_app_client_id(
+                mg.name, directory_id, azure_conf["applicationId"]
+            )
+        azure_app_keys[directory_id] = app_client_key
+    return azure_app_keys
+
+
+def collect_aws_stack_updates(
+    legacy_api: LegacyConformityAPI,
+    c1_api: CloudOneConformityAPI,
+    include_accts=Optional[Set[AccountEnv]],
+    exclude_accts=Optional[Set[AccountEnv]],
+    shard: Optional[Shard] = None,
+) -> Set[str]:
+    """
+    Lists every AWS account to add whose CloudConformity stack has to be updated
+    with the ExternalID of CloudOne Conformity, writes them to
+    AWS_STACK_UPDATES_FILE (one per shard) and asks once to continue when they
+    are updated. Returns the AWS account numbers listed.
+
+    An account whose access configuration can't be read is logged and left
+    out: adding it reads it again, and asks to update its stack then.
+    """
+    acct_adder_for = cloud_account_adders(legacy_api=legacy_api, c1_api=c1_api)
+    aws_adder = acct_adder_for(AWSCloudAccountAdder.cloud_type)
+    c1_accts_index = index_c1_accounts(c1_api.list_accounts(), acct_adder_for)
+    c1_aws_accts_index = c1_accts_index.get(AWSCloudAccountAdder.cloud_type, {})
+
+    legacy_accts = include_exclude_accts(
+        legacy_accts=legacy_api.list_accounts(),
+        include_accts=include_accts,
+        exclude_accts=exclude_accts,
+        shard=shard,
+    )
+    new_aws_accts = (
+        acct
+        for acct in legacy_accts
+        if acct.cloud_type == AWSCloudAccountAdder.cloud_type
+        and not aws_adder.account_exists(c1_aws_accts_index, acct)[0]  # type: ignore
+    )
+
+    def read_old_external_id(acct: Account) -> Optional[str]:
+        try:
+            return aws_adder.account_access(acct)["externalId"]  # type: ignore
+        except Exception:
+            log.exception(
+                f"Failed to read the ExternalID of AWS account: {acct_label(acct)}"
+            )
+            return None
+
+    new_external_id = c1_api.get_organisation_external_id()
+    aws_acct_nums: List[str] = []
+    old_external_ids: List[str] = []
+    stack_updates_file = (
+        shard.file_name(AWS_STACK_UPDATES_FILE) if shard else AWS_STACK_UPDATES_FILE
+    )
+    with open(stack_updates_file, mode="w", newline="") as fh, ThreadPoolExecutor(
+        max_workers=max(1, app_config()["ACCOUNT_ACCESS_READ_WIDTH"]),
+        thread_name_prefix="account-access",
+    ) as readers:
+        csvw = csv.writer(fh, dialect="excel")
+        csvw.writerow(
+            [
+                "aws_account_id",
+                "account_name",
+                "environment",
+                "old_external_id",
+                "new_external_id",
+            ]
+        )
+        for batch in chunked(new_aws_accts, ACCOUNT_ADD_BATCH_SIZE):
+            old_ids = readers.map(read_old_external_id, batch)
+            for acct, old_external_id in zip(batch, old_ids):
+                if old_external_id is None:
+                    continue
+                aws_acct_num = acct.attributes["awsaccount-id"]
+                aws_acct_nums.append(aws_acct_num)
+                old_external_ids.append(old_external_id)
+                csvw.writerow(
+                    [
+                        aws_acct_num,
+                        acct.name,
+                        acct.environment,
+                        old_external_id,
+                        new_external_id,
+                    ]
+                )
+
+    if not aws_acct_nums:
+        os.remove(stack_updates_file)
+        return set()
+    with prompt_lock:
+        log.flush()
+        AWSCloudAccountAdder.show_update_stacks_external_id_instructions(
+            aws_acct_nums=aws_acct_nums,
+            old_external_ids=old_external_ids,
+            new_external_id=new_external_id,
+        )
+        log.info(f"These AWS accounts are also listed in: {stack_updates_file}")
+        log.flush()
+        prompt_continue()
+    return set(aws_acct_nums)
+
+
+def prompt_azure_app_client_id(directory_name, directory_id, app_client_id) -> str:
+    with prompt_lock:
+        log.info(
+            f"""
+Please enter the App registration key for the following Active Directory:
+If you lost the key, you may generate a new Client Secret on your Azure App Registration.
+    Active Directory Name: {directory_name}
+    Active Directory Tenant ID: {directory_id}
+    App registration Application ID: {app_client_id}
+"""
+        )
+        return ask_input("App registration key:", mask_input=True)
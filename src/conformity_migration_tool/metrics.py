@@ -0,0 +1,203 @@
+import threading
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+from urllib3.util.retry import RequestHistory
+
+from conformity_migration.conformity_api import CacheStats
+
+# path segments of the Conformity API that are not resource ids
+STATIC_PATH_SEGMENTS = {
+    "api",
+    "v1",
+    "accounts",
+    "access",
+    "azure",
+    "active-directories",
+    "bot",
+    "checks",
+    "communication",
+    "external-id",
+    "groups",
+    "organisation",
+    "profiles",
+    "report-configs",
+    "rules",
+    "settings",
+    "users",
+    "whoami",
+}
+
+
+def endpoint_template(url: str) -> str:
+    """e.g. https://host/v1/accounts/abc/settings/rules/EC2-001 -> /v1/accounts/{id}/settings/rules/{id}"""
+    segments = urlsplit(url).path.strip("/").split("/")
+    return "/" + "/".join(
+        seg if seg in STATIC_PATH_SEGMENTS else "{id}" for seg in segments if seg
+    )
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.compressed_responses = 0
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.decoded_bytes - self.wire_bytes
+
+
+# (api, method, endpoint template)
+EndpointKey = Tuple[str, str, str]
+
+
+class HTTPMetrics:
+    """Per-endpoint counters of the requests sent to the Conformity APIs."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._endpoints: Dict[EndpointKey, EndpointStats] = dict()
+        # requests sent and not answered yet
+        self.in_flight = 0
+        # 429 Too Many Requests responses, including the ones retried
+        self.throttled = 0
+        # api -> current limit of the requests in flight, see AdaptiveConcurrencyLimit
+        self.concurrency_limits: Dict[str, int] = dict()
+
+    def request_started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def request_ended(self, throttled: int) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.throttled += throttled
+
+    def set_concurrency_limit(self, api: str, limit: int) -> None:
+        with self._lock:
+            self.concurrency_limits[api] = limit
+
+    def record_response(
+        self,
+        api: str,
+        method: str,
+        url: str,
+        wire_bytes: int,
+        decoded_bytes: int,
+        compressed: bool,
+    ) -> None:
+        key = (api, method, endpoint_template(url))
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = EndpointStats()
+            stats.requests += 1
+            stats.wire_bytes += wire_bytes
+            stats.decoded_bytes += decoded_bytes
+            if compressed:
+                stats.compressed_responses += 1
+
+    def endpoints(self) -> List[Tuple[EndpointKey, EndpointStats]]:
+        with self._lock:
+            return sorted(self._endpoints.items())
+
+
+_thread_requests = threading.local()
+
+
+def thread_request_count() -> int:
+    """Number of requests sent so far by the current thread"""
+    return getattr(_thread_requests, "count", 0)
+
+
+def retry_history(resp: Response) -> Tuple[RequestHistory, ...]:
+    """Earlier attempts of a request retried by urllib3 (see API_RETRY_COUNT)"""
+    retries = getattr(resp.raw, "retries", None)
+    return getattr(retries, "history", None) or ()
+
+
+def _throttled_responses(resp: Response) -> int:
+    """Number of 429 responses to a request, including the ones retried by urllib3"""
+    throttled = sum(1 for attempt in retry_history(resp) if attempt.status == 429)
+    return throttled + (1 if resp.status_code == 429 else 0)
+
+
+class MetricsHTTPAdapter(BaseAdapter):
+    def __init__(self, adapter: BaseAdapter, metrics: HTTPMetrics, api: str):
+        self._adapter = adapter
+        self._metrics = metrics
+        self._api = api
+
+    def send(self, request: PreparedRequest, *args, **kwargs) -> Response:
+        _thread_requests.count = thread_request_count() + 1
+        self._metrics.request_started()
+        throttled = 0
+        try:
+            resp = self._adapter.send(request, *args, **kwargs)
+            throttled = _throttled_responses(resp)
+        finally:
+            self._metrics.request_ended(throttled=throttled)
+        # reads (and decompresses) the whole body, which the API client does anyway
+        decoded_bytes = len(resp.content)
+        wire_bytes = decoded_bytes
+        raw_tell = getattr(resp.raw, "tell", None)
+        if raw_tell is not None:
+            # number of bytes read from the connection, i.e. before decompression
+            wire_bytes = raw_tell() or decoded_bytes
+        self._metrics.record_response(
+            api=self._api,
+            method=request.method or "",
+            url=request.url or "",
+            wire_bytes=wire_bytes,
+            decoded_bytes=decoded_bytes,
+            compressed=bool(resp.headers.get("Content-Encoding")),
+        )
+        return resp
+
+    def close(self) -> None:
+        return self._adapter.close()
+
+
+def _format_bytes(count: int) -> str:
+    size = float(count)
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def format_http_metrics(metrics: HTTPMetrics) -> str:
+    lines = ["HTTP transfer per endpoint:"]
+    lines.append(
+        f"  {'API':<7} {'Method':<7} {'Endpoint':<45} {'Requests':>8} {'Compressed':>10} {'Transferred':>12} {'Decoded':>12} {'Saved':>12}"
+    )
+    total_wire = total_decoded = 0
+    for (api, method, endpoint), stats in metrics.endpoints():
+        total_wire += stats.wire_bytes
+        total_decoded += stats.decoded_bytes
+        lines.append(
+            f"  {api:<7} {method:<7} {endpoint:<45} {stats.requests:>8} {stats.compressed_responses:>10} "
+            f"{_format_bytes(stats.wire_bytes):>12} {_format_bytes(stats.decoded_bytes):>12} {_format_bytes(stats.saved_bytes):>12}"
+        )
+    lines.append(
+        f"  Total transferred: {_format_bytes(total_wire)}, decoded: {_format_bytes(total_decoded)}, "
+        f"saved by compression: {_format_bytes(total_decoded - total_wire)}"
+    )
+    return "\n".join(lines)
+
+
+def format_cache_stats(stats_per_api: Dict[str, CacheStats]) -> str:
+    lines = ["API read cache:"]
+    lines.append(f"  {'API':<7} {'Method':<35} {'Hits':>8} {'Misses':>8}")
+    for api, stats in stats_per_api.items():
+        for method, hits, misses in stats.per_method():
+            lines.append(f"  {api:<7} {method:<35} {hits:>8} {misses:>8}")
+    hits = sum(stats.hits for stats in stats_per_api.values())
+    misses = sum(stats.misses for stats in stats_per_api.values())
+    lines.append(f"  Total hits: {hits}, misses: {misses}")
+    return "\n".join(lines)
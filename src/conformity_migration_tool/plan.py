@@ -0,0 +1,460 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from conformity_migration.conformity_api import ConformityAPI
+from conformity_migration.models import (
+    CommunicationSettings,
+    Group,
+    ReportConfig,
+    User,
+)
+
+from .accounts import (
+    AccountEnv,
+    acct_label,
+    cloud_account_adders,
+    include_exclude_accts,
+    index_c1_accounts,
+    spill_dict,
+)
+from .communication import candidate_communication_settings
+from .di import logger
+from .spill import SpillDict
+
+log = logger()
+
+LEGACY = "legacy"
+CLOUD_ONE = "c1"
+
+READ_METHODS = {"GET"}
+
+# (stage, side, method, endpoint)
+PlanKey = Tuple[str, str, str, str]
+
+
+class MigrationPlan:
+    """
+    Collects the requests a migration run would make, per stage and endpoint.
+    Endpoints are path templates relative to the API base URL,
+    e.g. PATCH /accounts/{accountId}/settings/rules/{ruleId}
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: Dict[PlanKey, int] = dict()
+
+    def add(self, stage: str, side: str, method: str, endpoint: str, count=1):
+        if count <= 0:
+            return
+        key = (stage, side, method, endpoint)
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + count
+
+    def read(self, stage: str, side: str, endpoint: str, count=1):
+        self.add(stage=stage, side=side, method="GET", endpoint=endpoint, count=count)
+
+    def _snapshot(self) -> List[Tuple[PlanKey, int]]:
+        with self._lock:
+            return list(self._counts.items())
+
+    def items(self) -> List[Tuple[PlanKey, int]]:
+        return sorted(self._snapshot())
+
+    def total(self, side: str = "", writes_only=False) -> int:
+        return sum(
+            count
+            for (_, s, method, _), count in self.items()
+            if (not side or s == side)
+            and (not writes_only or method not in READ_METHODS)
+        )
+
+    def stage_totals(self) -> Dict[str, Tuple[int, int]]:
+        """Returns {stage: (reads, writes)} in the order the stages were planned."""
+        totals: Dict[str, Tuple[int, int]] = dict()
+        for (stage, _, method, _), count in self._snapshot():
+            reads, writes = totals.get(stage, (0, 0))
+            if method in READ_METHODS:
+                reads += count
+            else:
+                writes += count
+            totals[stage] = (reads, writes)
+        return totals
+
+    def endpoint_totals(self) -> Dict[Tuple[str, str, str], int]:
+        totals: Dict[Tuple[str, str, str], int] = dict()
+        for (_, side, method, endpoint), count in self.items():
+            key = (side, method, endpoint)
+            totals[key] = totals.get(key, 0) + count
+        return totals
+
+
+def estimate_wall_time_secs(
+    plan: MigrationPlan,
+    rate_limit_per_sec: float,
+    avg_latency_secs: float,
+    max_workers: int,
+) -> float:
+    """
+    Rough lower-bound estimate of a migration run. Each API (Legacy and
+    Cloud One) has its own rate limit, and all the requests share the same
+    pool of workers, so the run takes at least as long as the slowest of them.
+    """
+    max_workers = max(1, max_workers)
+
+    def side_secs(count: int) -> float:
+        rate_bound = count / rate_limit_per_sec if rate_limit_per_sec > 0 else 0.0
+        latency_bound = count * avg_latency_secs / max_workers
+        return max(rate_bound, latency_bound)
+
+    total = plan.total()
+    return max(
+        side_secs(plan.total(side=LEGACY)),
+        side_secs(plan.total(side=CLOUD_ONE)),
+        total * avg_latency_secs / max_workers,
+    )
+
+
+def format_duration(secs: float) -> str:
+    secs = int(round(secs))
+    hours, rem = divmod(secs, 3600)
+    mins, secs = divmod(rem, 60)
+    if hours:
+        return f"{hours}h {mins:02d}m {secs:02d}s"
+    if mins:
+        return f"{mins}m {secs:02d}s"
+    return f"{secs}s"
+
+
+def format_plan(
+    plan: MigrationPlan,
+    rate_limit_per_sec: float,
+    avg_latency_secs: float,
+    max_workers: int,
+) -> str:
+    side_names = {LEGACY: "Legacy", CLOUD_ONE: "CloudOne"}
+    lines = ["Migration plan (no changes were made)", "", "Requests per stage:"]
+    lines.append(f"  {'Stage':<40} {'Reads':>8} {'Writes':>8}")
+    for stage, (reads, writes) in plan.stage_totals().items():
+        lines.append(f"  {stage:<40} {reads:>8} {writes:>8}")
+
+    lines += ["", "Requests per endpoint:"]
+    lines.append(f"  {'API':<9} {'Method':<7} {'Endpoint':<50} {'Requests':>8}")
+    for (side, method, endpoint), count in sorted(plan.endpoint_totals().items()):
+        lines.append(
+            f"  {side_names.get(side, side):<9} {method:<7} {endpoint:<50} {count:>8}"
+        )
+
+    est_secs = estimate_wall_time_secs(
+        plan=plan,
+        rate_limit_per_sec=rate_limit_per_sec,
+        avg_latency_secs=avg_latency_secs,
+        max_workers=max_workers,
+    )
+    lines += [
+        "",
+        f"Total requests: {plan.total()} (Legacy: {plan.total(side=LEGACY)}, CloudOne: {plan.total(side=CLOUD_ONE)})",
+        f"Total writes: {plan.total(writes_only=True)}",
+        f"Estimated wall time: ~{format_duration(est_secs)} "
+        f"(rate limit: {rate_limit_per_sec}/s per API, latency: {avg_latency_secs}s, workers: {max_workers})",
+        "Note: Interactive steps (e.g. updating AWS stacks, inviting users) are not included in the estimate.",
+    ]
+    return "\n".join(lines)
+
+
+def plan_migration(
+    legacy_api: ConformityAPI,
+    c1_api: ConformityAPI,
+    include_accts=Optional[Set[AccountEnv]],
+    exclude_accts=Optional[Set[AccountEnv]],
+) -> MigrationPlan:
+    """
+    Reads the Legacy and Cloud One Conformity state and computes the requests
+    run_migration would make, without making any change to either of them.
+    Overwrite confirmations are assumed to be answered with yes.
+    """
+    plan = MigrationPlan()
+
+    log.info("Planning Organisation Profile", flush=True)
+    plan.read("org-profile", LEGACY, "/users")
+    plan.read("org-profile", LEGACY, "/profiles/{profileId}")
+    plan.read("org-profile", CLOUD_ONE, "/users")
+    plan.read("org-profile", CLOUD_ONE, "/profiles/{profileId}")
+    plan.add("org-profile", CLOUD_ONE, "PATCH", "/profiles/{profileId}")
+
+    log.info("Planning Groups", flush=True)
+    legacy_groups = list(legacy_api.list_groups())
+    c1_groups = list(c1_api.list_groups())
+    c1_groups_set = set(c1_groups)
+    plan.read("managed-groups", LEGACY, "/groups")
+    plan.read("managed-groups", CLOUD_ONE, "/groups")
+    plan.read("user-groups", LEGACY, "/groups")
+    plan.read("user-groups", CLOUD_ONE, "/groups")
+    for group in legacy_groups:
+        if group in c1_groups_set:
+            continue
+        if group.group_type == Group.GROUP_TYPE_MANAGED_GROUP:
+            if group.cloud_type == "azure":
+                plan.add(
+                    "managed-groups", CLOUD_ONE, "POST", "/azure/active-directories"
+                )
+        else:
+            plan.add("user-groups", CLOUD_ONE, "POST", "/groups")
+
+    log.info("Planning Cloud Accounts", flush=True)
+    accts_to_migrate = plan_cloud_accounts(
+        plan=plan,
+        legacy_api=legacy_api,
+        c1_api=c1_api,
+        include_accts=include_accts,
+        exclude_accts=exclude_accts,
+    )
+
+    log.info("Planning Users", flush=True)
+    legacy_users = list(legacy_api.get_all_users())
+    c1_users = list(c1_api.get_all_users())
+    plan.read("users", LEGACY, "/users")
+    plan.read("users", CLOUD_ONE, "/users", count=2)
+    if set(legacy_users).difference(set(c1_users)) or any(
+        user.is_mobile_verified for user in legacy_users
+    ):
+        plan.read("users", CLOUD_ONE, "/users")
+
+    log.info("Planning Custom Profiles", flush=True)
+    legacy_profiles = list(legacy_api.get_custom_profiles())
+    c1_profiles = list(c1_api.get_custom_profiles())
+    legacy_profiles_set = set(legacy_profiles)
+    plan.read("custom-profiles", LEGACY, "/profiles")
+    plan.read("custom-profiles", CLOUD_ONE, "/profiles")
+    plan.add(
+        "custom-profiles",
+        CLOUD_ONE,
+        "DELETE",
+        "/profiles/{profileId}",
+        count=len([p for p in c1_profiles if p in legacy_profiles_set]),
+    )
+    plan.read("custom-profiles", LEGACY, "/profiles/{profileId}", len(legacy_profiles))
+    plan.add("custom-profiles", CLOUD_ONE, "POST", "/profiles", len(legacy_profiles))
+
+    log.info("Planning Report Configs", flush=True)
+    plan_report_configs(
+        plan=plan,
+        stage="org-report-configs",
+        legacy_report_configs=legacy_api.list_organisation_report_configs(),
+        c1_report_configs=c1_api.list_organisation_report_configs(),
+    )
+
+    c1_group_id_map: Dict[Group, str] = {g: g.group_id for g in c1_groups}
+    plan.read("group-configs", LEGACY, "/groups")
+    plan.read("group-configs", CLOUD_ONE, "/groups")
+    for legacy_group in legacy_groups:
+        c1_group_id = c1_group_id_map.get(legacy_group)
+        plan_report_configs(
+            plan=plan,
+            stage="group-configs",
+            legacy_report_configs=legacy_api.list_group_report_configs(
+                group_id=legacy_group.group_id
+            ),
+            c1_report_configs=(
+                c1_api.list_group_report_configs(group_id=c1_group_id)
+                if c1_group_id
+                else []
+            ),
+        )
+
+    log.info("Planning Communication Settings (organisation-level)", flush=True)
+    plan_communication_settings(
+        plan=plan,
+        stage="org-comm-settings",
+        legacy_api=legacy_api,
+        c1_api=c1_api,
+        legacy_acct_id="",
+        c1_acct_id="",
+        legacy_users=legacy_users,
+        c1_users=c1_users,
+    )
+
+    with accts_to_migrate:
+        for legacy_acct_id, c1_acct_id in accts_to_migrate.items():
+            plan_account_configurations(
+                plan=plan,
+                legacy_api=legacy_api,
+                c1_api=c1_api,
+                legacy_acct_id=legacy_acct_id,
+                c1_acct_id=c1_acct_id,
+                legacy_users=legacy_users,
+                c1_users=c1_users,
+            )
+
+    return plan
+
+
+def plan_cloud_accounts(
+    plan: MigrationPlan,
+    legacy_api: ConformityAPI,
+    c1_api: ConformityAPI,
+    include_accts=Optional[Set[AccountEnv]],
+    exclude_accts=Optional[Set[AccountEnv]],
+) -> SpillDict:
+    """
+    Returns the legacy account ids that would be migrated, mapped to their
+    Cloud One account id or to an empty string when the account would be added.
+    """
+    stage = "accounts"
+    acct_adder_for = cloud_account_adders(legacy_api=legacy_api, c1_api=c1_api)
+    c1_accts_index = index_c1_accounts(c1_api.list_accounts(), acct_adder_for)
+    legacy_accts = include_exclude_accts(
+        legacy_accts=legacy_api.list_accounts(),
+        include_accts=include_accts,
+        exclude_accts=exclude_accts,
+    )
+    plan.read(stage, CLOUD_ONE, "/accounts")
+    plan.read(stage, LEGACY, "/accounts")
+
+    accts_to_migrate = spill_dict()
+    unsupported_cloud_types: Set[str] = set()
+    any_acct_to_add = False
+    for acct in legacy_accts:
+        cloud_type = acct.cloud_type
+        acct_adder = acct_adder_for(cloud_type)
+        if acct_adder is None:
+            if cloud_type not in unsupported_cloud_types:
+                unsupported_cloud_types.add(cloud_type)
+                log.info(f"Does not support {cloud_type.upper()} yet! Skipping it.")
+            continue
+        exists, c1_acct_id = acct_adder.account_exists(
+            c1_accts_index=c1_accts_index.get(cloud_type, {}), acct=acct
+        )
+        if not exists:
+            any_acct_to_add = True
+            c1_acct_id = ""
+            if cloud_type == "aws":
+                plan.read(stage, LEGACY, "/accounts/{accountId}/access")
+                plan.add(stage, CLOUD_ONE, "POST", "/accounts")
+            elif cloud_type == "azure":
+                plan.read(stage, LEGACY, "/groups/{groupId}")
+                plan.add(stage, CLOUD_ONE, "POST", "/accounts/azure")
+        accts_to_migrate[acct.account_id] = c1_acct_id
+
+    if any_acct_to_add:
+        plan.read(stage, CLOUD_ONE, "/organisation/external-id")
+
+    return accts_to_migrate
+
+
+def plan_report_configs(
+    plan: MigrationPlan,
+    stage: str,
+    legacy_report_configs: Iterable[ReportConfig],
+    c1_report_configs: Iterable[ReportConfig],
+):
+    legacy_report_configs = list(legacy_report_configs)
+    legacy_rconf_set = set(legacy_report_configs)
+    plan.read(stage, LEGACY, "/report-configs")
+    plan.read(stage, CLOUD_ONE, "/report-configs")
+    plan.add(
+        stage,
+        CLOUD_ONE,
+        "DELETE",
+        "/report-configs/{reportConfigId}",
+        count=len([r for r in c1_report_configs if r in legacy_rconf_set]),
+    )
+    plan.add(stage, CLOUD_ONE, "POST", "/report-configs", len(legacy_report_configs))
+
+
+def plan_communication_settings(
+    plan: MigrationPlan,
+    stage: str,
+    legacy_api: ConformityAPI,
+    c1_api: ConformityAPI,
+    legacy_acct_id: str,
+    c1_acct_id: Optional[str],
+    legacy_users: List[User],
+    c1_users: List[User],
+):
+    candidate_com_settings = candidate_communication_settings(
+        legacy_com_settings=legacy_api.get_communication_settings(
+            acct_id=legacy_acct_id
+        ),
+        legacy_users=legacy_users,
+        c1_users=c1_users,
+    )
+    plan.read(stage, LEGACY, "/settings/communication")
+    plan.read(stage, CLOUD_ONE, "/settings/communication")
+    c1_com_settings: Set[CommunicationSettings] = set()
+    if c1_acct_id is not None:
+        c1_com_settings = set(c1_api.get_communication_settings(acct_id=c1_acct_id))
+    if candidate_com_settings.difference(c1_com_settings):
+        plan.add(stage, CLOUD_ONE, "POST", "/settings/communication")
+
+
+def plan_account_configurations(
+    plan: MigrationPlan,
+    legacy_api: ConformityAPI,
+    c1_api: ConformityAPI,
+    legacy_acct_id: str,
+    c1_acct_id: str,
+    legacy_users: List[User],
+    c1_users: List[User],
+):
+    """
+    An empty c1_acct_id means the account doesn't exist yet in Cloud One, so all
+    of its configurations would be created.
+    """
+    legacy_acct_details = legacy_api.get_account_details(acct_id=legacy_acct_id)
+    log.info(f" --> Account: {acct_label(legacy_acct_details)}", flush=True)
+
+    stage = "account-settings"
+    plan.read(stage, LEGACY, "/accounts/{accountId}")
+    plan.add(stage, CLOUD_ONE, "PATCH", "/accounts/{accountId}")
+    if legacy_acct_details.bot_settings:
+        plan.add(stage, CLOUD_ONE, "PATCH", "/accounts/{accountId}/settings/bot")
+
+    stage = "account-rules"
+    rule_count = len(legacy_acct_details.rules)
+    plan.read(
+        stage, LEGACY, "/accounts/{accountId}/settings/rules/{ruleId}", rule_count
+    )
+    plan.add(
+        stage,
+        CLOUD_ONE,
+        "PATCH",
+        "/accounts/{accountId}/settings/rules/{ruleId}",
+        rule_count,
+    )
+
+    plan_communication_settings(
+        plan=plan,
+        stage="account-comm-settings",
+        legacy_api=legacy_api,
+        c1_api=c1_api,
+        legacy_acct_id=legacy_acct_id,
+        c1_acct_id=c1_acct_id if c1_acct_id else None,
+        legacy_users=legacy_users,
+        c1_users=c1_users,
+    )
+
+    plan_report_configs(
+        plan=plan,
+        stage="account-report-configs",
+        legacy_report_configs=legacy_api.list_account_report_configs(
+            acct_id=legacy_acct_id
+        ),
+        c1_report_configs=(
+            c1_api.list_account_report_configs(acct_id=c1_acct_id) if c1_acct_id else []
+        ),
+    )
+
+    stage = "account-suppressed-checks"
+    page_size = 100
+    check_count = 0
+    checks_without_notes = 0
+    for check in legacy_api.get_suppressed_checks(acct_id=legacy_acct_id):
+        check_count += 1
+        if not check.notes:
+            checks_without_notes += 1
+    plan.read(stage, LEGACY, "/checks", 1 + max(1, -(-check_count // page_size)))
+    if check_count:
+        plan.read(stage, CLOUD_ONE, "/accounts/{accountId}")
+        plan.read(stage, CLOUD_ONE, "/checks", check_count)
+        plan.read(stage, LEGACY, "/checks/{checkId}", checks_without_notes)
+        plan.add(stage, CLOUD_ONE, "PATCH", "/checks/{checkId}", check_count)
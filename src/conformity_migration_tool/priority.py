@@ -0,0 +1,180 @@
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+
+# priorities of the migration tasks and of their requests, the lowest first
+CRITICAL = 0  # e.g. account creation, organisation profile
+NORMAL = 1  # e.g. rules, communication settings
+BULK = 2  # e.g. suppressed checks, verification reads
+PRIORITY_NAMES = ("critical", "normal", "bulk")
+
+_current = threading.local()
+
+
+def thread_priority() -> Optional[int]:
+    """Priority of the task run by the current thread, if any"""
+    return getattr(_current, "priority", None)
+
+
+def set_thread_priority(priority: Optional[int]) -> None:
+    """
+    Also meant as the initializer of the pools started by a task, e.g.
+    ThreadPoolExecutor(initializer=set_thread_priority, initargs=(thread_priority(),))
+    """
+    _current.priority = priority
+
+
+# priority of the migration stages (account stages without their account id):
+# first the ones the later stages wait for, last the ones nothing waits for;
+# the other stages are NORMAL
+TASK_PRIORITIES = {
+    "users": CRITICAL,
+    "org-profile": CRITICAL,
+    "managed-groups": CRITICAL,
+    "accounts": CRITICAL,
+    "account:settings": CRITICAL,
+    "account:suppressed-checks": BULK,
+    "verify": BULK,
+}
+
+
+def task_priority(task_name: str) -> int:
+    """
+    Account creation and the organisation profile come first, then rules,
+    communication settings and the other configurations, and suppressed checks
+    and verification reads last.
+    """
+    if task_name.startswith("account:"):
+        # account:<legacy account id>:<stage>[:<chunk>]
+        stage = "account:" + task_name.split(":", 3)[2]
+    else:
+        stage = task_name.split(":", 1)[0]
+    return TASK_PRIORITIES.get(stage, NORMAL)
+
+
+def request_priority(url: str, base_url: str) -> int:
+    """
+    Priority of the current thread, or, in threads started outside of the
+    migration tasks, a guess from the endpoint: its path after the one of the
+    API base URL (e.g. /v1 for Legacy, /api for Cloud One).
+    """
+    priority = thread_priority()
+    if priority is not None:
+        return priority
+    base_path = urlsplit(base_url).path.rstrip("/")
+    path = urlsplit(url).path
+    if path.startswith(base_path):
+        path = path[len(base_path) :]
+    is_checks = path == "/checks" or path.startswith("/checks/")
+    return BULK if is_checks else NORMAL
+
+
+class PriorityStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.wait_secs = 0.0
+
+
+class PriorityRateBudget:
+    """
+    Paces the requests sent to an API to `rate_per_sec`, split between the
+    priorities by `shares` (e.g. [0.6, 0.3, 0.1]): every priority gets at
+    least its share of the rate while it has requests to send, and what a
+    priority leaves unused goes to the highest priority waiting for it. Each
+    priority can send a burst of up to a second worth of its share at once.
+    """
+
+    def __init__(self, rate_per_sec: float, shares: Sequence[float]) -> None:
+        self._cond = threading.Condition()
+        total = sum(shares)
+        self._rate_per_sec = rate_per_sec
+        self._rates = [rate_per_sec * share / total for share in shares]
+        self._capacities = [max(1.0, rate) for rate in self._rates]
+        self._tokens = list(self._capacities)
+        # tokens overflowing the buckets of the priorities that are idle
+        self._spare = 0.0
+        self._spare_capacity = max(1.0, rate_per_sec)
+        self._waiting = [0] * len(shares)
+        self._updated = time.monotonic()
+        self._stats = [PriorityStats() for _ in shares]
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        for priority, rate in enumerate(self._rates):
+            tokens = self._tokens[priority] + rate * elapsed
+            capacity = self._capacities[priority]
+            if tokens > capacity:
+                self._spare += tokens - capacity
+                tokens = capacity
+            self._tokens[priority] = tokens
+        self._spare = min(self._spare, self._spare_capacity)
+
+    def _take(self, priority: int) -> bool:
+        self._refill()
+        if self._tokens[priority] >= 1:
+            self._tokens[priority] -= 1
+            return True
+        higher_waiting = any(self._waiting[:priority])
+        if self._spare >= 1 and not higher_waiting:
+            self._spare -= 1
+            return True
+        return False
+
+    def acquire(self, priority: int) -> None:
+        priority = min(max(0, priority), len(self._rates) - 1)
+        started = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while not self._take(priority):
+                    rate = self._rates[priority]
+                    # a token may also overflow from another priority meanwhile
+                    wait_secs = 1 / self._rate_per_sec
+                    if rate > 0:
+                        wait_secs = min(wait_secs, (1 - self._tokens[priority]) / rate)
+                    self._cond.wait(wait_secs)
+            finally:
+                self._waiting[priority] -= 1
+                # the higher priorities may have been holding back the spare tokens
+                self._cond.notify_all()
+            stats = self._stats[priority]
+            stats.requests += 1
+            stats.wait_secs += time.monotonic() - started
+
+    def stats(self) -> List[Tuple[str, PriorityStats]]:
+        with self._cond:
+            return list(zip(PRIORITY_NAMES, self._stats))
+
+
+class PriorityRateBudgetHTTPAdapter(BaseAdapter):
+    def __init__(self, adapter: BaseAdapter, budget: PriorityRateBudget, base_url: str):
+        self._adapter = adapter
+        self._budget = budget
+        self._base_url = base_url
+
+    def send(self, request: PreparedRequest, *args, **kwargs) -> Response:
+        self._budget.acquire(request_priority(request.url or "", self._base_url))
+        return self._adapter.send(request, *args, **kwargs)
+
+    def close(self) -> None:
+        return self._adapter.close()
+
+
+def format_rate_budgets(budgets: Sequence[Tuple[str, PriorityRateBudget]]) -> str:
+    lines = ["Requests per priority:"]
+    lines.append(f"  {'API':<7} {'Priority':<9} {'Requests':>8} {'Avg wait s':>10}")
+    for api, budget in budgets:
+        for name, stats in budget.stats():
+            if not stats.requests:
+                continue
+            avg_wait_secs = stats.wait_secs / stats.requests
+            lines.append(
+                f"  {api:<7} {name:<9} {stats.requests:>8} {avg_wait_secs:>10.2f}"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,228 @@
+import cProfile
+import glob
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# --profile-out files with this suffix are written by StackSampler
+FOLDED_SUFFIX = ".folded"
+
+
+class ThreadedProfile:
+    """
+    cProfile of the thread enabling it and of every thread started while it
+    is enabled (e.g. the migration workers). Since Python 3.12, cProfile sees
+    all threads by itself; before that, each thread gets its own profile and
+    they are merged at the end.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._profiles: List[cProfile.Profile] = []
+
+    def _new_profile(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+        return profile
+
+    def _profile_thread(self, *args) -> None:
+        # called once by every new thread, before its target runs
+        sys.setprofile(None)
+        self._new_profile()
+
+    def enable(self) -> None:
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._profile_thread)
+        self._new_profile()
+
+    def disable(self) -> None:
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        with self._lock:
+            profiles = list(self._profiles)
+        for profile in profiles:
+            profile.disable()
+
+    def write(self, path: str) -> None:
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+
+class StackSampler:
+    """
+    Records the stacks of all threads every `interval_secs` and writes how
+    many times each stack was seen, one "frame;frame;frame count" line per
+    stack (the "folded" input of flame graph tools, e.g. speedscope). It
+    costs far less than cProfile on long runs, at the price of precision.
+    """
+
+    def __init__(self, interval_secs=0.01) -> None:
+        self._interval_secs = interval_secs
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            frames = []
+            f = frame
+            while f is not None:
+                code = f.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                f = f.f_back
+            frames.append(names.get(thread_id, str(thread_id)))
+            self._stacks[";".join(reversed(frames))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval_secs):
+            self._sample()
+
+    def enable(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def disable(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write(self, path: str) -> None:
+        with open(path, mode="w") as fh:
+            for stack, count in sorted(self._stacks.items()):
+                fh.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profiled(profile_out: Optional[str]) -> Iterator[None]:
+    """
+    Profiles the `with` block and writes the profile to `profile_out`: stack
+    samples when it ends with FOLDED_SUFFIX, a cProfile (pstats) file
+    otherwise, e.g. for snakeviz or "python -m pstats". The profiles written by
+    worker processes meanwhile (see worker_profile_out) are added to it.
+    Without `profile_out`, nothing is profiled.
+    """
+    if not profile_out:
+        yield
+        return
+    profiler = (
+        StackSampler() if profile_out.endswith(FOLDED_SUFFIX) else ThreadedProfile()
+    )
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.write(profile_out)
+        merge_worker_profiles(profile_out)
+
+
+def worker_profile_out(profile_out: str) -> str:
+    """Profile file of a single call in a worker process, see merge_worker_profiles"""
+    stem, suffix = os.path.splitext(profile_out)
+    return f"{stem}.worker-{os.getpid()}-{time.monotonic_ns()}{suffix}"
+
+
+def merge_worker_profiles(profile_out: str) -> None:
+    """Adds the profiles written by worker processes to `profile_out` and deletes them"""
+    stem, suffix = os.path.splitext(profile_out)
+    worker_files = sorted(glob.glob(f"{glob.escape(stem)}.worker-*{suffix}"))
+    if not worker_files:
+        return
+    if profile_out.endswith(FOLDED_SUFFIX):
+        stacks: Counter = Counter()
+        for path in [profile_out] + worker_files:
+            with open(path, mode="r") as fh:
+                for line in fh:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    stacks[stack] += int(count)
+        with open(profile_out, mode="w") as fh:
+            for stack, count in sorted(stacks.items()):
+                fh.write(f"{stack} {count}\n")
+    else:
+        stats = pstats.Stats(profile_out, *worker_files)
+        stats.dump_stats(profile_out)
+    for path in worker_files:
+        os.remove(path)
+
+
+class SpanStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.wall_secs = 0.0
+        self.cpu_secs = 0.0
+
+
+class SpanTimers:
+    """
+    Wall-clock and CPU time spent per stage of a migration. CPU time is the
+    time of the thread running the span: what runs in other threads (e.g.
+    requests read ahead in a pool) only adds to the wall-clock time. Spans
+    nested in a span of the same thread are not counted twice.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stages: Dict[str, SpanStats] = dict()
+        self._local = threading.local()
+
+    @contextmanager
+    def span(self, stage: Optional[str]) -> Iterator[None]:
+        depth = getattr(self._local, "depth", 0)
+        if stage is None or depth:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+
+        self._local.depth = 1
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            wall_secs = time.perf_counter() - wall_start
+            cpu_secs = time.thread_time() - cpu_start
+            with self._lock:
+                stats = self._stages.get(stage)
+                if stats is None:
+                    stats = self._stages[stage] = SpanStats()
+                stats.count += 1
+                stats.wall_secs += wall_secs
+                stats.cpu_secs += cpu_secs
+
+    def stages(self) -> List[Tuple[str, SpanStats]]:
+        with self._lock:
+            return sorted(self._stages.items())
+
+
+def format_span_timers(timers: SpanTimers) -> str:
+    lines = ["Time per migration stage:"]
+    lines.append(
+        f"  {'Stage':<30} {'Calls':>7} {'Wall s':>9} {'CPU s':>9} {'CPU %':>6}"
+    )
+    for stage, stats in timers.stages():
+        cpu_pct = stats.cpu_secs / stats.wall_secs * 100 if stats.wall_secs else 0.0
+        lines.append(
+            f"  {stage:<30} {stats.count:>7} {stats.wall_secs:>9.2f} {stats.cpu_secs:>9.2f} {cpu_pct:>5.0f}%"
+        )
+    return "\n".join(lines)
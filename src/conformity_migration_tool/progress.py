@@ -0,0 +1,251 @@
+import logging
+import threading
+import time
+from typing import IO, Callable, Dict, Optional
+
+from .metrics import HTTPMetrics
+from .utils import prompt_lock
+
+# stages whose progress is shown, in this order
+ACCOUNTS = "accounts"
+RULES = "rules"
+CHECKS = "checks"
+STAGES = (ACCOUNTS, RULES, CHECKS)
+
+# moves to the start of the line and clears it
+CLEAR_LINE = "\r\x1b[K"
+
+
+class StageProgress:
+    def __init__(self) -> None:
+        self.total = 0
+        self.done = 0
+        self.errors = 0
+        self.first_done_at: Optional[float] = None
+        self.last_done_at: Optional[float] = None
+
+    def per_sec(self) -> float:
+        """
+        Observed throughput, from the first to the last completed item, since a
+        stage (e.g. rules) can start long after the migration did.
+        """
+        if self.first_done_at is None or self.last_done_at is None:
+            return 0.0
+        elapsed = self.last_done_at - self.first_done_at
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def eta_secs(self) -> Optional[float]:
+        remaining = self.total - self.done
+        if remaining <= 0:
+            return 0.0
+        per_sec = self.per_sec()
+        return remaining / per_sec if per_sec else None
+
+
+class ProgressTracker:
+    """
+    Counts the items of each stage of a migration (accounts, rules, checks)
+    as their totals become known and as they are completed. Updated by the
+    migration threads and read by ProgressDisplay.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stages: Dict[str, StageProgress] = {
+            stage: StageProgress() for stage in STAGES
+        }
+        self.started = time.time()
+
+    def add_total(self, stage: str, count: int) -> None:
+        with self._lock:
+            self._stages[stage].total += count
+
+    def done(self, stage: str, count=1, ok=True) -> None:
+        now = time.time()
+        with self._lock:
+            progress = self._stages[stage]
+            progress.done += count
+            if not ok:
+                progress.errors += count
+            if progress.first_done_at is None:
+                progress.first_done_at = now
+            progress.last_done_at = now
+
+    def snapshot(self) -> Dict[str, StageProgress]:
+        with self._lock:
+            snapshot = dict()
+            for stage, progress in self._stages.items():
+                copy = StageProgress()
+                copy.__dict__.update(progress.__dict__)
+                snapshot[stage] = copy
+            return snapshot
+
+
+class Countdown:
+    """Calls `on_zero` once `count_down` was called `count` times"""
+
+    def __init__(self, count: int, on_zero: Callable[[], None]) -> None:
+        self._lock = threading.Lock()
+        self._count = count
+        self._on_zero = on_zero
+
+    def add(self, count: int) -> None:
+        """Calls to wait for, e.g. for tasks added by a task"""
+        with self._lock:
+            self._count += count
+
+    def count_down(self) -> None:
+        with self._lock:
+            self._count -= 1
+            reached_zero = self._count == 0
+        if reached_zero:
+            self._on_zero()
+
+
+def _format_duration(secs: float) -> str:
+    secs = int(secs)
+    hours, rest = divmod(secs, 3600)
+    mins, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{mins:02d}m"
+    if mins:
+        return f"{mins}m{secs:02d}s"
+    return f"{secs}s"
+
+
+def format_progress(
+    stages: Dict[str, StageProgress], metrics: HTTPMetrics, elapsed_secs: float
+) -> str:
+    parts = []
+    etas = []
+    for stage in STAGES:
+        progress = stages[stage]
+        part = f"{stage.capitalize()} {progress.done}/{progress.total}"
+        if stage != ACCOUNTS:
+            part += f" ({progress.per_sec():.1f}/s)"
+        if progress.errors:
+            part += f" {progress.errors} failed"
+        parts.append(part)
+        if progress.total > progress.done:
+            eta = progress.eta_secs()
+            etas.append(f"{stage} {'?' if eta is None else _format_duration(eta)}")
+    parts.append(f"In flight {metrics.in_flight}")
+    if metrics.concurrency_limits:
+        limits = ", ".join(
+            f"{api} {limit}"
+            for api, limit in sorted(metrics.concurrency_limits.items())
+        )
+        parts.append(f"Limit {limits}")
+    parts.append(f"429s {metrics.throttled}")
+    parts.append(f"Elapsed {_format_duration(elapsed_secs)}")
+    if etas:
+        parts.append("ETA " + ", ".join(etas))
+    return " | ".join(parts)
+
+
+class StatusLine:
+    """
+    A line at the bottom of the terminal that is redrawn in place. It is
+    cleared before a log line is written, see StatusLineStreamHandler.
+    """
+
+    def __init__(self, stream: IO[str]) -> None:
+        self._stream = stream
+        # held while writing to the stream, so that a log line never ends up
+        # in the middle of the status line
+        self.lock = threading.RLock()
+        self._shown = False
+
+    def draw(self, text: str) -> None:
+        with self.lock:
+            self._stream.write(CLEAR_LINE + text)
+            self._stream.flush()
+            self._shown = True
+
+    def clear(self) -> None:
+        with self.lock:
+            if self._shown:
+                self._stream.write(CLEAR_LINE)
+                self._stream.flush()
+                self._shown = False
+
+
+class StatusLineStreamHandler(logging.StreamHandler):
+    def __init__(self, stream: IO[str], status_line: StatusLine) -> None:
+        super().__init__(stream=stream)
+        self._status_line = status_line
+
+    def emit(self, record: logging.LogRecord) -> None:
+        with self._status_line.lock:
+            self._status_line.clear()
+            super().emit(record)
+
+
+class ProgressDisplay:
+    """
+    Shows the progress of a migration while it runs. On a terminal, the status
+    line is redrawn every `refresh_secs`; otherwise (e.g. output redirected to
+    a file or a CI log) a summary line is logged every `interval_secs`.
+    """
+
+    def __init__(
+        self,
+        tracker: ProgressTracker,
+        metrics: HTTPMetrics,
+        status_line: StatusLine,
+        log_summary: Callable[[str], None],
+        is_tty: bool,
+        refresh_secs: float = 1,
+        interval_secs: float = 30,
+    ) -> None:
+        self._tracker = tracker
+        self._metrics = metrics
+        self._status_line = status_line
+        self._log_summary = log_summary
+        self._is_tty = is_tty
+        self._period_secs = refresh_secs if is_tty else interval_secs
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def text(self) -> str:
+        return format_progress(
+            stages=self._tracker.snapshot(),
+            metrics=self._metrics,
+            elapsed_secs=time.time() - self._tracker.started,
+        )
+
+    def _draw(self) -> None:
+        # the status line is not drawn over a question asked to the user
+        if not prompt_lock.acquire(blocking=False):
+            return
+        try:
+            self._status_line.draw(self.text())
+        finally:
+            prompt_lock.release()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._period_secs):
+            if self._is_tty:
+                self._draw()
+            else:
+                self._log_summary("Progress: " + self.text())
+
+    def start(self) -> None:
+        if self._period_secs <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._status_line.clear()
+        self._log_summary("Progress: " + self.text())
+
+    def __enter__(self) -> "ProgressDisplay":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
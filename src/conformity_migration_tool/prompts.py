@@ -0,0 +1,122 @@
+import os
+from typing import List
+
+from PyInquirer import prompt
+
+from .di import logger
+from .utils import prompt_lock, str2bool
+
+log = logger()
+
+
+def ask_confirmation_or_auto_overwrite(
+    msg: str, default=False, ask_if_sure=False
+) -> bool:
+    if str2bool(os.getenv("C1_CONFORMITY_OVERWRITE_ALL", "False")):
+        return True
+
+    return ask_confirmation(msg=msg, default=default, ask_if_sure=ask_if_sure)
+
+
+def ask_confirmation_with_text_verification(
+    msg: str, verify_text: str, default=False
+) -> bool:
+    questions = [
+        {
+            "type": "confirm",
+            "message": msg,
+            "name": "continue",
+            "default": default,
+        },
+    ]
+    with prompt_lock:
+        log.flush()
+        answer = prompt(questions=questions)
+        cont = answer["continue"]
+        if not cont:
+            return False
+
+        entered_text = input(
+            f"Please enter the text '{verify_text}' to confirm this (exclude single quote): "
+        )
+        return entered_text == verify_text
+
+
+def ask_confirmation(msg: str, default=False, ask_if_sure=False) -> bool:
+    questions = [
+        {
+            "type": "confirm",
+            "message": msg,
+            "name": "continue",
+            "default": default,
+        },
+    ]
+    with prompt_lock:
+        log.flush()
+        while True:
+            answer = prompt(questions=questions)
+            cont = answer["continue"]
+            if not ask_if_sure or not cont:
+                return cont
+
+            sure = ask_confirmation(
+                f"You chose {'Yes' if cont else 'No'}. Are you sure?", default=False
+            )
+            if sure:
+                return cont
+
+
+def ask_choices(msg: str, choices: List[str], default=1):
+    questions = [
+        {
+            "type": "list",
+            "message": msg,
+            "name": "choice",
+            "choices": choices,
+            "default": default,
+        },
+    ]
+    with prompt_lock:
+        log.flush()
+        answer = prompt(questions=questions)
+    return answer["choice"]
+
+
+def ask_when_mobile_verification__done() -> None:
+    while True:
+
+        is_done = ask_confirmation(
+            "Are you done with mobile verification?",
+            default=False,
+            ask_if_sure=True,
+        )
+        if is_done:
+            return
+
+
+def ask_when_user_invite_done() -> None:
+    while True:
+
+        is_done = ask_confirmation(
+            "Are you done adding the users to Cloud One?",
+            default=False,
+            ask_if_sure=True,
+        )
+        if is_done:
+            return
+
+
+def ask_input(msg: str, mask_input=False) -> str:
+    name = "input"
+    questions = [
+        {
+            "type": "password" if mask_input else "input",
+            "message": msg,
+            "name": name,
+            "default": "",
+        },
+    ]
+    with prompt_lock:
+        log.flush()
+        answer = prompt(questions=questions)
+    return answer[name]
@@ -0,0 +1,228 @@
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .priority import set_thread_priority
+
+
+class TaskGraphError(Exception):
+    pass
+
+
+_current = threading.local()
+
+
+def current_task_name() -> Optional[str]:
+    """Name of the task run by the current thread, if any"""
+    return getattr(_current, "task_name", None)
+
+
+def _no_task_context(name: str) -> ContextManager:
+    return nullcontext()
+
+
+def _same_task_priority(name: str) -> int:
+    return 0
+
+
+def _run_task(task: "Task", task_context: Callable[[str], ContextManager]) -> Any:
+    _current.task_name = task.name
+    set_thread_priority(task.priority)
+    try:
+        with task_context(task.name):
+            return task.func()
+    finally:
+        _current.task_name = None
+        set_thread_priority(None)
+
+
+class Task:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        deps: Iterable[str] = (),
+        transient=False,
+        priority=0,
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.deps = set(deps)
+        self.transient = transient
+        self.priority = priority
+
+
+class TaskGraph:
+    """
+    Runs migration tasks concurrently while honoring their dependencies.
+
+    A task becomes ready once all the tasks it depends on are done. Tasks may
+    add new tasks to the graph while it is running (e.g. the per-account tasks
+    are only known after the accounts were added to Cloud One), so the graph
+    only finishes once there is nothing left running or ready to run.
+
+    When a task raises, no new task is started and the first error is re-raised
+    from run() after the tasks already running are finished.
+
+    To keep memory flat when there are a lot of tasks (e.g. hundreds of
+    thousands of accounts), tasks can be pulled lazily from feeders: every item
+    taken from a feeder is expected to add tasks to the graph, and feeders are
+    only pulled while fewer than max_pending tasks are waiting. Transient tasks
+    are forgotten once they are done, so nothing may depend on them.
+
+    Every task runs in the context returned by `task_context` for its name,
+    e.g. a tracing span.
+
+    Ready tasks are started by priority, as returned by `task_priority` for
+    their name (the lowest first), and in the order they became ready for the
+    same priority. The priority is also the one of the thread running the task
+    (see thread_priority), e.g. for the requests it sends.
+    """
+
+    def __init__(
+        self,
+        max_workers=1,
+        max_pending=0,
+        task_context: Callable[[str], ContextManager] = _no_task_context,
+        task_priority: Callable[[str], int] = _same_task_priority,
+    ) -> None:
+        self._max_workers = max(1, max_workers)
+        self._max_pending = max_pending if max_pending > 0 else self._max_workers * 10
+        self._feeders: List[Iterator[Any]] = []
+        self._cond = threading.Condition()
+        self._tasks: Dict[str, Task] = dict()
+        self._waiting_on: Dict[str, Set[str]] = dict()
+        self._dependents: Dict[str, List[str]] = dict()
+        self._done: Set[str] = set()
+        # (priority, order it became ready, task name)
+        self._ready: List[Tuple[int, int, str]] = []
+        self._ready_order = itertools.count()
+        self._running = 0
+        self._error: Optional[BaseException] = None
+        self._task_context = task_context
+        self._task_priority = task_priority
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        deps: Iterable[str] = (),
+        transient=False,
+    ) -> None:
+        task = Task(
+            name=name,
+            func=func,
+            deps=deps,
+            transient=transient,
+            priority=self._task_priority(name),
+        )
+        with self._cond:
+            if name in self._tasks or name in self._done:
+                raise TaskGraphError(f"Task already exists: {name}")
+            self._tasks[name] = task
+            waiting_on = {dep for dep in task.deps if dep not in self._done}
+            self._waiting_on[name] = waiting_on
+            for dep in waiting_on:
+                self._dependents.setdefault(dep, []).append(name)
+            if not waiting_on:
+                self._push_ready(task)
+            self._cond.notify_all()
+
+    def _push_ready(self, task: Task) -> None:
+        heapq.heappush(self._ready, (task.priority, next(self._ready_order), task.name))
+
+    def add_feeder(self, feeder: Iterable[Any]) -> None:
+        """
+        Items of the feeder are pulled from the thread running the graph while
+        holding its lock, so producing an item must be cheap (no API request).
+        """
+        with self._cond:
+            self._feeders.append(iter(feeder))
+            self._cond.notify_all()
+
+    def is_done(self, name: str) -> bool:
+        with self._cond:
+            return name in self._done
+
+    def _on_task_done(self, name: str, fut: Future) -> None:
+        with self._cond:
+            self._running -= 1
+            task = self._tasks.pop(name)
+            del self._waiting_on[name]
+            if not task.transient:
+                self._done.add(name)
+
+            err = fut.exception()
+            if err is not None and self._error is None:
+                self._error = err
+
+            for dependent in self._dependents.pop(name, []):
+                waiting_on = self._waiting_on[dependent]
+                waiting_on.discard(name)
+                if not waiting_on:
+                    self._push_ready(self._tasks[dependent])
+            self._cond.notify_all()
+
+    def _pull_feeders(self) -> None:
+        while self._feeders and len(self._tasks) < self._max_pending:
+            try:
+                next(self._feeders[0])
+            except StopIteration:
+                self._feeders.pop(0)
+            except Exception as e:
+                self._feeders.pop(0)
+                if self._error is None:
+                    self._error = e
+                return
+
+    def _submit_ready_tasks(self, executor: ThreadPoolExecutor) -> None:
+        # a task done by the time it's submitted calls _on_task_done right away,
+        # so it may have failed meanwhile
+        while self._ready and self._running < self._max_workers and self._error is None:
+            _, _, name = heapq.heappop(self._ready)
+            task = self._tasks[name]
+            self._running += 1
+            fut = executor.submit(_run_task, task, self._task_context)
+            fut.add_done_callback(partial(self._on_task_done, name))
+
+    def run(self) -> None:
+        with ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix="migration"
+        ) as executor:
+            with self._cond:
+                while True:
+                    if self._error is None:
+                        self._pull_feeders()
+                        self._submit_ready_tasks(executor)
+                    # feeders were just pulled, so without anything ready or
+                    # running, whatever is left can't make progress anymore
+                    if self._running == 0 and (
+                        self._error is not None or not self._ready
+                    ):
+                        break
+                    self._cond.wait()
+
+                if self._error is not None:
+                    raise self._error
+
+                if self._tasks:
+                    blocked = ", ".join(
+                        f"{name} (waiting on: {', '.join(sorted(deps))})"
+                        for name, deps in self._waiting_on.items()
+                    )
+                    raise TaskGraphError(f"Tasks with unmet dependencies: {blocked}")
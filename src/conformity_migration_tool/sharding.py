@@ -0,0 +1,49 @@
+import hashlib
+import os
+
+
+def shard_index(legacy_acct_id: str, shard_count: int) -> int:
+    """
+    Shard of an account. The same in every process and on every machine,
+    unlike hash() which is salted per process.
+    """
+    digest = hashlib.sha256(legacy_acct_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+class Shard:
+    """
+    One of `count` partitions of the legacy accounts, numbered from 0. Only the
+    first shard migrates the organisation-level configurations (e.g. users,
+    groups, profiles), so that shards can run at the same time without
+    stepping on each other.
+    """
+
+    def __init__(self, index: int, count: int) -> None:
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard: {index}/{count}")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, text: str) -> "Shard":
+        """e.g. "0/4" for the first of 4 shards"""
+        index, sep, count = text.partition("/")
+        if not sep:
+            raise ValueError(f"Invalid shard: {text} (expected i/N, e.g. 0/4)")
+        return cls(index=int(index), count=int(count))
+
+    @property
+    def migrates_organisation(self) -> bool:
+        return self.index == 0
+
+    def includes(self, legacy_acct_id: str) -> bool:
+        return shard_index(legacy_acct_id, self.count) == self.index
+
+    def file_name(self, path: str) -> str:
+        """e.g. events.jsonl -> events.shard-0-of-4.jsonl, so shards don't share files"""
+        stem, suffix = os.path.splitext(path)
+        return f"{stem}.shard-{self.index}-of-{self.count}{suffix}"
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from itertools import islice
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class SpillDict:
+    """
+    A str -> str mapping that is kept in memory until it holds more than
+    `threshold` entries, then moves to a temporary SQLite file so memory stays
+    flat however many entries are added (e.g. legacy -> Cloud One account ids
+    of an organisation with hundreds of thousands of accounts).
+
+    Iteration preserves insertion order and reads the spilled entries page by
+    page.
+    """
+
+    PAGE_SIZE = 1000
+
+    def __init__(self, threshold=10000) -> None:
+        self._threshold = max(0, threshold)
+        self._lock = threading.Lock()
+        self._mem: Optional[Dict[str, str]] = dict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._path = ""
+
+    @property
+    def spilled(self) -> bool:
+        return self._conn is not None
+
+    def _spill(self) -> None:
+        fd, self._path = tempfile.mkstemp(prefix="conformity-migration-", suffix=".db")
+        os.close(fd)
+        conn = sqlite3.connect(self._path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(
+            "CREATE TABLE entries (seq INTEGER PRIMARY KEY, key TEXT UNIQUE, value TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO entries (key, value) VALUES (?, ?)",
+            self._mem.items(),  # type: ignore
+        )
+        self._conn = conn
+        self._mem = None
+
+    def __setitem__(self, key: str, value: str) -> None:
+        with self._lock:
+            if self._mem is not None:
+                self._mem[key] = value
+                if len(self._mem) > self._threshold:
+                    self._spill()
+                return
+            # updated in place to keep its insertion order (an upsert needs
+            # SQLite 3.24 and REPLACE would move it to the end)
+            updated = self._conn.execute(  # type: ignore
+                "UPDATE entries SET value = ? WHERE key = ?", (value, key)
+            )
+            if updated.rowcount == 0:
+                self._conn.execute(  # type: ignore
+                    "INSERT INTO entries (key, value) VALUES (?, ?)", (key, value)
+                )
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            if self._mem is not None:
+                return self._mem.get(key, default)
+            row = self._conn.execute(  # type: ignore
+                "SELECT value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            return row[0] if row else default
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._mem is not None:
+                return len(self._mem)
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]  # type: ignore
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        last_seq = 0
+        while True:
+            with self._lock:
+                if self._mem is not None:
+                    # the entries past the ones read, all at once as they are
+                    # at most `threshold`; the seq of an entry is its position
+                    rows = [
+                        (last_seq + i + 1, k, v)
+                        for i, (k, v) in enumerate(
+                            islice(self._mem.items(), last_seq, None)
+                        )
+                    ]
+                else:
+                    rows = self._conn.execute(  # type: ignore
+                        "SELECT seq, key, value FROM entries WHERE seq > ? ORDER BY seq LIMIT ?",
+                        (last_seq, self.PAGE_SIZE),
+                    ).fetchall()
+            if not rows:
+                return
+            for seq, key, value in rows:
+                last_seq = seq
+                yield key, value
+
+    def keys(self) -> Iterator[str]:
+        return (key for key, _ in self.items())
+
+    def values(self) -> Iterator[str]:
+        return (value for _, value in self.items())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                os.remove(self._path)
+            self._mem = dict()
+
+    def __enter__(self) -> "SpillDict":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,146 @@
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+
+from .metrics import endpoint_template, retry_history
+
+
+class Tracer:
+    """
+    Writes nested spans (e.g. run > stage > account task > HTTP request) as
+    "complete" events of the Chrome Trace Event format, which Perfetto
+    (ui.perfetto.dev), chrome://tracing and speedscope show as a timeline per
+    thread. Events are streamed as a JSON array, so that a trace stays
+    readable even if the tool is interrupted. Without `out`, nothing is
+    recorded.
+
+    The parent of a span is the innermost span open in the same thread, or the
+    root span (the first one opened, e.g. the whole run) for threads that have
+    none, e.g. migration workers.
+    """
+
+    def __init__(self, out: Optional[IO[str]] = None) -> None:
+        self._out = out
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        self._root_id: Optional[int] = None
+        self._named_threads: set = set()
+        self._pid = os.getpid()
+        if out is not None:
+            out.write("[\n")
+
+    @property
+    def enabled(self) -> bool:
+        return self._out is not None
+
+    def _stack(self) -> List[int]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _write(self, event: Dict[str, Any]) -> None:
+        line = json.dumps(event, default=str) + ",\n"
+        with self._lock:
+            if self._out is None:
+                return
+            tid = event["tid"]
+            if tid not in self._named_threads:
+                self._named_threads.add(tid)
+                thread_name = {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self._pid,
+                    "tid": tid,
+                    "args": {"name": threading.current_thread().name},
+                }
+                self._out.write(json.dumps(thread_name) + ",\n")
+            self._out.write(line)
+
+    @contextmanager
+    def span(self, name: str, category: str, **attrs) -> Iterator[Dict[str, Any]]:
+        """
+        Records the `with` block as a span. More attributes can be added to the
+        yielded dict, e.g. the status of a response.
+        """
+        if self._out is None:
+            yield attrs
+            return
+        span_id = next(self._ids)
+        stack = self._stack()
+        parent_id = stack[-1] if stack else self._root_id
+        if self._root_id is None:
+            self._root_id = span_id
+        stack.append(span_id)
+        started = time.time()
+        try:
+            yield attrs
+        except Exception as e:
+            attrs["error"] = str(e)
+            raise e
+        finally:
+            ended = time.time()
+            stack.pop()
+            attrs["span_id"] = span_id
+            if parent_id is not None:
+                attrs["parent_id"] = parent_id
+            self._write(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": round(started * 1e6),
+                    "dur": round((ended - started) * 1e6),
+                    "pid": self._pid,
+                    "tid": threading.get_ident(),
+                    "args": attrs,
+                }
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._out is not None:
+                # every event is followed by a comma, so the array ends with one
+                # more event
+                process_name = {
+                    "name": "process_name",
+                    "ph": "M",
+                    "pid": self._pid,
+                    "args": {"name": "conformity-migration"},
+                }
+                self._out.write(json.dumps(process_name) + "\n]\n")
+                self._out.close()
+                self._out = None
+
+
+class TracingHTTPAdapter(BaseAdapter):
+    def __init__(self, adapter: BaseAdapter, tracer: Tracer, api: str):
+        self._adapter = adapter
+        self._tracer = tracer
+        self._api = api
+
+    def send(self, request: PreparedRequest, *args, **kwargs) -> Response:
+        method = request.method or ""
+        endpoint = endpoint_template(request.url or "")
+        with self._tracer.span(
+            f"{method} {endpoint}",
+            category="http",
+            api=self._api,
+            method=method,
+            endpoint=endpoint,
+        ) as attrs:
+            resp = self._adapter.send(request, *args, **kwargs)
+            attrs["status"] = resp.status_code
+            attrs["retries"] = len(retry_history(resp))
+            return resp
+
+    def close(self) -> None:
+        return self._adapter.close()
@@ -1,2 +1,21 @@
+import threading
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+# serializes interactive prompts when migration tasks run concurrently
+prompt_lock = threading.RLock()
+
+
 def str2bool(txt: str) -> bool:
     return txt.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, max(1, size)))
+        if not chunk:
+            return
+        yield chunk
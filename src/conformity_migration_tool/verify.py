@@ -0,0 +1,449 @@
+import json
+import os
+import threading
+from functools import partial
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from conformity_migration.conformity_api import ConformityAPI
+from conformity_migration.models import Rule, User
+
+from .accounts import (
+    AccountEnv,
+    acct_label,
+    cloud_account_adders,
+    include_exclude_accts,
+    index_c1_accounts,
+    spill_dict,
+)
+from .communication import candidate_communication_settings
+from .di import logger
+from .priority import task_priority
+from .scheduler import TaskGraph
+from .utils import str2bool
+
+log = logger()
+
+# settings of an account rule that the migration copies to Cloud One
+RULE_SETTING_KEYS = ("enabled", "riskLevel", "exceptions", "extraSettings")
+
+# bot settings that are dropped or changed by the migration
+IGNORED_BOT_SETTING_KEYS = {"lastModifiedFrom", "lastModifiedBy"}
+
+MISSING_IN_C1 = "missing-in-c1"
+DIFFERENT = "different"
+
+
+class RequestBudgetExhausted(Exception):
+    pass
+
+
+class RequestBudget:
+    """
+    Caps the number of API calls made by a verification run. A budget of 0
+    means there is no limit. Paginated listings count as a single call.
+    """
+
+    def __init__(self, max_requests=0) -> None:
+        self._max_requests = max_requests
+        self._lock = threading.Lock()
+        self._used = 0
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def take(self, count=1) -> None:
+        with self._lock:
+            if self._max_requests and self._used + count > self._max_requests:
+                raise RequestBudgetExhausted(
+                    f"Request budget of {self._max_requests} exhausted"
+                )
+            self._used += count
+
+
+class Mismatch:
+    def __init__(
+        self,
+        category: str,
+        item: str,
+        issue: str,
+        legacy: Any = None,
+        c1: Any = None,
+    ) -> None:
+        self.category = category
+        self.item = item
+        self.issue = issue
+        self.legacy = legacy
+        self.c1 = c1
+
+
+class MismatchReport:
+    """
+    Writes one JSON object per line: a "mismatch" record for every difference
+    found, an "unverified" record for every account (or part of it) that could
+    not be verified, and a final "summary" record.
+    """
+
+    def __init__(self, out: IO[str]) -> None:
+        self._out = out
+        self._lock = threading.Lock()
+        self.accounts_verified = 0
+        self.mismatch_counts: Dict[str, int] = dict()
+        self.unverified_count = 0
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._out.write(json.dumps(record, sort_keys=True, default=str) + "\n")
+        self._out.flush()
+
+    def add_mismatches(
+        self,
+        legacy_acct_id: str,
+        c1_acct_id: str,
+        account: str,
+        mismatches: Iterable[Mismatch],
+    ) -> None:
+        with self._lock:
+            for mismatch in mismatches:
+                self.mismatch_counts[mismatch.category] = (
+                    self.mismatch_counts.get(mismatch.category, 0) + 1
+                )
+                self._write(
+                    {
+                        "type": "mismatch",
+                        "legacy_account_id": legacy_acct_id,
+                        "c1_account_id": c1_acct_id,
+                        "account": account,
+                        **vars(mismatch),
+                    }
+                )
+
+    def add_unverified(
+        self, legacy_acct_id: str, account: str, category: str, reason: str
+    ) -> None:
+        with self._lock:
+            self.unverified_count += 1
+            self._write(
+                {
+                    "type": "unverified",
+                    "legacy_account_id": legacy_acct_id,
+                    "account": account,
+                    "category": category,
+                    "reason": reason,
+                }
+            )
+
+    def account_verified(self) -> None:
+        with self._lock:
+            self.accounts_verified += 1
+
+    @property
+    def mismatch_total(self) -> int:
+        return sum(self.mismatch_counts.values())
+
+    def write_summary(self, requests_used: int) -> Dict[str, Any]:
+        summary = {
+            "type": "summary",
+            "accounts_verified": self.accounts_verified,
+            "mismatches": self.mismatch_total,
+            "mismatches_per_category": self.mismatch_counts,
+            "unverified": self.unverified_count,
+            "requests": requests_used,
+        }
+        with self._lock:
+            self._write(summary)
+        return summary
+
+
+def diff_tags(legacy_tags: List[str], c1_tags: List[str]) -> List[Mismatch]:
+    if sorted(legacy_tags or []) == sorted(c1_tags or []):
+        return []
+    return [Mismatch("tags", "tags", DIFFERENT, legacy=legacy_tags, c1=c1_tags)]
+
+
+def diff_bot_settings(
+    legacy_bot: Optional[Dict[str, Any]],
+    c1_bot: Optional[Dict[str, Any]],
+    ignored_keys: Iterable[str] = (),
+) -> List[Mismatch]:
+    if not legacy_bot:
+        return []
+    ignored = IGNORED_BOT_SETTING_KEYS.union(ignored_keys)
+    c1_bot = c1_bot or {}
+    return [
+        Mismatch("bot-settings", key, DIFFERENT, legacy=value, c1=c1_bot.get(key))
+        for key, value in sorted(legacy_bot.items())
+        if key not in ignored and c1_bot.get(key) != value
+    ]
+
+
+def diff_rules(legacy_rules: List[Rule], c1_rules: List[Rule]) -> List[Mismatch]:
+    c1_rules_map = {rule: rule for rule in c1_rules}
+    mismatches = []
+    for legacy_rule in legacy_rules:
+        c1_rule = c1_rules_map.get(legacy_rule)
+        if c1_rule is None:
+            mismatches.append(
+                Mismatch("rules", legacy_rule.rule_id, MISSING_IN_C1, legacy=True)
+            )
+            continue
+        for key in RULE_SETTING_KEYS:
+            if key not in legacy_rule.setting:
+                continue
+            legacy_value = legacy_rule.setting[key]
+            c1_value = c1_rule.setting.get(key)
+            if legacy_value != c1_value:
+                mismatches.append(
+                    Mismatch(
+                        "rules",
+                        f"{legacy_rule.rule_id}.{key}",
+                        DIFFERENT,
+                        legacy=legacy_value,
+                        c1=c1_value,
+                    )
+                )
+    return mismatches
+
+
+def diff_missing(
+    category: str,
+    legacy_items: Iterable[Hashable],
+    c1_items: Iterable[Hashable],
+    describe=str,
+) -> List[Mismatch]:
+    """
+    Reports the legacy items that have no equal item in Cloud One, using the
+    equality of the models (e.g. Check, ReportConfig, CommunicationSettings).
+    """
+    c1_set = set(c1_items)
+    return [
+        Mismatch(category, describe(item), MISSING_IN_C1)
+        for item in legacy_items
+        if item not in c1_set
+    ]
+
+
+def format_summary(summary: Dict[str, Any]) -> List[str]:
+    lines = [
+        f"Accounts verified: {summary['accounts_verified']}",
+        f"Mismatches: {summary['mismatches']}",
+    ]
+    per_category: List[Tuple[str, int]] = sorted(
+        summary["mismatches_per_category"].items()
+    )
+    for category, count in per_category:
+        lines.append(f"  {category}: {count}")
+    lines += [
+        f"Unverified: {summary['unverified']}",
+        f"Requests: {summary['requests']}",
+    ]
+    return lines
+
+
+# legacy and Cloud One calls made to verify a single account: account details,
+# communication settings, report configs and suppressed checks
+ACCOUNT_VERIFICATION_REQUESTS = 8
+
+
+def verify_migration(
+    legacy_api: ConformityAPI,
+    c1_api: ConformityAPI,
+    report: MismatchReport,
+    budget: RequestBudget,
+    include_accts=Optional[Set[AccountEnv]],
+    exclude_accts=Optional[Set[AccountEnv]],
+    max_workers=1,
+):
+    """
+    Compares the accounts of Legacy Conformity with the accounts they were
+    migrated to in Cloud One Conformity and reports the differences. Each part
+    of an account is verified by its own task so that both sides of thousands
+    of accounts are read concurrently.
+    """
+    budget.take(6)
+    log.info("Retrieving Users", flush=True)
+    legacy_users = list(legacy_api.get_all_users())
+    c1_users = list(c1_api.get_all_users())
+
+    log.info("Retrieving Accounts", flush=True)
+    acct_adder_for = cloud_account_adders(legacy_api=legacy_api, c1_api=c1_api)
+    c1_accts_index = index_c1_accounts(c1_api.list_accounts(), acct_adder_for)
+    legacy_accts = include_exclude_accts(
+        legacy_accts=legacy_api.list_accounts(),
+        include_accts=include_accts,
+        exclude_accts=exclude_accts,
+    )
+
+    # legacy account id -> [CloudOne account id, account label]
+    accts_to_verify = spill_dict()
+    for acct in legacy_accts:
+        label = acct_label(acct)
+        acct_adder = acct_adder_for(acct.cloud_type)
+        if acct_adder is None:
+            report.add_unverified(
+                legacy_acct_id=acct.account_id,
+                account=label,
+                category="account",
+                reason=f"{acct.cloud_type.upper()} is not supported",
+            )
+            continue
+        exists, c1_acct_id = acct_adder.account_exists(
+            c1_accts_index=c1_accts_index.get(acct.cloud_type, {}), acct=acct
+        )
+        if not exists:
+            report.add_mismatches(
+                legacy_acct_id=acct.account_id,
+                c1_acct_id="",
+                account=label,
+                mismatches=[Mismatch("account", label, MISSING_IN_C1)],
+            )
+            continue
+        accts_to_verify[acct.account_id] = json.dumps([c1_acct_id, label])
+
+    log.info(f"Verifying {len(accts_to_verify)} accounts", flush=True)
+    graph = TaskGraph(max_workers=max_workers, task_priority=task_priority)
+
+    def account_verification_tasks():
+        with accts_to_verify:
+            for legacy_acct_id, value in accts_to_verify.items():
+                c1_acct_id, label = json.loads(value)
+                try:
+                    budget.take(ACCOUNT_VERIFICATION_REQUESTS)
+                except RequestBudgetExhausted as e:
+                    report.add_unverified(
+                        legacy_acct_id=legacy_acct_id,
+                        account=label,
+                        category="account",
+                        reason=str(e),
+                    )
+                    continue
+                report.account_verified()
+                add_account_verification_tasks(
+                    graph=graph,
+                    legacy_api=legacy_api,
+                    c1_api=c1_api,
+                    report=report,
+                    legacy_acct_id=legacy_acct_id,
+                    c1_acct_id=c1_acct_id,
+                    label=label,
+                    legacy_users=legacy_users,
+                    c1_users=c1_users,
+                )
+                yield
+
+    graph.add_feeder(account_verification_tasks())
+    graph.run()
+
+
+def add_account_verification_tasks(
+    graph: TaskGraph,
+    legacy_api: ConformityAPI,
+    c1_api: ConformityAPI,
+    report: MismatchReport,
+    legacy_acct_id: str,
+    c1_acct_id: str,
+    label: str,
+    legacy_users: List[User],
+    c1_users: List[User],
+):
+    def verify_settings() -> List[Mismatch]:
+        legacy_acct_details = legacy_api.get_account_details(acct_id=legacy_acct_id)
+        c1_acct_details = c1_api.get_account_details(acct_id=c1_acct_id)
+        ignored_bot_keys = []
+        if legacy_acct_details.cloud_type == "aws" and str2bool(
+            os.getenv("ENABLE_C1_AWS_CONFORMITY_BOT", "False")
+        ):
+            ignored_bot_keys.append("disabled")
+        return [
+            *diff_tags(legacy_acct_details.tags, c1_acct_details.tags),
+            *diff_bot_settings(
+                legacy_acct_details.bot_settings,
+                c1_acct_details.bot_settings,
+                ignored_keys=ignored_bot_keys,
+            ),
+            *diff_rules(legacy_acct_details.rules, c1_acct_details.rules),
+        ]
+
+    def verify_com_settings() -> List[Mismatch]:
+        candidate_com_settings = candidate_communication_settings(
+            legacy_com_settings=legacy_api.get_communication_settings(
+                acct_id=legacy_acct_id
+            ),
+            legacy_users=legacy_users,
+            c1_users=c1_users,
+        )
+        return diff_missing(
+            category="communication-settings",
+            legacy_items=candidate_com_settings,
+            c1_items=c1_api.get_communication_settings(acct_id=c1_acct_id),
+            describe=lambda cs: cs.channel,
+        )
+
+    def verify_report_configs() -> List[Mismatch]:
+        return diff_missing(
+            category="report-configs",
+            legacy_items=legacy_api.list_account_report_configs(acct_id=legacy_acct_id),
+            c1_items=c1_api.list_account_report_configs(acct_id=c1_acct_id),
+            describe=lambda rconf: rconf.title,
+        )
+
+    def verify_suppressed_checks() -> List[Mismatch]:
+        c1_checks_map = {c: c for c in c1_api.get_suppressed_checks(acct_id=c1_acct_id)}
+        mismatches = []
+        for legacy_check in legacy_api.get_suppressed_checks(acct_id=legacy_acct_id):
+            item = f"{legacy_check.rule_id}|{legacy_check.region}|{legacy_check.service}|{legacy_check.resource}"
+            c1_check = c1_checks_map.get(legacy_check)
+            if c1_check is None:
+                mismatches.append(Mismatch("suppressed-checks", item, MISSING_IN_C1))
+            elif c1_check.suppressed_until != legacy_check.suppressed_until:
+                mismatches.append(
+                    Mismatch(
+                        "suppressed-checks",
+                        item,
+                        DIFFERENT,
+                        legacy=legacy_check.suppressed_until,
+                        c1=c1_check.suppressed_until,
+                    )
+                )
+        return mismatches
+
+    def verification_task(category: str, verify_func: Callable[[], List[Mismatch]]):
+        try:
+            mismatches = verify_func()
+        except Exception as e:
+            log.exception(f"[{label}] Failed to verify {category}")
+            report.add_unverified(
+                legacy_acct_id=legacy_acct_id,
+                account=label,
+                category=category,
+                reason=str(e),
+            )
+            return
+        report.add_mismatches(
+            legacy_acct_id=legacy_acct_id,
+            c1_acct_id=c1_acct_id,
+            account=label,
+            mismatches=mismatches,
+        )
+
+    for category, verify_func in [
+        ("settings", verify_settings),
+        ("communication-settings", verify_com_settings),
+        ("report-configs", verify_report_configs),
+        ("suppressed-checks", verify_suppressed_checks),
+    ]:
+        graph.add(
+            f"verify:{legacy_acct_id}:{category}",
+            partial(verification_task, category, verify_func),
+            transient=True,
+        )
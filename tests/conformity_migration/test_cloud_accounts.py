@@ -0,0 +1,62 @@
+import pytest
+
+from conformity_migration.models import Account
+
+# PyInquirer doesn't import on every Python version the tests run on
+pytest.importorskip("PyInquirer", exc_type=ImportError)
+
+from conformity_migration import cloud_accounts  # noqa: E402
+from conformity_migration.cloud_accounts import AWSCloudAccountAdder  # noqa: E402
+
+
+class FakeAPI:
+    def __init__(self) -> None:
+        self.added = []
+
+    def get_account_access_configuration(self, acct_id):
+        return {"roleArn": f"arn:aws:iam::{acct_id}:role/C", "externalId": "old"}
+
+    def get_organisation_external_id(self):
+        return "new"
+
+    def add_aws_account(self, name, environment, role_arn, external_id):
+        self.added.append((name, external_id))
+        return {"id": f"c1-{name}"}
+
+
+def aws_acct(acct_id, aws_acct_num) -> Account:
+    return Account(
+        {
+            "id": acct_id,
+            "attributes": {
+                "name": acct_id,
+                "cloud-type": "aws",
+                "awsaccount-id": aws_acct_num,
+            },
+        }
+    )
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    asked = []
+    monkeypatch.delenv("SKIP_AWS_PROMPT", raising=False)
+    monkeypatch.setattr(cloud_accounts, "prompt_continue", lambda: asked.append(1))
+    return asked
+
+
+def test_updated_stacks_are_added_without_prompting(prompts):
+    api = FakeAPI()
+    adder = AWSCloudAccountAdder(api, api, updated_stacks={"111"})  # type: ignore
+    assert adder.account_add(aws_acct("a", "111")) == "c1-a"
+    assert prompts == []
+    assert adder.account_add(aws_acct("b", "222")) == "c1-b"
+    assert prompts == [1]
+    assert api.added == [("a", "new"), ("b", "new")]
+
+
+def test_all_stacks_updated(prompts):
+    api = FakeAPI()
+    adder = AWSCloudAccountAdder(api, api, updated_stacks=True)  # type: ignore
+    adder.account_add(aws_acct("a", "111"))
+    assert prompts == []
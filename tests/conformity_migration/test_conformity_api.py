@@ -0,0 +1,392 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, List
+
+import pytest
+import requests
+
+from conformity_migration import conformity_api
+from conformity_migration.conformity_api import (
+    CachingConformityAPI,
+    ConformityClientError,
+    ConformityConnectionError,
+    DefaultConformityAPI,
+    SingleFlightConformityAPI,
+)
+from conformity_migration.json_serializer import default_json_serializer
+
+
+class FakeSession:
+    """Answers every request with what `respond` returns for its params"""
+
+    def __init__(self, respond: Callable[[dict], dict], retried=0) -> None:
+        self.respond = respond
+        self.retried = retried
+        self.params: List[dict] = []
+
+    def request(self, method, url, params=None, data=None, headers=None):
+        params = dict(params or {})
+        self.params.append(params)
+        resp = requests.Response()
+        resp.status_code = 200
+        resp._content = json.dumps(self.respond(params)).encode()
+        history = tuple(range(self.retried))
+        resp.raw = SimpleNamespace(retries=SimpleNamespace(history=history))
+        return resp
+
+
+def fake_api(http) -> DefaultConformityAPI:
+    # skips __init__, which checks the API key with a request
+    api = DefaultConformityAPI.__new__(DefaultConformityAPI)
+    api._base_url = "https://conformity.example.com/api"
+    api.http = http
+    api._serializer = default_json_serializer()
+    api._headers = {}
+    return api
+
+
+def check_dict(i: int) -> dict:
+    return {
+        "id": f"ccc:{i}",
+        "attributes": {"service": "EC2", "region": "us-east-1", "message": ""},
+        "relationships": {
+            "account": {"data": {"id": "acct"}},
+            "rule": {"data": {"id": "EC2-001"}},
+        },
+    }
+
+
+def checks_pages(total: int) -> Callable[[dict], dict]:
+    def respond(params: dict) -> dict:
+        size, number = params["page[size]"], params["page[number]"]
+        ids = range(number * size, min(total, (number + 1) * size))
+        return {"data": [check_dict(i) for i in ids], "meta": {"total": total}}
+
+    return respond
+
+
+def check_numbers(checks) -> List[int]:
+    return [int(check.check_id.split(":")[1]) for check in checks]
+
+
+def test_get_checks_reads_every_page():
+    http = FakeSession(checks_pages(250))
+    checks = fake_api(http).get_checks(acct_id="acct")
+    assert check_numbers(checks) == list(range(250))
+    assert [p["page[number]"] for p in http.params] == [0, 1, 2]
+
+
+def test_get_checks_from_an_offset():
+    http = FakeSession(checks_pages(400))
+    checks = fake_api(http).get_checks(acct_id="acct", offset=150, limit=120)
+    assert check_numbers(checks) == list(range(150, 270))
+    assert [p["page[number]"] for p in http.params] == [1, 2]
+
+
+def test_get_checks_limit_smaller_than_a_page():
+    http = FakeSession(checks_pages(400))
+    checks = fake_api(http).get_checks(acct_id="acct", offset=60, limit=30)
+    assert check_numbers(checks) == list(range(60, 90))
+    assert [(p["page[size]"], p["page[number]"]) for p in http.params] == [(30, 2)]
+
+
+def test_get_checks_passes_filters():
+    http = FakeSession(checks_pages(1))
+    list(fake_api(http).get_checks(acct_id="acct", filters={"suppressed": True}))
+    assert http.params[0]["accountIds"] == "acct"
+    assert http.params[0]["filter[suppressed]"] is True
+
+
+def test_count_checks_reads_a_single_check():
+    http = FakeSession(checks_pages(1234))
+    assert fake_api(http).count_checks(acct_id="acct") == 1234
+    assert [p["page[size]"] for p in http.params] == [1]
+
+
+class FailingSuppressions(DefaultConformityAPI):
+    def __init__(self, errors: List[Exception]) -> None:
+        self.errors = errors
+        self.calls = 0
+
+    def suppress_check(self, check_id, suppressed_until, note="Copied from API"):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+def suppress_one(api: DefaultConformityAPI):
+    (result,) = api.suppress_checks(
+        [("check-1", None, "note")], max_attempts=3, retry_backoff_secs=0
+    )
+    return result
+
+
+def test_suppression_retries_connection_errors():
+    api = FailingSuppressions([ConformityConnectionError("down")])
+    result = suppress_one(api)
+    assert result.ok
+    assert (api.calls, result.attempts) == (2, 2)
+
+
+def test_suppression_leaves_throttling_to_the_http_session():
+    api = FailingSuppressions([ConformityClientError("429 Client Error")] * 3)
+    result = suppress_one(api)
+    assert not result.ok
+    assert (api.calls, result.attempts) == (1, 1)
+
+
+def test_suppression_counts_requests_retried_by_the_session():
+    api = fake_api(FakeSession(lambda params: {"data": {}}, retried=2))
+    result = suppress_one(api)
+    assert result.ok
+    assert (result.attempts, result.requests) == (1, 3)
+
+
+class CountingAPI:
+    def __init__(self) -> None:
+        self.calls: List[tuple] = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.error = None
+
+    def get_all_users(self):
+        self.calls.append(("get_all_users",))
+        self.started.set()
+        self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return iter(["u1", "u2"])
+
+    def get_group_details(self, group_id):
+        self.calls.append(("get_group_details", group_id))
+        return {"id": group_id}
+
+    def list_groups(self, include_group_types=None):
+        self.calls.append(("list_groups",))
+        return [{"name": "g1"}]
+
+    def create_group(self, name):
+        self.calls.append(("create_group", name))
+        if name == "fail":
+            raise ConformityClientError("422 Client Error")
+
+    def create_azure_directory(self, name, directory_id, app_client_id, app_client_key):
+        self.calls.append(("create_azure_directory", name))
+
+    def get_account_details(self, acct_id):
+        self.calls.append(("get_account_details", acct_id))
+        return {"id": acct_id}
+
+    def update_account_rule_setting(self, acct_id, rule_id, setting, note=""):
+        self.calls.append(("update_account_rule_setting", acct_id))
+
+    def delete_account(self, acct_id):
+        self.calls.append(("delete_account", acct_id))
+
+    def list_accounts(self):
+        self.calls.append(("list_accounts",))
+        return ["a1"]
+
+
+def concurrent_calls(api, call: Callable, count: int) -> list:
+    """Results of `count` threads making the same call while the first is in flight"""
+    results: list = [None] * count
+
+    def run(i):
+        try:
+            results[i] = call()
+        except Exception as e:
+            results[i] = e
+
+    api.release.clear()
+    leader = threading.Thread(target=run, args=(0,))
+    leader.start()
+    api.started.wait()
+    followers = [threading.Thread(target=run, args=(i,)) for i in range(1, count)]
+    for thread in followers:
+        thread.start()
+    # lets the followers find the call in flight
+    time.sleep(0.1)
+    api.release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    return results
+
+
+def test_single_flight_shares_a_call_in_flight():
+    api = CountingAPI()
+    single_flight = SingleFlightConformityAPI(api)  # type: ignore
+    results = concurrent_calls(api, single_flight.get_all_users, 4)
+    assert api.calls == [("get_all_users",)]
+    assert results == [["u1", "u2"]] * 4
+    # each caller gets its own list
+    assert len({id(result) for result in results}) == 4
+
+
+def test_single_flight_shares_the_error():
+    api = CountingAPI()
+    api.error = ConformityConnectionError("down")
+    single_flight = SingleFlightConformityAPI(api)  # type: ignore
+    results = concurrent_calls(api, single_flight.get_all_users, 3)
+    assert api.calls == [("get_all_users",)]
+    assert all(result is api.error for result in results)
+
+
+def test_single_flight_calls_again_once_done():
+    api = CountingAPI()
+    single_flight = SingleFlightConformityAPI(api)  # type: ignore
+    assert single_flight.get_group_details(group_id="g1") == {"id": "g1"}
+    assert single_flight.get_group_details(group_id="g1") == {"id": "g1"}
+    single_flight.get_group_details(group_id="g2")
+    single_flight.list_accounts()
+    assert api.calls == [
+        ("get_group_details", "g1"),
+        ("get_group_details", "g1"),
+        ("get_group_details", "g2"),
+        ("list_accounts",),
+    ]
+
+
+def test_single_flight_passes_a_name_argument():
+    class SingleFlightGroupCreation(SingleFlightConformityAPI):
+        COALESCED_METHODS = {"create_group"}
+
+    api = CountingAPI()
+    single_flight = SingleFlightGroupCreation(api)  # type: ignore
+    single_flight.create_group(name="g1")
+    assert api.calls == [("create_group", "g1")]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    fake_time = SimpleNamespace(monotonic=lambda: now[0], sleep=time.sleep)
+    monkeypatch.setattr(conformity_api, "time", fake_time)
+    return now
+
+
+def test_cached_reads_expire_after_their_ttl(clock):
+    api = CountingAPI()
+    caching = CachingConformityAPI(api, ttl_secs=60)  # type: ignore
+    assert caching.get_all_users() == ["u1", "u2"]
+    clock[0] += 59
+    assert caching.get_all_users() == ["u1", "u2"]
+    assert len(api.calls) == 1
+    clock[0] += 1
+    caching.get_all_users()
+    assert len(api.calls) == 2
+    assert (caching.stats.hits, caching.stats.misses) == (1, 2)
+
+
+def test_cached_reads_are_per_arguments(clock):
+    api = CountingAPI()
+    caching = CachingConformityAPI(api)  # type: ignore
+    caching.get_group_details(group_id="g1")
+    caching.get_group_details(group_id="g2")
+    caching.get_group_details(group_id="g1")
+    assert api.calls == [("get_group_details", "g1"), ("get_group_details", "g2")]
+
+
+def test_changes_drop_the_reads_they_affect(clock):
+    api = CountingAPI()
+    caching = CachingConformityAPI(api)  # type: ignore
+    caching.list_groups()
+    caching.get_all_users()
+    caching.create_group(name="g2")
+    caching.list_groups()
+    caching.get_all_users()
+    assert api.calls == [
+        ("list_groups",),
+        ("get_all_users",),
+        ("create_group", "g2"),
+        ("list_groups",),
+    ]
+
+
+def test_azure_directories_drop_the_cached_groups(clock):
+    api = CountingAPI()
+    caching = CachingConformityAPI(api)  # type: ignore
+    caching.list_groups()
+    caching.create_azure_directory("d", "dir-id", "app-id", "app-key")
+    caching.list_groups()
+    assert api.calls.count(("list_groups",)) == 2
+
+
+def test_account_changes_drop_the_reads_of_their_account_only(clock):
+    api = CountingAPI()
+    caching = CachingConformityAPI(api)  # type: ignore
+    for acct_id in ("a1", "a2", "a1", "a2"):
+        caching.get_account_details(acct_id)
+    caching.update_account_rule_setting("a1", rule_id="EC2-001", setting={})
+    caching.get_account_details(acct_id="a1")
+    caching.get_account_details("a2")
+    assert [call for call in api.calls if call[0] == "get_account_details"] == [
+        ("get_account_details", "a1"),
+        ("get_account_details", "a2"),
+        ("get_account_details", "a1"),
+    ]
+
+
+def test_dropping_all_the_results_of_a_read(clock):
+    api = CountingAPI()
+    caching = CachingConformityAPI(api)  # type: ignore
+    caching.get_account_details("a1")
+    caching.list_groups()
+    caching.invalidate_cache("get_account_details")
+    caching.get_account_details("a1")
+    caching.list_groups()
+    caching.invalidate_cache()
+    caching.list_groups()
+    assert api.calls == [
+        ("get_account_details", "a1"),
+        ("list_groups",),
+        ("get_account_details", "a1"),
+        ("list_groups",),
+    ]
+
+
+def test_failed_changes_drop_the_reads_they_affect(clock):
+    api = CountingAPI()
+    caching = CachingConformityAPI(api)  # type: ignore
+    caching.list_groups()
+    with pytest.raises(ConformityClientError):
+        caching.create_group(name="fail")
+    caching.list_groups()
+    assert api.calls.count(("list_groups",)) == 2
+
+
+def test_cached_results_are_copies(clock):
+    api = CountingAPI()
+    caching = CachingConformityAPI(api)  # type: ignore
+    caching.list_groups()[0]["name"] = "changed"
+    assert caching.list_groups() == [{"name": "g1"}]
+
+
+def test_least_recently_used_results_are_dropped(clock):
+    api = CountingAPI()
+    caching = CachingConformityAPI(api, max_entries=2)  # type: ignore
+    for group_id in ("g1", "g2", "g1", "g3", "g1", "g2"):
+        caching.get_group_details(group_id=group_id)
+    assert [call[1] for call in api.calls] == ["g1", "g2", "g3", "g2"]
+
+
+def test_dropped_results_are_forgotten_per_account(clock):
+    api = CountingAPI()
+    caching = CachingConformityAPI(api, max_entries=1)  # type: ignore
+    caching.get_account_details("a1")
+    caching.get_account_details("a2")
+    caching.delete_account("a1")
+    caching.delete_account("a2")
+    caching.get_account_details("a2")
+    assert api.calls.count(("get_account_details", "a2")) == 2
+
+
+def test_listings_are_not_cached(clock):
+    api = CountingAPI()
+    caching = CachingConformityAPI(api)  # type: ignore
+    caching.list_accounts()
+    caching.list_accounts()
+    assert api.calls == [("list_accounts",)] * 2
@@ -0,0 +1,50 @@
+import sys
+
+import pytest
+
+from conformity_migration.json_serializer import (
+    OrjsonJSONSerializer,
+    StdlibJSONSerializer,
+    default_json_serializer,
+)
+
+BODY = {"data": {"attributes": {"name": "Prod", "tags": ["a", "é"], "count": 1}}}
+
+
+@pytest.fixture(params=["json", "orjson"])
+def serializer(request):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+        return OrjsonJSONSerializer()
+    return StdlibJSONSerializer()
+
+
+def test_dumps_compact_utf8_bytes(serializer):
+    data = serializer.dumps(BODY)
+    assert isinstance(data, bytes)
+    assert b" " not in data
+    assert serializer.loads(data) == BODY
+
+
+def test_both_serializers_agree():
+    pytest.importorskip("orjson")
+    stdlib, orjson = StdlibJSONSerializer(), OrjsonJSONSerializer()
+    assert orjson.loads(stdlib.dumps(BODY)) == stdlib.loads(orjson.dumps(BODY))
+
+
+def test_sets_are_rejected(serializer):
+    with pytest.raises(TypeError):
+        serializer.dumps({"tags": {"a"}})
+
+
+def test_only_stdlib_accepts_non_str_keys():
+    assert StdlibJSONSerializer().dumps({1: "a"}) == b'{"1":"a"}'
+    pytest.importorskip("orjson")
+    # bodies have to be built with str keys to be sent through orjson
+    with pytest.raises(TypeError):
+        OrjsonJSONSerializer().dumps({1: "a"})
+
+
+def test_default_serializer_falls_back_to_stdlib(monkeypatch):
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    assert default_json_serializer().name == "json"
@@ -0,0 +1,246 @@
+import pytest
+
+from conformity_migration.conformity_api import (
+    ConformityError,
+    ConformityResourceNotFoundError,
+)
+from conformity_migration.models import (
+    Account,
+    AccountDetails,
+    Check,
+    CommunicationSettings,
+    Group,
+    Note,
+    Profile,
+    ReportConfig,
+    Rule,
+    User,
+)
+from conformity_migration.snapshot import SnapshotConformityAPI, export_snapshot
+
+
+def report_config(report_config_id: str) -> ReportConfig:
+    return ReportConfig(data={"id": report_config_id, "attributes": {}})
+
+
+def check(acct_id: str, i: int, rule_id="EC2-001", notes=None) -> Check:
+    return Check(
+        check_id=f"ccc:{acct_id}:{rule_id}:EC2:us-east-1:r{i}",
+        acct_id=acct_id,
+        rule_id=rule_id,
+        service="EC2",
+        region="us-east-1",
+        resource=f"r{i}",
+        resource_name=f"r{i}",
+        message="m",
+        suppressed=True,
+        suppressed_until=None,
+        notes=notes,
+    )
+
+
+class FakeAPI:
+    """An organisation with a user-defined and a managed group and two accounts"""
+
+    def __init__(self, fail_at_account=None) -> None:
+        self.fail_at_account = fail_at_account
+
+    def current_user(self):
+        return User("u0", "admin@example.com", "Ad", "Min", User.ROLE_ADMIN)
+
+    def get_organisation_id(self):
+        return "org"
+
+    def get_organisation_external_id(self):
+        return "ext"
+
+    def get_all_users(self):
+        return [
+            User("u1", "a@example.com", "A", "A", User.ROLE_USER),
+            User("u2", "b@example.com", "B", "B", User.ROLE_READ_ONLY),
+        ]
+
+    def get_organisation_profile(self, include_rule_settings=False):
+        return Profile({"data": {"id": "organisation-org"}, "included": [{"id": 1}]})
+
+    def get_custom_profiles(self):
+        return [Profile({"data": {"id": "p1"}})]
+
+    def get_profile(self, profile_id, include_rule_settings=False):
+        return Profile({"data": {"id": profile_id}, "included": [{"id": 2}]})
+
+    def list_organisation_report_configs(self):
+        return [report_config("r-org")]
+
+    def get_communication_settings(self, acct_id):
+        return [CommunicationSettings(f"cs-{acct_id}", "email", True, {}, {})]
+
+    def list_groups(self, include_group_types=None):
+        return [
+            Group("g1", "Tagged", ["t"], group_type=Group.GROUP_TYPE_USER_DEFINED),
+            Group("g2", "Azure", group_type=Group.GROUP_TYPE_MANAGED_GROUP),
+        ]
+
+    def get_group_details(self, group_id):
+        return {"id": group_id, "directory": "d"}
+
+    def list_group_report_configs(self, group_id):
+        return [report_config(f"r-{group_id}")]
+
+    def list_accounts(self):
+        for acct_id, cloud_type in (("a1", "aws"), ("a2", "azure")):
+            if acct_id == self.fail_at_account:
+                raise ConformityError("connection lost")
+            yield Account(
+                {
+                    "id": acct_id,
+                    "attributes": {"name": acct_id, "cloud-type": cloud_type},
+                }
+            )
+
+    def get_account_details(self, acct_id):
+        return AccountDetails(
+            {
+                "id": acct_id,
+                "attributes": {
+                    "name": acct_id,
+                    "settings": {"rules": [{"id": "EC2-001", "enabled": True}]},
+                },
+            }
+        )
+
+    def get_account_access_configuration(self, acct_id):
+        return {"roleArn": f"arn:{acct_id}", "externalId": "ext"}
+
+    def get_account_rule_setting(self, acct_id, rule_id, with_notes=False):
+        notes = [Note("noted", "u1", 1000)] if with_notes else []
+        return Rule({"id": rule_id, "enabled": True}, notes=notes)
+
+    def list_account_report_configs(self, acct_id):
+        return [report_config(f"r-{acct_id}")]
+
+    def get_suppressed_checks(self, acct_id, limit=0, offset=0):
+        return [
+            check(acct_id, 1, notes=[Note("why", "u1", 1000)]),
+            check(acct_id, 2, rule_id="S3-001"),
+        ]
+
+    def get_check_detail(self, check_id, with_notes=False, notes_limit=100):
+        c = check("", 0)
+        c.notes = [Note("from detail", "u2", 2000)]
+        return c
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / "legacy.snapshot"
+    export_snapshot(api=FakeAPI(), path=path)
+    return SnapshotConformityAPI(path)
+
+
+def test_export_snapshot_returns_the_records_written(tmp_path):
+    path = tmp_path / "legacy.snapshot"
+    progress = []
+
+    count = export_snapshot(api=FakeAPI(), path=path, on_progress=progress.append)
+
+    # current user, organisation, 2 users, org profile, profile and its
+    # details, org report config and com setting, 2 groups, managed group
+    # details, 2 group report configs, then per account: account, details, 1
+    # rule, 1 com setting, 1 report config, 2 checks, and AWS access
+    assert count == 14 + 2 * 7 + 1
+    assert progress[-2:] == ["Account: a1", "Account: a2"]
+    assert not (tmp_path / "legacy.snapshot.tmp").exists()
+
+
+def test_snapshot_reads_back_the_organisation(snapshot):
+    assert snapshot.current_user().email == "admin@example.com"
+    assert snapshot.get_organisation_id() == "org"
+    assert snapshot.get_organisation_external_id() == "ext"
+    assert [u.user_id for u in snapshot.get_all_users()] == ["u1", "u2"]
+    assert [g.group_id for g in snapshot.list_groups()] == ["g1", "g2"]
+    assert [
+        g.group_id
+        for g in snapshot.list_groups(
+            include_group_types=[Group.GROUP_TYPE_MANAGED_GROUP]
+        )
+    ] == ["g2"]
+    assert snapshot.get_group_details(group_id="g2")["directory"] == "d"
+    assert [a.account_id for a in snapshot.list_accounts()] == ["a1", "a2"]
+    assert [
+        r.report_config_id for r in snapshot.list_organisation_report_configs()
+    ] == ["r-org"]
+    assert [r.report_config_id for r in snapshot.list_group_report_configs("g1")] == [
+        "r-g1"
+    ]
+    assert [cs.com_setting_id for cs in snapshot.get_communication_settings("")] == [
+        "cs-"
+    ]
+
+
+def test_snapshot_drops_rule_settings_unless_included(snapshot):
+    assert snapshot.get_organisation_profile().included_rules is None
+    org_profile = snapshot.get_organisation_profile(include_rule_settings=True)
+    assert org_profile.included_rules == [{"id": 1}]
+    assert [p.profile_id for p in snapshot.get_custom_profiles()] == ["p1"]
+    profile = snapshot.get_profile(profile_id="p1", include_rule_settings=True)
+    assert profile.included_rules == [{"id": 2}]
+
+
+def test_snapshot_reads_back_the_accounts(snapshot):
+    assert [r.rule_id for r in snapshot.get_account_details(acct_id="a1").rules] == [
+        "EC2-001"
+    ]
+    rule = snapshot.get_account_rule_setting("a1", "EC2-001", with_notes=True)
+    assert [n.note for n in rule.notes] == ["noted"]
+    assert snapshot.get_account_rule_setting("a1", "EC2-001").notes == []
+    assert snapshot.get_account_access_configuration("a1")["roleArn"] == "arn:a1"
+    # only AWS accounts have an access configuration
+    with pytest.raises(ConformityResourceNotFoundError):
+        snapshot.get_account_access_configuration("a2")
+    assert [cs.com_setting_id for cs in snapshot.get_communication_settings("a2")] == [
+        "cs-a2"
+    ]
+    assert [r.report_config_id for r in snapshot.list_account_report_configs("a2")] == [
+        "r-a2"
+    ]
+
+
+def test_snapshot_filters_and_pages_the_suppressed_checks(snapshot):
+    checks = list(snapshot.get_suppressed_checks(acct_id="a1"))
+    assert [c.resource for c in checks] == ["r1", "r2"]
+    # checks read without notes get the notes of their details
+    assert [[n.note for n in c.notes] for c in checks] == [["why"], ["from detail"]]
+    assert snapshot.count_suppressed_checks(acct_id="a1") == 2
+    assert [
+        c.resource
+        for c in snapshot.get_checks(acct_id="a1", filters={"ruleIds": ["S3-001"]})
+    ] == ["r2"]
+    assert [
+        c.resource for c in snapshot.get_suppressed_checks("a1", limit=1, offset=1)
+    ] == ["r2"]
+    assert list(snapshot.get_checks("a1", filters={"suppressed": False})) == []
+    detail = snapshot.get_check_detail(check_id=checks[0].check_id)
+    assert detail.resource == "r1" and detail.notes == []
+
+
+def test_snapshot_rejects_mutations(snapshot):
+    with pytest.raises(ConformityError):
+        snapshot.delete_account(acct_id="a1")
+
+
+def test_snapshot_file_must_exist(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        SnapshotConformityAPI(tmp_path / "missing.snapshot")
+
+
+def test_failed_export_keeps_the_previous_snapshot(tmp_path):
+    path = tmp_path / "legacy.snapshot"
+    export_snapshot(api=FakeAPI(), path=path)
+
+    with pytest.raises(ConformityError):
+        export_snapshot(api=FakeAPI(fail_at_account="a2"), path=path)
+
+    assert not (tmp_path / "legacy.snapshot.tmp").exists()
+    snapshot = SnapshotConformityAPI(path)
+    assert [a.account_id for a in snapshot.list_accounts()] == ["a1", "a2"]
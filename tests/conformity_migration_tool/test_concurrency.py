@@ -0,0 +1,54 @@
+from conformity_migration_tool.concurrency import AdaptiveConcurrencyLimit
+
+
+def answer(limit: AdaptiveConcurrencyLimit, latencies, overloaded=False):
+    """Sends the requests at the same time, then answers them"""
+    tokens = [limit.acquire() for _ in latencies]
+    for token, latency in zip(tokens, latencies):
+        limit.release(token, latency_secs=latency, overloaded=overloaded)
+
+
+def test_limit_grows_while_it_is_reached_and_latency_stays_flat():
+    limit = AdaptiveConcurrencyLimit(initial_limit=2, max_limit=4, window=2)
+    answer(limit, [0.1, 0.1])
+    assert limit.limit == 3
+    answer(limit, [0.1, 0.1, 0.1])
+    assert limit.limit == 4
+    answer(limit, [0.1] * 4)
+    assert (limit.limit, limit.highest) == (4, 4)
+
+
+def test_limit_doesnt_grow_when_it_isnt_reached():
+    limit = AdaptiveConcurrencyLimit(initial_limit=4, window=2)
+    for _ in range(4):
+        answer(limit, [0.1])
+    assert limit.limit == 4
+
+
+def test_limit_shrinks_when_the_api_is_overloaded():
+    limit = AdaptiveConcurrencyLimit(initial_limit=8, window=2)
+    answer(limit, [0.1], overloaded=True)
+    assert (limit.limit, limit.decreases, limit.lowest) == (4, 1, 4)
+
+
+def test_responses_to_requests_sent_before_a_decrease_dont_decrease_it_again():
+    limit = AdaptiveConcurrencyLimit(initial_limit=8, window=2)
+    answer(limit, [0.1] * 8, overloaded=True)
+    assert (limit.limit, limit.decreases) == (4, 1)
+    assert limit.in_flight == 0
+
+
+def test_limit_shrinks_when_the_latency_rises():
+    limit = AdaptiveConcurrencyLimit(initial_limit=2, window=2, latency_tolerance=1.5)
+    answer(limit, [0.1, 0.1])
+    assert limit.limit == 3
+    answer(limit, [0.1, 0.2, 0.2])
+    assert (limit.limit, limit.decreases) == (1, 1)
+
+
+def test_limit_stays_within_bounds():
+    limit = AdaptiveConcurrencyLimit(initial_limit=3, min_limit=2, max_limit=3)
+    answer(limit, [0.1], overloaded=True)
+    answer(limit, [0.1], overloaded=True)
+    assert limit.limit == 2
+    assert AdaptiveConcurrencyLimit(initial_limit=100, max_limit=16).limit == 16
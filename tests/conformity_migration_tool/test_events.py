@@ -0,0 +1,111 @@
+import io
+import json
+
+import pytest
+
+from conformity_migration_tool.events import (
+    ERROR,
+    OK,
+    RUN,
+    EventLog,
+    format_run_stats,
+    merge_shard_event_files,
+    read_events,
+    summarize_events,
+    summarize_events_file,
+)
+
+
+def event(run: str, unit: str, start: float, end: float, outcome=OK, **ids):
+    return {
+        "run": run,
+        "unit": unit,
+        "ids": ids,
+        "start": start,
+        "end": end,
+        "duration_secs": end - start,
+        "requests": 1,
+        "outcome": outcome,
+    }
+
+
+def write_events(path, events) -> str:
+    path.write_text("".join(json.dumps(e) + "\n" for e in events))
+    return str(path)
+
+
+def test_operation_records_ids_and_outcome():
+    out = io.StringIO()
+    events = EventLog(out=out, run_id="r1", shard="1/2")
+    with events.operation("rule", account="a1") as ids:
+        ids["rule"] = "EC2-001"
+    with pytest.raises(ValueError):
+        with events.operation("check", account="a1"):
+            raise ValueError("boom")
+
+    ok, failed = read_events(out.getvalue().splitlines())
+    assert (ok["run"], ok["unit"], ok["outcome"]) == ("r1", "rule", OK)
+    assert ok["ids"] == {"account": "a1", "rule": "EC2-001"}
+    assert ok["shard"] == "1/2"
+    assert (failed["outcome"], failed["error"]) == (ERROR, "boom")
+
+
+def test_without_out_nothing_is_written():
+    with EventLog().operation("rule"):
+        pass
+
+
+def test_summarize_events_of_a_run():
+    events = [
+        event("r0", "rule", 0, 9),
+        event("r1", RUN, 0, 10),
+        event("r1", "rule", 0, 1, rule="R1"),
+        event("r1", "rule", 1, 4, outcome=ERROR, rule="R2"),
+        event("r1", "check", 2, 4, check="C1"),
+    ]
+    stats = summarize_events(events, run_id="r1", slowest_count=2)
+    assert sorted(stats.units) == ["check", "rule", RUN]
+    rules = stats.units["rule"]
+    assert (rules.count, rules.errors, rules.requests) == (2, 1, 2)
+    assert rules.elapsed_secs == 4
+    assert rules.per_sec == 0.5
+    # the run itself isn't one of the slowest operations
+    assert [e["ids"] for e in stats.slowest] == [{"rule": "R2"}, {"check": "C1"}]
+
+    lines = format_run_stats(stats)
+    assert lines[:2] == ["Run: r1", "Duration: 10.0s"]
+    assert lines[-3] == "Slowest operations:"
+
+
+def test_summarize_events_file_defaults_to_its_last_run(tmp_path):
+    events_file = write_events(
+        tmp_path / "events.jsonl",
+        [event("r1", "rule", 0, 1), event("r2", "rule", 0, 2)],
+    )
+    stats = summarize_events_file(events_file)
+    assert stats.run_id == "r2"
+    assert stats.units["rule"].durations == [2]
+    assert summarize_events_file(events_file, run_id="r1").units["rule"].count == 1
+
+
+def test_merge_shard_event_files_makes_a_single_run(tmp_path):
+    shard0 = write_events(
+        tmp_path / "events.shard-0-of-2.jsonl",
+        [event("s0-old", "rule", 0, 1), event("s0", "rule", 5, 6, rule="R1")],
+    )
+    shard1 = write_events(
+        tmp_path / "events.shard-1-of-2.jsonl", [event("s1", "rule", 5, 7, rule="R2")]
+    )
+    out_file = str(tmp_path / "merged.jsonl")
+
+    run_id = merge_shard_event_files(out_file=out_file, shard_files=[shard0, shard1])
+
+    assert run_id == "s0-merged"
+    with open(out_file, encoding="utf-8") as fh:
+        merged = list(read_events(fh))
+    # only the last run of each shard
+    assert [(e["run"], e["shard_run"], e["ids"]) for e in merged] == [
+        ("s0-merged", "s0", {"rule": "R1"}),
+        ("s0-merged", "s1", {"rule": "R2"}),
+    ]
+    assert summarize_events_file(out_file).units["rule"].count == 2
@@ -0,0 +1,80 @@
+import os
+
+from requests import Request
+
+from conformity_migration_tool.http_cache import DiskCache, cache_key
+
+META = {"status": 200}
+
+
+def key_of(url, api_key="ApiKey k1"):
+    return cache_key(Request("GET", url, headers={"Authorization": api_key}).prepare())
+
+
+def test_cache_key_ignores_the_order_of_the_query_parameters():
+    assert key_of("https://h/v1/checks?b=2&a=1") == key_of(
+        "https://h/v1/checks?a=1&b=2"
+    )
+    assert key_of("https://H/v1/checks") == key_of("https://h/v1/checks")
+
+
+def test_cache_key_tells_requests_apart():
+    keys = {
+        key_of("https://h/v1/checks?a=1"),
+        key_of("https://h/v1/checks?a=2"),
+        key_of("https://h/v1/accounts?a=1"),
+        # another organisation
+        key_of("https://h/v1/checks?a=1", api_key="ApiKey k2"),
+    }
+    assert len(keys) == 4
+
+
+def test_stored_responses_are_read_back(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=10_000)
+    assert cache.get("aa1") is None
+    cache.put("aa1", {"status": 200, "headers": {"a": "b"}}, b"body\nlines")
+    assert cache.get("aa1") == ({"status": 200, "headers": {"a": "b"}}, b"body\nlines")
+    cache.clear()
+    assert cache.get("aa1") is None
+
+
+def stored_keys(cache_dir):
+    return sorted(path.name for path in cache_dir.glob("*/*"))
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    body = b"x" * 100
+    # each response takes its body plus its meta line
+    cache = DiskCache(tmp_path, max_bytes=3 * 120)
+    for key in ("aa1", "bb2", "cc3"):
+        cache.put(key, META, body)
+    assert cache.get("aa1") == (META, body)
+    cache.put("dd4", META, body)
+    assert stored_keys(tmp_path) == ["aa1", "cc3", "dd4"]
+    assert cache.get("bb2") is None
+
+
+def test_eviction_order_is_read_from_an_existing_cache_once(tmp_path):
+    body = b"x" * 100
+    previous_run = DiskCache(tmp_path, max_bytes=10_000)
+    for i, key in enumerate(("aa1", "bb2", "cc3")):
+        previous_run.put(key, META, body)
+        path = tmp_path.joinpath(key[:2], key)
+        os.utime(path, (1000 + i, 1000 + i))
+    os.utime(tmp_path.joinpath("aa", "aa1"), (2000, 2000))
+
+    cache = DiskCache(tmp_path, max_bytes=3 * 120)
+    cache.put("dd4", META, body)
+    assert stored_keys(tmp_path) == ["aa1", "cc3", "dd4"]
+    # later evictions don't list the cache directory again
+    cache._files = None  # type: ignore
+    cache.put("ee5", META, body)
+    assert stored_keys(tmp_path) == ["aa1", "dd4", "ee5"]
+
+
+def test_replacing_a_response_counts_its_size_once(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=3 * 120)
+    for _ in range(5):
+        cache.put("aa1", META, b"x" * 100)
+    cache.put("bb2", META, b"x" * 100)
+    assert stored_keys(tmp_path) == ["aa1", "bb2"]
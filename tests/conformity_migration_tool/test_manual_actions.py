@@ -0,0 +1,78 @@
+import pytest
+
+from conformity_migration.models import Group
+
+# PyInquirer doesn't import on every Python version the tests run on
+pytest.importorskip("PyInquirer", exc_type=ImportError)
+
+from conformity_migration_tool import manual_actions  # noqa: E402
+from conformity_migration_tool.sharding import Shard  # noqa: E402
+
+
+def azure_directory(name: str, directory_id: str) -> Group:
+    return Group(
+        directory_id,
+        name,
+        group_type=Group.GROUP_TYPE_MANAGED_GROUP,
+        cloud_type="azure",
+        cloud_data={"azure": {"directoryId": directory_id, "applicationId": "app"}},
+    )
+
+
+class FakeAPI:
+    def __init__(self, managed_groups) -> None:
+        self.managed_groups = managed_groups
+
+    def list_groups(self, include_group_types=None):
+        return self.managed_groups
+
+
+@pytest.fixture
+def prompted(monkeypatch):
+    prompted = []
+
+    def prompt_azure_app_client_id(directory_name, directory_id, app_client_id):
+        prompted.append(directory_id)
+        return f"typed-{directory_id}"
+
+    monkeypatch.setattr(
+        manual_actions, "prompt_azure_app_client_id", prompt_azure_app_client_id
+    )
+    return prompted
+
+
+def collect(tmp_path, content, shard=None):
+    manual_actions_file = tmp_path / "manual-actions.yml"
+    manual_actions_file.write_text(content)
+    legacy_api = FakeAPI([azure_directory("Dir1", "d1"), azure_directory("Dir2", "d2")])
+    c1_api = FakeAPI([azure_directory("Dir2", "d2")])
+    return manual_actions.collect_manual_actions(
+        legacy_api=legacy_api,  # type: ignore
+        c1_api=c1_api,  # type: ignore
+        include_accts=None,
+        exclude_accts=None,
+        manual_actions_file=str(manual_actions_file),
+        shard=shard,
+    )
+
+
+def test_manual_actions_file_answers_the_prompts(tmp_path, prompted):
+    actions = collect(
+        tmp_path, "aws_stacks_updated: true\nazure_app_keys:\n  d1: secret\n"
+    )
+    assert actions.azure_app_keys == {"d1": "secret"}
+    assert actions.updated_aws_stacks is True
+    assert prompted == []
+
+
+def test_missing_azure_app_keys_are_asked_for(tmp_path, prompted):
+    actions = collect(tmp_path, "aws_stacks_updated: true\n")
+    # the directory already in Cloud One isn't added
+    assert actions.azure_app_keys == {"d1": "typed-d1"}
+    assert prompted == ["d1"]
+
+
+def test_only_the_first_shard_collects_azure_app_keys(tmp_path, prompted):
+    actions = collect(tmp_path, "aws_stacks_updated: true\n", shard=Shard(1, 2))
+    assert actions.azure_app_keys == {}
+    assert prompted == []
@@ -0,0 +1,95 @@
+import gzip
+import io
+
+from requests import Request
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3 import HTTPResponse
+
+from conformity_migration_tool.metrics import (
+    HTTPMetrics,
+    MetricsHTTPAdapter,
+    endpoint_template,
+    format_http_metrics,
+)
+
+BODY = b'{"data": [' + b",".join([b'{"id": "abc"}'] * 200) + b"]}"
+
+
+class FakeAdapter(BaseAdapter):
+    """Answers every request with BODY, gzipped when asked to"""
+
+    def __init__(self, compress: bool) -> None:
+        super().__init__()
+        self.compress = compress
+
+    def send(self, request, *args, **kwargs):
+        headers = {"Content-Type": "application/json"}
+        body = BODY
+        if self.compress:
+            headers["Content-Encoding"] = "gzip"
+            body = gzip.compress(BODY)
+        raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers=headers,
+            status=200,
+            preload_content=False,
+            decode_content=True,
+        )
+        return HTTPAdapter().build_response(request, raw)
+
+    def close(self):
+        pass
+
+
+def send(adapter: BaseAdapter, method: str, url: str):
+    return adapter.send(Request(method, url).prepare())
+
+
+def test_endpoint_template_replaces_resource_ids():
+    assert (
+        endpoint_template("https://host/v1/accounts/abc/settings/rules/EC2-001")
+        == "/v1/accounts/{id}/settings/rules/{id}"
+    )
+    assert endpoint_template("https://host/api/checks?page[size]=10") == "/api/checks"
+
+
+def test_records_transferred_and_decoded_bytes_of_compressed_responses():
+    metrics = HTTPMetrics()
+    adapter = MetricsHTTPAdapter(FakeAdapter(compress=True), metrics, api="c1")
+
+    for acct_id in ("a1", "a2"):
+        resp = send(adapter, "GET", f"https://host/v1/accounts/{acct_id}")
+        assert resp.content == BODY
+
+    [(key, stats)] = metrics.endpoints()
+    assert key == ("c1", "GET", "/v1/accounts/{id}")
+    assert (stats.requests, stats.compressed_responses) == (2, 2)
+    assert stats.decoded_bytes == 2 * len(BODY)
+    assert stats.wire_bytes == 2 * len(gzip.compress(BODY))
+    assert stats.saved_bytes > 0
+    assert metrics.in_flight == 0
+
+
+def test_uncompressed_responses_save_nothing():
+    metrics = HTTPMetrics()
+    adapter = MetricsHTTPAdapter(FakeAdapter(compress=False), metrics, api="legacy")
+
+    send(adapter, "GET", "https://host/v1/users")
+
+    [(_, stats)] = metrics.endpoints()
+    assert stats.compressed_responses == 0
+    assert stats.wire_bytes == stats.decoded_bytes == len(BODY)
+    assert stats.saved_bytes == 0
+
+
+def test_format_http_metrics_totals():
+    metrics = HTTPMetrics()
+    metrics.record_response("c1", "GET", "https://host/v1/users", 1024, 4096, True)
+    metrics.record_response("c1", "GET", "https://host/v1/users/u1", 512, 512, False)
+
+    text = format_http_metrics(metrics)
+
+    assert "/v1/users/{id}" in text
+    assert text.splitlines()[-1] == (
+        "  Total transferred: 1.5 KiB, decoded: 4.5 KiB, saved by compression: 3.0 KiB"
+    )
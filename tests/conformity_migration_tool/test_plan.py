@@ -0,0 +1,249 @@
+import pytest
+
+from conformity_migration.models import (
+    Account,
+    AccountDetails,
+    Check,
+    CommunicationSettings,
+    Group,
+    Note,
+    Profile,
+    ReportConfig,
+    User,
+)
+
+# PyInquirer doesn't import on every Python version the tests run on
+pytest.importorskip("PyInquirer", exc_type=ImportError)
+
+from conformity_migration_tool.plan import (  # noqa: E402
+    CLOUD_ONE,
+    LEGACY,
+    MigrationPlan,
+    estimate_wall_time_secs,
+    format_duration,
+    format_plan,
+    plan_migration,
+)
+
+
+def account(acct_id: str, cloud_type: str, aws_acct_num="") -> Account:
+    return Account(
+        {
+            "id": acct_id,
+            "attributes": {
+                "name": acct_id,
+                "environment": "prod",
+                "cloud-type": cloud_type,
+                "awsaccount-id": aws_acct_num,
+            },
+        }
+    )
+
+
+def report_config(title: str) -> ReportConfig:
+    return ReportConfig(
+        {"id": title, "attributes": {"configuration": {"title": title}}}
+    )
+
+
+def check(acct_id: str, i: int, notes=None) -> Check:
+    return Check(
+        check_id=f"ccc:{acct_id}:EC2-001:EC2:us-east-1:r{i}",
+        acct_id=acct_id,
+        rule_id="EC2-001",
+        service="EC2",
+        region="us-east-1",
+        resource=f"r{i}",
+        resource_name=f"r{i}",
+        message="m",
+        suppressed=True,
+        suppressed_until=None,
+        notes=notes,
+    )
+
+
+class LegacyAPI:
+    """
+    Two AWS accounts, the first already in Cloud One, and an unsupported one.
+    Only reads are implemented, so that planning fails on any change.
+    """
+
+    def get_all_users(self):
+        return [
+            User("l1", "a@example.com", "A", "A", User.ROLE_USER),
+            User("l2", "b@example.com", "B", "B", User.ROLE_USER),
+        ]
+
+    def list_groups(self, include_group_types=None):
+        return [
+            Group("g1", "Tagged", ["t"], group_type=Group.GROUP_TYPE_USER_DEFINED),
+            Group(
+                "g2",
+                "Directory",
+                group_type=Group.GROUP_TYPE_MANAGED_GROUP,
+                cloud_type="azure",
+            ),
+        ]
+
+    def list_accounts(self):
+        return [
+            account("a1", "aws", "111"),
+            account("a2", "aws", "222"),
+            account("a3", "gcp"),
+        ]
+
+    def get_custom_profiles(self):
+        return [Profile({"data": {"id": "p1", "attributes": {"name": "P1"}}})]
+
+    def list_organisation_report_configs(self):
+        return [report_config("Weekly")]
+
+    def list_group_report_configs(self, group_id):
+        return []
+
+    def list_account_report_configs(self, acct_id):
+        return [report_config(f"Weekly {acct_id}")]
+
+    def get_communication_settings(self, acct_id):
+        if acct_id:
+            return []
+        return [CommunicationSettings("cs1", "email", True, {}, {"users": ["l1"]})]
+
+    def get_account_details(self, acct_id):
+        settings = {
+            "rules": [
+                {"id": "EC2-001", "enabled": True},
+                {"id": "S3-001", "enabled": False},
+            ]
+        }
+        if acct_id == "a1":
+            settings["bot"] = {"disabled": False}
+        return AccountDetails(
+            {
+                "id": acct_id,
+                "attributes": {"name": acct_id, "settings": settings},
+            }
+        )
+
+    def get_suppressed_checks(self, acct_id, limit=0, offset=0):
+        if acct_id != "a1":
+            return []
+        note = [Note("why", "l1", 1000)]
+        return [check(acct_id, 1, note), check(acct_id, 2, note), check(acct_id, 3)]
+
+
+class CloudOneAPI:
+    def get_all_users(self):
+        return [User("c1", "a@example.com", "A", "A", User.ROLE_USER)]
+
+    def list_groups(self, include_group_types=None):
+        return []
+
+    def list_accounts(self):
+        return [account("c1-a1", "aws", "111")]
+
+    def get_custom_profiles(self):
+        return [Profile({"data": {"id": "c1-p1", "attributes": {"name": "P1"}}})]
+
+    def list_organisation_report_configs(self):
+        return []
+
+    def list_account_report_configs(self, acct_id):
+        return []
+
+    def get_communication_settings(self, acct_id):
+        return []
+
+
+@pytest.fixture
+def plan() -> MigrationPlan:
+    return plan_migration(
+        legacy_api=LegacyAPI(),  # type: ignore
+        c1_api=CloudOneAPI(),  # type: ignore
+        include_accts=None,
+        exclude_accts=None,
+    )
+
+
+def test_plan_adds_what_is_missing_in_cloud_one(plan):
+    counts = dict(plan.items())
+    assert counts[("accounts", CLOUD_ONE, "POST", "/accounts")] == 1
+    assert counts[("accounts", LEGACY, "GET", "/accounts/{accountId}/access")] == 1
+    assert counts[("accounts", CLOUD_ONE, "GET", "/organisation/external-id")] == 1
+    assert counts[("user-groups", CLOUD_ONE, "POST", "/groups")] == 1
+    assert (
+        counts[("managed-groups", CLOUD_ONE, "POST", "/azure/active-directories")] == 1
+    )
+    # the custom profile is replaced
+    assert (
+        counts[("custom-profiles", CLOUD_ONE, "DELETE", "/profiles/{profileId}")] == 1
+    )
+    assert counts[("custom-profiles", CLOUD_ONE, "POST", "/profiles")] == 1
+    assert counts[("org-comm-settings", CLOUD_ONE, "POST", "/settings/communication")]
+
+
+def test_plan_migrates_the_configurations_of_supported_accounts(plan):
+    counts = dict(plan.items())
+    rules = "/accounts/{accountId}/settings/rules/{ruleId}"
+    assert counts[("account-rules", CLOUD_ONE, "PATCH", rules)] == 4
+    assert (
+        counts[("account-settings", CLOUD_ONE, "PATCH", "/accounts/{accountId}")] == 2
+    )
+    bot = "/accounts/{accountId}/settings/bot"
+    assert counts[("account-settings", CLOUD_ONE, "PATCH", bot)] == 1
+    assert counts[("account-report-configs", CLOUD_ONE, "POST", "/report-configs")] == 2
+    # no communication settings of the accounts to copy
+    assert (
+        "account-comm-settings",
+        CLOUD_ONE,
+        "POST",
+        "/settings/communication",
+    ) not in counts
+
+
+def test_plan_reads_the_notes_of_checks_without_them(plan):
+    counts = dict(plan.items())
+    stage = "account-suppressed-checks"
+    assert counts[(stage, CLOUD_ONE, "PATCH", "/checks/{checkId}")] == 3
+    assert counts[(stage, LEGACY, "GET", "/checks/{checkId}")] == 1
+    # a count and a page per account
+    assert counts[(stage, LEGACY, "GET", "/checks")] == 4
+
+
+def test_plan_totals():
+    plan = MigrationPlan()
+    plan.read("users", LEGACY, "/users")
+    plan.read("users", CLOUD_ONE, "/users", count=2)
+    plan.add("accounts", CLOUD_ONE, "POST", "/accounts", count=3)
+    plan.add("accounts", CLOUD_ONE, "POST", "/accounts", count=0)
+    assert plan.total() == 6
+    assert plan.total(side=CLOUD_ONE) == 5
+    assert plan.total(writes_only=True) == 3
+    assert plan.stage_totals() == {"users": (3, 0), "accounts": (0, 3)}
+    assert plan.endpoint_totals() == {
+        (CLOUD_ONE, "POST", "/accounts"): 3,
+        (CLOUD_ONE, "GET", "/users"): 2,
+        (LEGACY, "GET", "/users"): 1,
+    }
+
+
+def test_estimate_is_bound_by_the_slowest_api():
+    plan = MigrationPlan()
+    plan.read("users", LEGACY, "/users", count=10)
+    plan.read("users", CLOUD_ONE, "/users", count=30)
+    # rate-limited: 30 Cloud One requests at 5 per second
+    assert estimate_wall_time_secs(plan, 5, 0.1, max_workers=10) == 6
+    # latency-bound: 40 requests of 1s by 4 workers
+    assert estimate_wall_time_secs(plan, 100, 1, max_workers=4) == 10
+
+
+def test_format_duration():
+    assert format_duration(42.4) == "42s"
+    assert format_duration(61) == "1m 01s"
+    assert format_duration(3725) == "1h 02m 05s"
+
+
+def test_format_plan(plan):
+    text = format_plan(plan, rate_limit_per_sec=5, avg_latency_secs=0.5, max_workers=4)
+    assert text.startswith("Migration plan (no changes were made)")
+    assert f"Total writes: {plan.total(writes_only=True)}" in text
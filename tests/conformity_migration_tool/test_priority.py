@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import Counter
+
+from conformity_migration.conformity_api import DefaultConformityAPI
+from conformity_migration_tool.priority import (
+    BULK,
+    CRITICAL,
+    NORMAL,
+    PriorityRateBudget,
+    request_priority,
+    set_thread_priority,
+    task_priority,
+    thread_priority,
+)
+
+LEGACY_BASE_URL = "https://us-west-2-api.cloudconformity.com/v1"
+C1_BASE_URL = "https://conformity.us-1.cloudone.trendmicro.com/api"
+
+
+class SuppressingAPI(DefaultConformityAPI):
+    """Records the priority of the threads suppressing checks, without requests"""
+
+    def __init__(self) -> None:
+        self.priorities: list = []
+
+    def suppress_check(self, check_id, suppressed_until, note="Copied from API"):
+        self.priorities.append(thread_priority())
+
+
+def test_task_priority_of_account_stages_ignores_account_and_chunk():
+    assert task_priority("accounts") == CRITICAL
+    assert task_priority("account:L1:settings") == CRITICAL
+    assert task_priority("account:L1:rules:3") == NORMAL
+    assert task_priority("account:L1:suppressed-checks:0") == BULK
+    assert task_priority("verify:L1:settings") == BULK
+    assert task_priority("group-configs") == NORMAL
+
+
+def test_checks_are_bulk_for_both_apis():
+    for base_url in (LEGACY_BASE_URL, C1_BASE_URL):
+        assert request_priority(f"{base_url}/checks/ccc:abc", base_url) == BULK
+        assert request_priority(f"{base_url}/checks?accountIds=a", base_url) == BULK
+        assert request_priority(f"{base_url}/accounts/a1", base_url) == NORMAL
+
+
+def test_thread_priority_wins_over_endpoint():
+    set_thread_priority(CRITICAL)
+    try:
+        assert request_priority(f"{C1_BASE_URL}/checks/x", C1_BASE_URL) == CRITICAL
+    finally:
+        set_thread_priority(None)
+
+
+def test_suppress_checks_pool_inherits_caller_priority():
+    api = SuppressingAPI()
+    set_thread_priority(BULK)
+    try:
+        results = list(
+            api.suppress_checks(
+                [(f"check-{i}", None, "note") for i in range(5)], max_workers=3
+            )
+        )
+    finally:
+        set_thread_priority(None)
+    assert all(result.ok for result in results)
+    assert api.priorities == [BULK] * 5
+
+
+def test_rate_budget_is_shared_by_priority():
+    budget = PriorityRateBudget(rate_per_sec=50, shares=[0.6, 0.3, 0.1])
+    taken: Counter = Counter()
+    stop_at = time.monotonic() + 1
+
+    def send(priority: int):
+        while time.monotonic() < stop_at:
+            budget.acquire(priority)
+            taken[priority] += 1
+
+    threads = [
+        threading.Thread(target=send, args=(priority,))
+        for priority in (CRITICAL, NORMAL, BULK)
+        for _ in range(2)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert taken[CRITICAL] > taken[NORMAL] > taken[BULK] > 0
+
+
+def test_rate_budget_gives_unused_shares_to_others():
+    budget = PriorityRateBudget(rate_per_sec=50, shares=[0.6, 0.3, 0.1])
+    started = time.monotonic()
+    for _ in range(30):
+        budget.acquire(BULK)
+    # alone, bulk requests get the whole rate instead of their 5 per second
+    assert time.monotonic() - started < 2
@@ -0,0 +1,100 @@
+import pstats
+import threading
+import time
+
+from conformity_migration_tool.profiling import (
+    SpanTimers,
+    format_span_timers,
+    merge_worker_profiles,
+    profiled,
+    worker_profile_out,
+)
+
+
+def busy_worker():
+    sum(i * i for i in range(10000))
+
+
+def run_in_thread(target):
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+
+
+def test_nested_spans_are_counted_once():
+    timers = SpanTimers()
+    with timers.span("accounts"):
+        with timers.span("rules"):
+            time.sleep(0.01)
+    with timers.span("rules"):
+        pass
+
+    stages = dict(timers.stages())
+    assert sorted(stages) == ["accounts", "rules"]
+    assert stages["accounts"].count == 1
+    assert stages["accounts"].wall_secs >= 0.01
+    # sleeping isn't CPU time
+    assert stages["accounts"].cpu_secs < stages["accounts"].wall_secs
+    assert stages["rules"].count == 1
+
+
+def test_spans_of_other_threads_are_counted():
+    timers = SpanTimers()
+
+    def rules_span():
+        with timers.span("rules"):
+            pass
+
+    with timers.span("accounts"):
+        run_in_thread(rules_span)
+
+    assert [stage for stage, _ in timers.stages()] == ["accounts", "rules"]
+    assert format_span_timers(timers).splitlines()[0] == "Time per migration stage:"
+
+
+def test_profile_includes_the_threads_started_meanwhile(tmp_path):
+    profile_out = str(tmp_path / "run.prof")
+    with profiled(profile_out):
+        run_in_thread(busy_worker)
+
+    functions = {func for _, _, func in pstats.Stats(profile_out).stats}
+    assert "busy_worker" in functions
+
+
+def test_stack_samples_are_folded(tmp_path):
+    profile_out = str(tmp_path / "run.folded")
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait, name="waiting")
+    thread.start()
+    try:
+        with profiled(profile_out):
+            time.sleep(0.1)
+    finally:
+        stop.set()
+        thread.join()
+
+    with open(profile_out) as fh:
+        stacks = [line.rstrip("\n").rpartition(" ") for line in fh]
+    assert any(stack.startswith("waiting;") for stack, _, _ in stacks)
+    assert all(int(count) > 0 for _, _, count in stacks)
+
+
+def test_worker_profiles_are_merged_and_deleted(tmp_path):
+    profile_out = str(tmp_path / "run.folded")
+    with open(profile_out, mode="w") as fh:
+        fh.write("main;a 2\n")
+    worker_out = worker_profile_out(profile_out)
+    with open(worker_out, mode="w") as fh:
+        fh.write("main;a 1\nworker;b 3\n")
+
+    merge_worker_profiles(profile_out)
+
+    with open(profile_out) as fh:
+        assert fh.read() == "main;a 3\nworker;b 3\n"
+    assert [p.name for p in tmp_path.iterdir()] == ["run.folded"]
+
+
+def test_without_profile_out_nothing_is_written(tmp_path):
+    with profiled(None):
+        pass
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,118 @@
+import io
+import logging
+
+from conformity_migration_tool.metrics import HTTPMetrics
+from conformity_migration_tool.progress import (
+    ACCOUNTS,
+    CHECKS,
+    CLEAR_LINE,
+    RULES,
+    Countdown,
+    ProgressDisplay,
+    ProgressTracker,
+    StageProgress,
+    StatusLine,
+    StatusLineStreamHandler,
+    format_progress,
+)
+
+
+def stage(total: int, done: int, first_done_at=None, last_done_at=None, errors=0):
+    progress = StageProgress()
+    progress.total, progress.done, progress.errors = total, done, errors
+    progress.first_done_at, progress.last_done_at = first_done_at, last_done_at
+    return progress
+
+
+def test_throughput_and_eta_start_at_the_first_completed_item():
+    progress = stage(total=100, done=20, first_done_at=1000, last_done_at=1010)
+    assert progress.per_sec() == 2
+    assert progress.eta_secs() == 40
+    # no throughput yet
+    assert stage(total=10, done=0).eta_secs() is None
+    assert stage(total=10, done=10).eta_secs() == 0
+
+
+def test_tracker_counts_totals_done_and_errors():
+    tracker = ProgressTracker()
+    tracker.add_total(RULES, 3)
+    tracker.add_total(RULES, 2)
+    tracker.done(RULES)
+    tracker.done(RULES, count=2, ok=False)
+
+    snapshot = tracker.snapshot()
+    tracker.done(RULES)
+
+    rules = snapshot[RULES]
+    assert (rules.total, rules.done, rules.errors) == (5, 3, 2)
+    assert rules.first_done_at is not None
+    # the snapshot is a copy
+    assert tracker.snapshot()[RULES].done == 4
+    assert snapshot[ACCOUNTS].total == 0
+
+
+def test_countdown_calls_once_at_zero_including_added_counts():
+    reached = []
+    countdown = Countdown(2, on_zero=lambda: reached.append(True))
+    countdown.add(1)
+    countdown.count_down()
+    countdown.count_down()
+    assert reached == []
+    countdown.count_down()
+    assert reached == [True]
+
+
+def test_format_progress():
+    metrics = HTTPMetrics()
+    metrics.set_concurrency_limit("c1", 8)
+    metrics.throttled = 3
+    stages = {
+        ACCOUNTS: stage(total=2, done=2),
+        RULES: stage(total=100, done=50, first_done_at=0, last_done_at=10, errors=1),
+        CHECKS: stage(total=10, done=0),
+    }
+
+    text = format_progress(stages, metrics, elapsed_secs=125)
+
+    assert text == (
+        "Accounts 2/2 | Rules 50/100 (5.0/s) 1 failed | Checks 0/10 (0.0/s)"
+        " | In flight 0 | Limit c1 8 | 429s 3 | Elapsed 2m05s"
+        " | ETA rules 10s, checks ?"
+    )
+
+
+def test_log_lines_clear_the_status_line_first():
+    out = io.StringIO()
+    status_line = StatusLine(out)
+    handler = StatusLineStreamHandler(out, status_line)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    record = logging.LogRecord("t", logging.INFO, "", 0, "logged", None, None)
+
+    status_line.draw("Accounts 1/2")
+    handler.emit(record)
+    handler.emit(record)
+
+    # cleared once, since the status line isn't shown anymore
+    assert out.getvalue() == f"{CLEAR_LINE}Accounts 1/2{CLEAR_LINE}logged\nlogged\n"
+
+
+def test_display_logs_a_summary_when_stopped():
+    out = io.StringIO()
+    summaries = []
+    tracker = ProgressTracker()
+    tracker.add_total(ACCOUNTS, 1)
+    display = ProgressDisplay(
+        tracker=tracker,
+        metrics=HTTPMetrics(),
+        status_line=StatusLine(out),
+        log_summary=summaries.append,
+        is_tty=False,
+        interval_secs=0,
+    )
+
+    with display:
+        tracker.done(ACCOUNTS)
+
+    assert len(summaries) == 1
+    assert summaries[0].startswith("Progress: Accounts 1/1 | ")
+    assert out.getvalue() == ""
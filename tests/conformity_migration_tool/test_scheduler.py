@@ -0,0 +1,118 @@
+import threading
+from typing import List
+
+import pytest
+
+from conformity_migration_tool.priority import thread_priority
+from conformity_migration_tool.scheduler import TaskGraph, TaskGraphError
+
+
+def recorder(ran: List[str], name: str):
+    lock = threading.Lock()
+
+    def task():
+        with lock:
+            ran.append(name)
+
+    return task
+
+
+def test_tasks_run_after_their_deps():
+    ran: List[str] = []
+    graph = TaskGraph(max_workers=4)
+    graph.add("c", recorder(ran, "c"), deps=["b"])
+    graph.add("b", recorder(ran, "b"), deps=["a"])
+    graph.add("a", recorder(ran, "a"))
+    graph.run()
+    assert ran == ["a", "b", "c"]
+
+
+def test_tasks_can_add_tasks():
+    ran: List[str] = []
+    graph = TaskGraph(max_workers=2)
+
+    def accounts():
+        ran.append("accounts")
+        graph.add("rules", recorder(ran, "rules"), deps=["accounts", "users"])
+
+    graph.add("users", recorder(ran, "users"))
+    graph.add("accounts", accounts, deps=["users"])
+    graph.run()
+    assert ran == ["users", "accounts", "rules"]
+    assert graph.is_done("rules")
+
+
+def test_duplicate_tasks_are_rejected():
+    graph = TaskGraph()
+    graph.add("a", lambda: None)
+    with pytest.raises(TaskGraphError):
+        graph.add("a", lambda: None)
+
+
+def test_missing_deps_are_reported():
+    graph = TaskGraph()
+    graph.add("a", lambda: None, deps=["missing"])
+    with pytest.raises(TaskGraphError, match="missing"):
+        graph.run()
+
+
+def test_the_first_error_stops_the_graph():
+    ran: List[str] = []
+    graph = TaskGraph(max_workers=1)
+
+    def fail():
+        raise ValueError("boom")
+
+    graph.add("a", fail)
+    graph.add("b", recorder(ran, "b"), deps=["a"])
+    with pytest.raises(ValueError, match="boom"):
+        graph.run()
+    assert ran == []
+
+
+def test_feeders_are_pulled_as_the_graph_has_room():
+    events: List[str] = []
+    graph = TaskGraph(max_workers=1, max_pending=2)
+
+    def feeder():
+        for i in range(6):
+            events.append(f"fed {i}")
+            graph.add(f"task {i}", recorder(events, f"ran {i}"))
+            yield
+
+    graph.add_feeder(feeder())
+    graph.run()
+    assert [e for e in events if e.startswith("ran")] == [f"ran {i}" for i in range(6)]
+    # never more than max_pending tasks waiting
+    assert events.index("ran 0") < events.index("fed 2")
+    assert events.index("ran 3") < events.index("fed 5")
+
+
+def test_transient_tasks_are_forgotten():
+    graph = TaskGraph()
+    graph.add("kept", lambda: None)
+    graph.add("transient", lambda: None, transient=True)
+    graph.run()
+    assert graph.is_done("kept")
+    assert not graph.is_done("transient")
+    # so its name can be used again
+    graph.add("transient", lambda: None, transient=True)
+    graph.run()
+
+
+def test_ready_tasks_start_by_priority():
+    ran: List[str] = []
+    priorities = {"bulk": 2, "normal": 1, "critical": 0}
+    graph = TaskGraph(max_workers=1, task_priority=lambda name: priorities[name[:-2]])
+    for name in ("bulk-1", "normal-1", "bulk-2", "critical-1", "normal-2"):
+        graph.add(name, recorder(ran, name))
+    graph.run()
+    assert ran == ["critical-1", "normal-1", "normal-2", "bulk-1", "bulk-2"]
+
+
+def test_tasks_run_with_their_priority():
+    priorities: List[object] = []
+    graph = TaskGraph(task_priority=lambda name: 2)
+    graph.add("a", lambda: priorities.append(thread_priority()))
+    graph.run()
+    assert priorities == [2]
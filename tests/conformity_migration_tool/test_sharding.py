@@ -0,0 +1,38 @@
+import pytest
+
+from conformity_migration_tool.sharding import Shard
+
+
+def test_parse():
+    shard = Shard.parse("1/4")
+    assert (shard.index, shard.count) == (1, 4)
+    assert str(shard) == "1/4"
+
+
+@pytest.mark.parametrize("text", ["1", "4/4", "-1/4", "0/0", "a/4"])
+def test_parse_invalid(text):
+    with pytest.raises(ValueError):
+        Shard.parse(text)
+
+
+def test_every_account_is_in_exactly_one_shard():
+    shards = [Shard(i, 4) for i in range(4)]
+    acct_ids = [f"acct-{i}" for i in range(200)]
+    for acct_id in acct_ids:
+        assert sum(shard.includes(acct_id) for shard in shards) == 1
+    # and the accounts are spread between the shards
+    assert all(any(shard.includes(a) for a in acct_ids) for shard in shards)
+
+
+def test_an_account_stays_in_its_shard():
+    # the shard of an account must not change between runs or machines
+    assert [i for i in range(4) if Shard(i, 4).includes("acct-0")] == [3]
+
+
+def test_only_the_first_shard_migrates_the_organisation():
+    assert Shard(0, 3).migrates_organisation
+    assert not Shard(2, 3).migrates_organisation
+
+
+def test_file_name():
+    assert Shard(1, 4).file_name("events.jsonl") == "events.shard-1-of-4.jsonl"
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from conformity_migration_tool.spill import SpillDict
+
+
+@pytest.fixture(params=[100, 2], ids=["in-memory", "spilled"])
+def spill_dict(request):
+    with SpillDict(threshold=request.param) as d:
+        d.PAGE_SIZE = 2
+        yield d
+
+
+def test_entries(spill_dict):
+    for i in range(5):
+        spill_dict[f"k{i}"] = f"v{i}"
+    assert len(spill_dict) == 5
+    assert spill_dict.get("k3") == "v3"
+    assert spill_dict.get("missing", "default") == "default"
+    assert "k4" in spill_dict and "missing" not in spill_dict
+
+
+def test_iteration_keeps_insertion_order(spill_dict):
+    for key in ("b", "a", "d", "c", "e"):
+        spill_dict[key] = key.upper()
+    # an update keeps the place of the entry
+    spill_dict["a"] = "A2"
+    assert list(spill_dict.items()) == [
+        ("b", "B"),
+        ("a", "A2"),
+        ("d", "D"),
+        ("c", "C"),
+        ("e", "E"),
+    ]
+    assert list(spill_dict.keys()) == ["b", "a", "d", "c", "e"]
+
+
+def test_spills_past_the_threshold():
+    d = SpillDict(threshold=2)
+    d["a"] = "1"
+    d["b"] = "2"
+    assert not d.spilled
+    d["c"] = "3"
+    assert d.spilled
+    path = d._path
+    assert os.path.exists(path)
+    d.close()
+    assert not os.path.exists(path)
+    assert not d
+
+
+def test_empty():
+    assert not SpillDict()
+    assert list(SpillDict().items()) == []
+
+
+def test_iteration_reads_entries_added_meanwhile():
+    with SpillDict(threshold=3) as d:
+        d.PAGE_SIZE = 2
+        d["a"] = "1"
+        d["b"] = "2"
+        items = d.items()
+        assert next(items) == ("a", "1")
+        d["c"] = "3"
+        assert next(items) == ("b", "2")
+        # spills while iterating
+        d["d"] = "4"
+        assert d.spilled
+        assert list(items) == [("c", "3"), ("d", "4")]
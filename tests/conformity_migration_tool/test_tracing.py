@@ -0,0 +1,101 @@
+import json
+import threading
+
+import pytest
+from requests import Request, Response
+from requests.adapters import BaseAdapter
+
+from conformity_migration_tool.tracing import Tracer, TracingHTTPAdapter
+
+
+class FakeAdapter(BaseAdapter):
+    def send(self, request, *args, **kwargs):
+        resp = Response()
+        resp.status_code = 204
+        return resp
+
+    def close(self):
+        pass
+
+
+def read_spans(path):
+    with open(path) as fh:
+        events = json.load(fh)
+    return {e["name"]: e for e in events if e["ph"] == "X"}
+
+
+def test_spans_nest_and_the_trace_is_a_json_array(tmp_path):
+    path = tmp_path / "trace.json"
+    tracer = Tracer(out=open(path, mode="w"))
+    with tracer.span("run", category="run"):
+        with tracer.span("accounts", category="stage") as attrs:
+            attrs["count"] = 2
+            with tracer.span("users", category="stage"):
+                pass
+    tracer.close()
+
+    spans = read_spans(path)
+    run_id = spans["run"]["args"]["span_id"]
+    accounts = spans["accounts"]
+    assert "parent_id" not in spans["run"]["args"]
+    assert accounts["args"]["parent_id"] == run_id
+    assert accounts["args"]["count"] == 2
+    assert spans["users"]["args"]["parent_id"] == accounts["args"]["span_id"]
+    assert accounts["dur"] >= spans["users"]["dur"]
+
+
+def test_spans_of_worker_threads_belong_to_the_root_span(tmp_path):
+    path = tmp_path / "trace.json"
+    tracer = Tracer(out=open(path, mode="w"))
+
+    def task():
+        with tracer.span("a1", category="task"):
+            pass
+
+    with tracer.span("run", category="run"):
+        thread = threading.Thread(target=task, name="account-worker")
+        thread.start()
+        thread.join()
+    tracer.close()
+
+    with open(path) as fh:
+        events = json.load(fh)
+    spans = {e["name"]: e for e in events if e["ph"] == "X"}
+    assert spans["a1"]["args"]["parent_id"] == spans["run"]["args"]["span_id"]
+    assert spans["a1"]["tid"] != spans["run"]["tid"]
+    thread_names = [e["args"]["name"] for e in events if e["name"] == "thread_name"]
+    assert "account-worker" in thread_names
+    assert events[-1]["name"] == "process_name"
+
+
+def test_failed_span_records_the_error(tmp_path):
+    path = tmp_path / "trace.json"
+    tracer = Tracer(out=open(path, mode="w"))
+    with pytest.raises(ValueError):
+        with tracer.span("rule", category="task"):
+            raise ValueError("boom")
+    tracer.close()
+    # closing twice leaves the trace as it is
+    tracer.close()
+
+    assert read_spans(path)["rule"]["args"]["error"] == "boom"
+
+
+def test_http_requests_are_traced(tmp_path):
+    path = tmp_path / "trace.json"
+    tracer = Tracer(out=open(path, mode="w"))
+    adapter = TracingHTTPAdapter(FakeAdapter(), tracer, api="c1")
+
+    adapter.send(Request("PATCH", "https://host/v1/checks/abc").prepare())
+    tracer.close()
+
+    args = read_spans(path)["PATCH /v1/checks/{id}"]["args"]
+    assert (args["api"], args["status"], args["retries"]) == ("c1", 204, 0)
+
+
+def test_without_out_nothing_is_recorded():
+    tracer = Tracer()
+    with tracer.span("run", category="run", account="a1") as attrs:
+        assert attrs == {"account": "a1"}
+    assert not tracer.enabled
+    tracer.close()
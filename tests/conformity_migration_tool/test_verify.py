@@ -0,0 +1,229 @@
+import io
+import json
+
+import pytest
+
+from conformity_migration.conformity_api import ConformityError
+from conformity_migration.models import (
+    Account,
+    AccountDetails,
+    Check,
+    ReportConfig,
+    Rule,
+)
+
+# PyInquirer doesn't import on every Python version the tests run on
+pytest.importorskip("PyInquirer", exc_type=ImportError)
+
+from conformity_migration_tool.verify import (  # noqa: E402
+    DIFFERENT,
+    MISSING_IN_C1,
+    MismatchReport,
+    RequestBudget,
+    RequestBudgetExhausted,
+    diff_bot_settings,
+    diff_missing,
+    diff_rules,
+    diff_tags,
+    verify_migration,
+)
+
+
+def account(acct_id: str, cloud_type: str, aws_acct_num="", tags=None, rules=None):
+    return {
+        "id": acct_id,
+        "attributes": {
+            "name": acct_id,
+            "environment": "",
+            "cloud-type": cloud_type,
+            "awsaccount-id": aws_acct_num,
+            "tags": tags or [],
+            "settings": {"rules": rules or []},
+        },
+    }
+
+
+def check(resource: str, suppressed_until=None) -> Check:
+    return Check(
+        check_id=f"ccc:a:EC2-001:EC2:us-east-1:{resource}",
+        acct_id="a",
+        rule_id="EC2-001",
+        service="EC2",
+        region="us-east-1",
+        resource=resource,
+        resource_name=resource,
+        message="m",
+        suppressed=True,
+        suppressed_until=suppressed_until,
+    )
+
+
+class FakeAPI:
+    """Only the reads made by the verification"""
+
+    def __init__(self, accts, checks=None, failing=()) -> None:
+        self.accts = {acct["id"]: acct for acct in accts}
+        self.checks = checks or {}
+        self.failing = failing
+
+    def get_all_users(self):
+        return []
+
+    def list_accounts(self):
+        return [Account(acct) for acct in self.accts.values()]
+
+    def get_account_details(self, acct_id):
+        return AccountDetails(self.accts[acct_id])
+
+    def get_communication_settings(self, acct_id):
+        if "get_communication_settings" in self.failing:
+            raise ConformityError("connection lost")
+        return []
+
+    def list_account_report_configs(self, acct_id):
+        return []
+
+    def get_suppressed_checks(self, acct_id, limit=0, offset=0):
+        return self.checks.get(acct_id, [])
+
+
+def legacy_api() -> FakeAPI:
+    return FakeAPI(
+        accts=[
+            account(
+                "a1",
+                "aws",
+                "111",
+                tags=["prod"],
+                rules=[{"id": "EC2-001", "enabled": True}],
+            ),
+            account("a2", "aws", "222"),
+            account("a3", "gcp"),
+        ],
+        checks={"a1": [check("r1"), check("r2", suppressed_until=1000)]},
+    )
+
+
+def c1_api(failing=()) -> FakeAPI:
+    return FakeAPI(
+        accts=[
+            account(
+                "c1",
+                "aws",
+                "111",
+                tags=["dev"],
+                rules=[{"id": "EC2-001", "enabled": False}],
+            )
+        ],
+        checks={"c1": [check("r2", suppressed_until=2000)]},
+        failing=failing,
+    )
+
+
+def verify(c1, max_requests=0):
+    out = io.StringIO()
+    report = MismatchReport(out=out)
+    budget = RequestBudget(max_requests=max_requests)
+    verify_migration(
+        legacy_api=legacy_api(),  # type: ignore
+        c1_api=c1,
+        report=report,
+        budget=budget,
+        include_accts=None,
+        exclude_accts=None,
+        max_workers=2,
+    )
+    report.write_summary(requests_used=budget.used)
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def issues(records, record_type="mismatch"):
+    return sorted(
+        (r["legacy_account_id"], r["category"], r.get("item"), r.get("issue"))
+        for r in records
+        if r["type"] == record_type
+    )
+
+
+def test_verify_reports_the_differences_of_every_account():
+    records = verify(c1_api())
+    assert issues(records) == [
+        ("a1", "rules", "EC2-001.enabled", DIFFERENT),
+        ("a1", "suppressed-checks", "EC2-001|us-east-1|EC2|r1", MISSING_IN_C1),
+        ("a1", "suppressed-checks", "EC2-001|us-east-1|EC2|r2", DIFFERENT),
+        ("a1", "tags", "tags", DIFFERENT),
+        ("a2", "account", "a2", MISSING_IN_C1),
+    ]
+    assert issues(records, "unverified") == [("a3", "account", None, None)]
+    summary = records[-1]
+    assert summary["type"] == "summary"
+    assert summary["accounts_verified"] == 1
+    assert summary["mismatches"] == 5
+    assert summary["unverified"] == 1
+
+
+def test_verify_reports_a_part_that_fails_as_unverified():
+    records = verify(c1_api(failing={"get_communication_settings"}))
+    assert ("a1", "communication-settings", None, None) in issues(records, "unverified")
+    # the other parts of the account are still verified
+    assert ("a1", "tags", "tags", DIFFERENT) in issues(records)
+
+
+def test_verify_leaves_the_accounts_past_the_budget_unverified():
+    # the users and accounts, but not the requests of an account
+    records = verify(c1_api(), max_requests=6)
+    assert ("a1", "account", None, None) in issues(records, "unverified")
+    assert records[-1]["accounts_verified"] == 0
+    assert records[-1]["requests"] == 6
+
+
+def test_request_budget():
+    budget = RequestBudget(max_requests=3)
+    budget.take(2)
+    with pytest.raises(RequestBudgetExhausted):
+        budget.take(2)
+    budget.take()
+    assert budget.used == 3
+    unlimited = RequestBudget()
+    unlimited.take(1000)
+    assert unlimited.used == 1000
+
+
+def test_diff_tags_ignores_their_order():
+    assert diff_tags(["a", "b"], ["b", "a"]) == []
+    assert diff_tags(None, []) == []  # type: ignore
+    [mismatch] = diff_tags(["a"], ["b"])
+    assert (mismatch.legacy, mismatch.c1) == (["a"], ["b"])
+
+
+def test_diff_bot_settings_ignores_the_keys_changed_by_the_migration():
+    legacy = {"disabled": True, "delay": 1, "lastModifiedBy": "u1"}
+    c1 = {"disabled": False, "delay": 1, "lastModifiedBy": "u2"}
+    assert [m.item for m in diff_bot_settings(legacy, c1)] == ["disabled"]
+    assert diff_bot_settings(legacy, c1, ignored_keys=["disabled"]) == []
+    assert diff_bot_settings(None, c1) == []
+
+
+def test_diff_rules_compares_the_migrated_settings():
+    legacy = [
+        Rule({"id": "R1", "enabled": True, "riskLevel": "HIGH", "provider": "aws"}),
+        Rule({"id": "R2", "enabled": True}),
+    ]
+    c1 = [Rule({"id": "R1", "enabled": True, "riskLevel": "LOW", "provider": "x"})]
+    assert [(m.item, m.issue) for m in diff_rules(legacy, c1)] == [
+        ("R1.riskLevel", DIFFERENT),
+        ("R2", MISSING_IN_C1),
+    ]
+
+
+def test_diff_missing_uses_the_equality_of_the_models():
+    def report_config(title):
+        return ReportConfig({"attributes": {"configuration": {"title": title}}})
+
+    mismatches = diff_missing(
+        category="report-configs",
+        legacy_items=[report_config("Weekly"), report_config("Daily")],
+        c1_items=[report_config("Weekly")],
+        describe=lambda rconf: rconf.title,
+    )
+    assert [(m.item, m.issue) for m in mismatches] == [("Daily", MISSING_IN_C1)]